@@ -0,0 +1,68 @@
+"""
+Import and startup time of comagic-sdk, measured in fresh interpreters.
+
+Exits non-zero when the median ``import comagic`` or ``from comagic import Comagic`` time exceeds ``--max-ms``, so
+CI can guard it::
+
+    python -m benchmarks.import_time --max-ms 15
+"""
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+from typing import Optional
+
+SNIPPETS = {
+    'import comagic': 'import comagic',
+    'from comagic import Comagic': 'from comagic import Comagic',
+    'Comagic(defer_auth=True)': "from comagic import Comagic; Comagic('login', 'password', defer_auth=True)",
+}
+# snippets held to --max-ms
+BUDGETED = ('import comagic', 'from comagic import Comagic')
+
+
+def measure(code: str, runs: int) -> list:
+    timings = []
+    for _ in range(runs):
+        wrapped = (
+            'import time; _started = time.perf_counter()\n'
+            f'{code}\n'
+            'print((time.perf_counter() - _started) * 1000)\n'
+            'import sys; print(int("requests" in sys.modules))'
+        )
+        out = subprocess.run([sys.executable, '-c', wrapped], check=True, capture_output=True, text=True).stdout
+        elapsed, requests_loaded = out.split()
+        timings.append((float(elapsed), bool(int(requests_loaded))))
+    return timings
+
+
+def main(argv: Optional[list] = None) -> int:
+    parser = argparse.ArgumentParser(description='comagic-sdk import time')
+    parser.add_argument('--runs', type=int, default=7)
+    parser.add_argument('--max-ms', type=float, help='fail when a budgeted import is slower than this (median)')
+    parser.add_argument('--output', help='write results json to this path')
+    args = parser.parse_args(argv)
+
+    results = []
+    for name, code in SNIPPETS.items():
+        timings = measure(code, args.runs)
+        results.append({
+            'name': name,
+            'median_ms': round(statistics.median(t for t, _ in timings), 3),
+            'min_ms': round(min(t for t, _ in timings), 3),
+            'requests_imported': any(loaded for _, loaded in timings),
+        })
+    report = json.dumps({'python': sys.version.split()[0], 'results': results}, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(report)
+    print(report)
+    over = [r for r in results if r['name'] in BUDGETED and args.max_ms is not None and r['median_ms'] > args.max_ms]
+    for result in over:
+        print(f"{result['name']} took {result['median_ms']}ms, budget is {args.max_ms}ms", file=sys.stderr)
+    return 1 if over else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
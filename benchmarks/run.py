@@ -0,0 +1,237 @@
+"""
+Offline benchmarks for comagic-sdk.
+
+Everything runs against synthetic payloads and a local ``comagic.server.StandInServer``; no network access
+is needed. Results are written as json so runs from different versions can be compared::
+
+    python -m benchmarks.run --output bench.json
+    python -m benchmarks.run --quick --compare bench.json
+"""
+import argparse
+import gc
+import json
+import platform
+import resource
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Optional
+
+import comagic
+from comagic import Comagic, models
+from comagic.decode import ProcessDecoder, iter_decoded_pages
+from comagic.server import StandInServer
+from comagic.synthetic import SyntheticReport
+from comagic.utils import DATETIME_FORMAT, parse_datetime
+
+
+def peak_rss_kb() -> int:
+    usage = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return usage // 1024 if sys.platform == 'darwin' else usage
+
+
+def model_classes() -> list:
+    return [
+        cls for cls in vars(models).values()
+        if isinstance(cls, type) and issubclass(cls, models.BaseModel) and cls is not models.BaseModel
+    ]
+
+
+def _result(name: str, params: dict, count: int, seconds: float, unit: str) -> dict:
+    return {
+        'name': name,
+        'params': params,
+        'count': count,
+        'seconds': round(seconds, 6),
+        unit: round(count / seconds, 2) if seconds else None,
+        'peak_rss_kb': peak_rss_kb(),
+    }
+
+
+def bench_models(rows_per_model: int) -> list:
+    results = []
+    for model in model_classes():
+        payload = list(SyntheticReport(model, rows_per_model, datetime(2020, 1, 1), datetime(2020, 2, 1), seed=1))
+        gc.collect()
+        started = time.perf_counter()
+        # from_dict mutates its argument, so every row is copied inside the timed loop for all models alike
+        for row in payload:
+            model.from_dict(dict(row))
+        results.append(_result(f'from_dict.{model.__name__}', {'rows': rows_per_model, 'fields': len(model.fields())},
+                               rows_per_model, time.perf_counter() - started, 'ops_per_sec'))
+    return results
+
+
+def bench_parse_datetime(count: int) -> list:
+    start = datetime(2020, 1, 1)
+    values = [(start + timedelta(seconds=i)).strftime(DATETIME_FORMAT) for i in range(count)]
+    gc.collect()
+    started = time.perf_counter()
+    for value in values:
+        parse_datetime(value)
+    return [_result('parse_datetime', {'values': count}, count, time.perf_counter() - started, 'ops_per_sec')]
+
+
+def _export(clients: list, date_from: datetime, date_till: datetime, page_size: int) -> int:
+    concurrency = len(clients)
+
+    def worker(index: int) -> int:
+        client, rows, offset = clients[index], 0, index * page_size
+        while True:
+            page = list(client.get_calls_report(date_from, date_till, limit=page_size, offset=offset))
+            rows += len(page)
+            if len(page) < page_size:
+                return rows
+            offset += concurrency * page_size
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        return sum(pool.map(worker, range(concurrency)))
+
+
+def bench_export(total_rows: int, page_sizes: list, concurrencies: list, latency: float) -> list:
+    results = []
+    start = datetime(2020, 1, 1)
+    date_from, date_till = start, start + timedelta(seconds=total_rows)
+    with StandInServer(latency=latency) as server:
+        server.add_rows('calls_report', SyntheticReport(models.Call, total_rows, date_from, date_till, seed=1),
+                        presorted=True)
+        for page_size in page_sizes:
+            for concurrency in concurrencies:
+                clients = [Comagic('bench', 'bench', api_url=server.url) for _ in range(concurrency)]
+                gc.collect()
+                started = time.perf_counter()
+                exported = _export(clients, date_from, date_till, page_size)
+                seconds = time.perf_counter() - started
+                if exported != total_rows:
+                    raise RuntimeError(f'exported {exported} rows, expected {total_rows}')
+                params = {'rows': total_rows, 'page_size': page_size, 'concurrency': concurrency, 'latency': latency}
+                results.append(_result('export.calls_report', params, exported, seconds, 'rows_per_sec'))
+                if concurrency > 1:
+                    # one client shared by every thread, the rows must come out the same
+                    shared = Comagic('bench', 'bench', api_url=server.url, pool_size=concurrency)
+                    gc.collect()
+                    started = time.perf_counter()
+                    exported = _export([shared] * concurrency, date_from, date_till, page_size)
+                    seconds = time.perf_counter() - started
+                    shared.close()
+                    if exported != total_rows:
+                        raise RuntimeError(f'shared client exported {exported} rows, expected {total_rows}')
+                    results.append(_result('export.calls_report.shared_client', params, exported, seconds,
+                                           'rows_per_sec'))
+    return results
+
+
+def bench_shared_token(total_rows: int, page_size: int, concurrency: int, latency: float,
+                       token_ttl: float = 0.2) -> list:
+    """One client shared by every thread while access tokens keep expiring: one login per expiry, no -32001."""
+    start = datetime(2020, 1, 1)
+    date_from, date_till = start, start + timedelta(seconds=total_rows)
+    # the export has to outlive several tokens
+    with StandInServer(latency=max(latency, token_ttl / 4), token_ttl=token_ttl) as server:
+        server.add_rows('calls_report', SyntheticReport(models.Call, total_rows, date_from, date_till, seed=1),
+                        presorted=True)
+        shared = Comagic('bench', 'bench', api_url=server.url, pool_size=concurrency)
+        gc.collect()
+        started = time.perf_counter()
+        # a -32001 that reaches a caller fails the run here
+        exported = _export([shared] * concurrency, date_from, date_till, page_size)
+        seconds = time.perf_counter() - started
+        shared.close()
+        logins = server.logins_count
+    if exported != total_rows:
+        raise RuntimeError(f'shared client exported {exported} rows, expected {total_rows}')
+    # the constructor login, one per expiry, and one more for a token that expired right at the end
+    expiries = int(seconds / token_ttl) + 1
+    if logins > expiries + 1:
+        raise RuntimeError(f'{logins} logins for {expiries} token lifetimes, threads refreshed the token separately')
+    params = {'rows': total_rows, 'page_size': page_size, 'concurrency': concurrency, 'token_ttl': token_ttl,
+              'latency': latency}
+    result = _result('export.calls_report.shared_client.expiring_token', params, exported, seconds, 'rows_per_sec')
+    result['logins'] = logins
+    return [result]
+
+
+def bench_decode(total_rows: int, page_size: int, latency: float, token_ttl: float = 0.2) -> list:
+    """Process pool decoded export while access tokens keep expiring, every page has to come through."""
+    start = datetime(2020, 1, 1)
+    date_from, date_till = start, start + timedelta(seconds=total_rows)
+    # the export has to outlive several tokens
+    with StandInServer(latency=max(latency, token_ttl / 4), token_ttl=token_ttl) as server:
+        server.add_rows('calls_report', SyntheticReport(models.Call, total_rows, date_from, date_till, seed=1),
+                        presorted=True)
+        client = Comagic('bench', 'bench', api_url=server.url)
+        query = client.query('calls_report').between(date_from, date_till).select('id', 'start_time')
+        with ProcessDecoder(processes=2) as decoder:
+            gc.collect()
+            started = time.perf_counter()
+            exported = sum(len(page.rows) for page in iter_decoded_pages(query, decoder, page_size=page_size))
+            seconds = time.perf_counter() - started
+        client.close()
+    if exported != total_rows:
+        raise RuntimeError(f'decoded export returned {exported} rows, expected {total_rows}')
+    params = {'rows': total_rows, 'page_size': page_size, 'token_ttl': token_ttl, 'latency': latency}
+    return [_result('export.calls_report.decoded', params, exported, seconds, 'rows_per_sec')]
+
+
+def compare(results: list, baseline_path: str) -> None:
+    with open(baseline_path, encoding='utf-8') as f:
+        baseline = {
+            (r['name'], json.dumps(r['params'], sort_keys=True)): r for r in json.load(f)['results']
+        }
+    for result in results:
+        previous = baseline.get((result['name'], json.dumps(result['params'], sort_keys=True)))
+        unit = 'rows_per_sec' if 'rows_per_sec' in result else 'ops_per_sec'
+        if not previous or not previous.get(unit) or not result.get(unit):
+            continue
+        change = (result[unit] / previous[unit] - 1) * 100
+        print(f"{result['name']:<45} {json.dumps(result['params'], sort_keys=True):<70} {change:+7.1f}%")
+
+
+def main(argv: Optional[list] = None) -> dict:
+    parser = argparse.ArgumentParser(description='comagic-sdk offline benchmarks')
+    parser.add_argument('--output', help='write results json to this path')
+    parser.add_argument('--compare', help='previous results json to compare against')
+    parser.add_argument('--quick', action='store_true', help='small sizes for smoke runs')
+    parser.add_argument('--only', choices=('models', 'parse_datetime', 'export', 'decode'), action='append')
+    parser.add_argument('--latency', type=float, default=0.0, help='stand-in latency per request, seconds')
+    args = parser.parse_args(argv)
+
+    rows_per_model = 2000 if args.quick else 20000
+    export_rows = 5000 if args.quick else 100000
+    page_sizes = [500, 2500] if args.quick else [500, 2500, 10000]
+    concurrencies = [1, 4]
+    only = set(args.only or ('models', 'parse_datetime', 'export', 'decode'))
+
+    results = []
+    if 'models' in only:
+        results += bench_models(rows_per_model)
+    if 'parse_datetime' in only:
+        results += bench_parse_datetime(rows_per_model * 5)
+    if 'export' in only:
+        results += bench_export(export_rows, page_sizes, concurrencies, args.latency)
+        results += bench_shared_token(export_rows, page_sizes[0], max(concurrencies), args.latency)
+    if 'decode' in only:
+        results += bench_decode(export_rows, page_sizes[0], args.latency)
+
+    report = {
+        'comagic_version': comagic.__version__,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'timestamp': datetime.utcnow().strftime(DATETIME_FORMAT),
+        'peak_rss_kb': peak_rss_kb(),
+        'results': results,
+    }
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+    if args.compare:
+        compare(results, args.compare)
+    return report
+
+
+if __name__ == '__main__':
+    main()
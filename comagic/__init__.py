@@ -1,4 +1,12 @@
-from .client import Comagic
-
 __version__ = '0.0.3.4'
 __author__ = 'bzdvdn'
+
+__all__ = ['Comagic']
+
+
+def __getattr__(name):
+    # the client (and with it requests and the models) is only imported when first used
+    if name == 'Comagic':
+        from .client import Comagic
+        return Comagic
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
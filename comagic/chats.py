@@ -0,0 +1,78 @@
+"""
+Chat transcripts for many chats.
+
+``get_chat_messages_report`` takes one chat at a time. ``iter_chat_transcripts`` fetches the messages of a stream
+of chats on a thread pool, pages through every chat and yields ``(chat, messages)``::
+
+    chats = client.get_chats_report(date_from, date_till)
+    for chat, messages in iter_chat_transcripts(client, chats, workers=16):
+        export(chat.id, [message.text for message in messages])
+"""
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Iterable, Iterator, Optional
+
+from .pagination import MAX_LIMIT
+
+
+def _chat_id(chat: any) -> any:
+    if isinstance(chat, dict):
+        return chat.get('id')
+    return getattr(chat, 'id', chat)
+
+
+def fetch_chat_messages(client: any, chat_id: int, fields: Optional[list] = None, order_by: tuple = ('date_time',),
+                        page_size: int = MAX_LIMIT, user_id: Optional[int] = None) -> list:
+    """
+    :return: list of ChatMessage (every page of the chat)
+    """
+    query = client.query('chat_messages_report').with_args(chat_id=chat_id).for_user(user_id)
+    if fields:
+        query = query.select(*fields)
+    if order_by:
+        # offset pages need a stable order
+        query = query.order_by(*order_by)
+    return list(query.iter(page_size=page_size))
+
+
+def iter_chat_transcripts(client: any, chats: Iterable, workers: int = 8, fields: Optional[list] = None,
+                          order_by: tuple = ('date_time',), page_size: int = MAX_LIMIT, ordered: bool = True,
+                          user_id: Optional[int] = None) -> Iterator[tuple]:
+    """
+    :param client: Comagic
+    :param chats: iterable of Chat models, dicts or chat ids
+    :param workers: int (chats fetched in parallel, at most 2 * workers chats are read ahead)
+    :param fields: list (ChatMessage fields, all by default)
+    :param order_by: tuple (message sort, see ReportQuery.order_by)
+    :param page_size: int (messages per request)
+    :param ordered: bool (yield in input order, otherwise as chats complete)
+    :param user_id: int
+    :return: iterator of (chat, list of ChatMessage)
+    """
+    def fetch(chat: any) -> tuple:
+        return chat, fetch_chat_messages(client, _chat_id(chat), fields, order_by, page_size, user_id)
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        pending = deque()
+        try:
+            for chat in chats:
+                if len(pending) >= workers * 2:
+                    if ordered:
+                        yield pending.popleft().result()
+                    else:
+                        done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                        for future in done:
+                            pending.remove(future)
+                            yield future.result()
+                pending.append(executor.submit(fetch, chat))
+            while pending:
+                if ordered:
+                    yield pending.popleft().result()
+                else:
+                    done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        pending.remove(future)
+                        yield future.result()
+        finally:
+            for future in pending:
+                future.cancel()
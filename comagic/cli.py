@@ -0,0 +1,332 @@
+"""
+``comagic-export``: bulk report export from the command line.
+
+The date range is cut into windows, every (user_id, window) unit is fetched on a thread pool with one shared
+client and written to the output as soon as it is complete::
+
+    comagic-export calls_report --from 2024-01-01 --till 2024-02-01 --fields id,start_time,tags \\
+        --user-id 101 --user-id 102 --format csv --output calls.csv --workers 8 --checkpoint calls.ckpt \\
+        --rate 5
+
+Login and password (or a token) are read from ``--login`` / ``--password`` / ``--token`` or the ``COMAGIC_LOGIN``,
+``COMAGIC_PASSWORD`` and ``COMAGIC_TOKEN`` environment variables. With ``--checkpoint`` finished units and the
+output size are recorded after every unit; running the same command again truncates whatever a crash left half
+written and skips the finished units. An output that is missing or shorter than the checkpoint records is not
+resumed.
+"""
+import argparse
+import csv
+import io
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import datetime, timedelta
+from typing import Optional
+
+from .endpoints import ENDPOINTS, get_endpoint
+from .errors import ComagicException, ComagicParamsError, RATE_LIMIT_ERROR_CODE
+from .pagination import MAX_LIMIT
+from .query import ReportQuery
+from .utils import DATETIME_FORMAT, to_api_value
+
+FORMATS = ('jsonl', 'csv')
+
+
+class _RateLimiter(object):
+    """Spaces requests of all threads at least 1 / rate seconds apart."""
+
+    def __init__(self, rate: Optional[float]) -> None:
+        self.interval = 1.0 / rate if rate else 0.0
+        self._next = 0.0
+        self._lock = threading.Lock()
+
+    def wait(self) -> None:
+        if not self.interval:
+            return
+        with self._lock:
+            now = time.monotonic()
+            start = max(now, self._next)
+            self._next = start + self.interval
+        if start > now:
+            time.sleep(start - now)
+
+    def slow_down(self, seconds: float) -> None:
+        with self._lock:
+            self._next = max(self._next, time.monotonic() + seconds)
+
+
+class _PacedClient(object):
+    """Client proxy: paces get_* calls and retries them on rate limit errors."""
+
+    def __init__(self, client: any, limiter: _RateLimiter, retries: int = 5, backoff: float = 2.0) -> None:
+        self._client = client
+        self._limiter = limiter
+        self._retries = retries
+        self._backoff = backoff
+
+    def __getattr__(self, name: str) -> any:
+        attribute = getattr(self._client, name)
+        if not name.startswith('get_') or not callable(attribute):
+            return attribute
+
+        def method(*args, **kwargs) -> list:
+            for attempt in range(self._retries + 1):
+                self._limiter.wait()
+                try:
+                    # materialized here so a rate limit error is retried by this loop
+                    return list(attribute(*args, **kwargs))
+                except ComagicException as e:
+                    if e.error_data.get('code') != RATE_LIMIT_ERROR_CODE or attempt == self._retries:
+                        raise
+                    self._limiter.slow_down(self._backoff * 2 ** attempt)
+
+        return method
+
+
+def parse_date(value: str) -> datetime:
+    for pattern in (DATETIME_FORMAT, '%Y-%m-%dT%H:%M:%S', '%Y-%m-%d'):
+        try:
+            return datetime.strptime(value, pattern)
+        except ValueError:
+            continue
+    raise argparse.ArgumentTypeError(f'invalid date {value!r}, expected YYYY-MM-DD or "YYYY-MM-DD HH:MM:SS"')
+
+
+def parse_end_date(value: str) -> datetime:
+    """A bare date ends the range with the last second of that day."""
+    date = parse_date(value)
+    if len(value.strip()) == 10:
+        date += timedelta(days=1, seconds=-1)
+    return date
+
+
+def split_windows(date_from: datetime, date_till: datetime, window: timedelta) -> list:
+    """
+    :return: list of (date_from, date_till) windows covering the range, bounds inclusive to the second
+    """
+    windows = []
+    start = date_from
+    while start <= date_till:
+        end = min(start + window - timedelta(seconds=1), date_till)
+        windows.append((start, end))
+        start = end + timedelta(seconds=1)
+    return windows
+
+
+class _Writer(object):
+    def __init__(self, format: str, fields: list, write_header: bool) -> None:
+        self.format = format
+        self.fields = fields
+        self.write_header = write_header and format == 'csv'
+
+    def encode(self, rows: list) -> str:
+        buffer = io.StringIO()
+        if self.format == 'csv':
+            writer = csv.writer(buffer)
+            if self.write_header:
+                writer.writerow(self.fields)
+                self.write_header = False
+            for row in rows:
+                values = [to_api_value(row.get(field)) for field in self.fields]
+                writer.writerow([json.dumps(v, ensure_ascii=False) if isinstance(v, (list, dict)) else v
+                                 for v in values])
+        else:
+            for row in rows:
+                buffer.write(json.dumps({field: to_api_value(row.get(field)) for field in self.fields},
+                                        ensure_ascii=False))
+                buffer.write('\n')
+        return buffer.getvalue()
+
+
+class _Checkpoint(object):
+    def __init__(self, path: Optional[str], key: dict) -> None:
+        self.path = path
+        self.key = key
+        self.done = set()
+        self.offset = 0
+        if path and os.path.exists(path):
+            with open(path, encoding='utf-8') as f:
+                state = json.load(f)
+            if state.get('key') != key:
+                raise ComagicParamsError(f'checkpoint {path} belongs to another export, remove it or change '
+                                         f'--checkpoint')
+            self.done = set(state['done'])
+            self.offset = state['offset']
+
+    def save(self, unit: str, offset: int) -> None:
+        self.done.add(unit)
+        self.offset = offset
+        if not self.path:
+            return
+        tmp_path = f'{self.path}.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'key': self.key, 'done': sorted(self.done), 'offset': offset}, f)
+        os.replace(tmp_path, self.path)
+
+
+def _unit_name(user_id: Optional[int], window: Optional[tuple]) -> str:
+    window_name = f'{window[0].strftime(DATETIME_FORMAT)}/{window[1].strftime(DATETIME_FORMAT)}' if window else '-'
+    return f'{user_id if user_id is not None else "-"}:{window_name}'
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog='comagic-export', description='Export a comagic report to jsonl or csv.')
+    reports = sorted(name for name, endpoint in ENDPOINTS.items() if endpoint.result == 'rows')
+    parser.add_argument('report', help=f'report or list, e.g. calls_report ({", ".join(reports)})')
+    parser.add_argument('--from', dest='date_from', type=parse_date, help='start, YYYY-MM-DD[ HH:MM:SS]')
+    parser.add_argument('--till', dest='date_till', type=parse_end_date,
+                        help='end (inclusive), YYYY-MM-DD[ HH:MM:SS]')
+    parser.add_argument('--fields', help='comma separated fields, all model fields by default')
+    parser.add_argument('--user-id', dest='user_ids', type=int, action='append',
+                        help='tenant, repeat for several; adds a user_id column')
+    parser.add_argument('--format', choices=FORMATS, default='jsonl')
+    parser.add_argument('--output', help='output file, stdout by default')
+    parser.add_argument('--workers', type=int, default=4, help='units fetched in parallel')
+    parser.add_argument('--window', type=float, default=24, help='hours per unit of a date bounded report')
+    parser.add_argument('--page-size', type=int, default=MAX_LIMIT)
+    parser.add_argument('--checkpoint', help='resume file, needs --output')
+    parser.add_argument('--rate', type=float, help='at most this many requests per second')
+    parser.add_argument('--quiet', action='store_true', help='no progress on stderr')
+    parser.add_argument('--login', default=os.environ.get('COMAGIC_LOGIN', ''))
+    parser.add_argument('--password', default=os.environ.get('COMAGIC_PASSWORD', ''))
+    parser.add_argument('--token', default=os.environ.get('COMAGIC_TOKEN', ''))
+    parser.add_argument('--uis', action='store_true', help='use the uis api')
+    parser.add_argument('--api-url', help='custom api url')
+    parser.add_argument('--timeout', type=float, default=60, help='seconds per http request')
+    return parser
+
+
+def export(args: argparse.Namespace, client: any = None, progress: any = sys.stderr) -> dict:
+    """
+    :param args: argparse.Namespace (see build_parser())
+    :param client: Comagic (built from the arguments if None)
+    :return: dict (units, skipped, rows, seconds)
+    """
+    endpoint = get_endpoint(args.report)
+    if endpoint.result != 'rows':
+        raise ComagicParamsError(f'{endpoint.name} does not return report rows')
+    if endpoint.date_field and (args.date_from is None or args.date_till is None):
+        raise ComagicParamsError(f'{endpoint.name} needs --from and --till')
+    if args.checkpoint and not args.output:
+        raise ComagicParamsError('--checkpoint needs --output')
+    fields = [f.strip() for f in args.fields.split(',') if f.strip()] if args.fields else \
+        list(dict.fromkeys(endpoint.model.fields()))
+    unknown = [f for f in fields if f not in endpoint.model.fields()]
+    if unknown:
+        raise ComagicParamsError(f'unknown fields for {endpoint.name}: {", ".join(unknown)}')
+    if client is None:
+        from .client import Comagic
+
+        client = Comagic(args.login, args.password, args.token, uis=args.uis, api_url=args.api_url,
+                         timeout=args.timeout, pool_size=args.workers)
+    paced = _PacedClient(client, _RateLimiter(args.rate))
+
+    user_ids = args.user_ids or [None]
+    columns = (['user_id'] if args.user_ids else []) + fields
+    windows = split_windows(args.date_from, args.date_till, timedelta(hours=args.window)) \
+        if endpoint.date_field else [None]
+    units = [(user_id, window) for user_id in user_ids for window in windows]
+    checkpoint = _Checkpoint(args.checkpoint, {
+        'report': endpoint.name, 'fields': fields, 'user_ids': user_ids, 'format': args.format,
+        'windows': [_unit_name(None, w) for w in windows],
+    })
+    pending_units = [unit for unit in units if _unit_name(*unit) not in checkpoint.done]
+    if checkpoint.done:
+        size = os.path.getsize(args.output) if os.path.exists(args.output) else None
+        if size is None or size < checkpoint.offset:
+            # resuming would skip the finished units and leave a gap in the output
+            state = 'missing' if size is None else f'{size} bytes, the checkpoint recorded {checkpoint.offset}'
+            raise ComagicParamsError(f'can not resume {args.checkpoint}: {args.output} is {state}, restore the output '
+                                     f'or remove the checkpoint to start over')
+
+    if args.output:
+        mode = 'r+' if checkpoint.done else 'w'
+        stream = open(args.output, mode, encoding='utf-8', newline='')
+        stream.seek(checkpoint.offset)
+        stream.truncate()
+    else:
+        stream = sys.stdout
+    writer = _Writer(args.format, columns, write_header=not checkpoint.done)
+    stats = {'units': len(units), 'skipped': len(units) - len(pending_units), 'rows': 0, 'seconds': 0.0}
+    started = time.monotonic()
+
+    def fetch(unit: tuple) -> list:
+        user_id, window = unit
+        query = ReportQuery(paced, endpoint.name).for_user(user_id).select(*fields)
+        if window:
+            query = query.between(*window)
+        rows = []
+        for row in query.iter(page_size=args.page_size):
+            row = {field: getattr(row, field, None) for field in fields}
+            if args.user_ids:
+                row['user_id'] = user_id
+            rows.append(row)
+        return rows
+
+    def report(done: int) -> None:
+        if args.quiet or progress is None:
+            return
+        seconds = time.monotonic() - started
+        rate = stats['rows'] / seconds if seconds else 0.0
+        progress.write(f'\r{endpoint.name}: {done}/{len(units)} units, {stats["rows"]} rows, {rate:.0f} rows/s')
+        progress.flush()
+
+    def finish(done: set) -> None:
+        for future in done:
+            unit = futures.pop(future)
+            rows = future.result()
+            stream.write(writer.encode(rows))
+            stream.flush()
+            stats['rows'] += len(rows)
+            checkpoint.save(_unit_name(*unit), stream.tell() if args.output else 0)
+            report(len(units) - len(futures) - len(remaining))
+
+    futures = {}
+    remaining = list(reversed(pending_units))
+    try:
+        with ThreadPoolExecutor(max_workers=args.workers) as executor:
+            pending = set()
+            while remaining:
+                # at most 2 * workers units in memory, written as they complete
+                if len(pending) >= args.workers * 2:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    finish(done)
+                unit = remaining.pop()
+                future = executor.submit(fetch, unit)
+                futures[future] = unit
+                pending.add(future)
+            done, _ = wait(pending)
+            finish(done)
+        if not checkpoint.done and writer.write_header:
+            # no unit at all, still write the header
+            stream.write(writer.encode([]))
+    finally:
+        if args.output:
+            stream.close()
+    stats['seconds'] = round(time.monotonic() - started, 3)
+    if not args.quiet and progress is not None:
+        progress.write('\n')
+    return stats
+
+
+def main(argv: Optional[list] = None) -> int:
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if not args.token and not (args.login and args.password):
+        parser.error('login and password or token needed (--login/--password/--token or COMAGIC_* variables)')
+    try:
+        stats = export(args)
+    except (ComagicException, ComagicParamsError, KeyError) as e:
+        sys.stderr.write(f'comagic-export: {e}\n')
+        return 1
+    if not args.quiet:
+        sys.stderr.write(f'{stats["rows"]} rows, {stats["units"] - stats["skipped"]} units exported, '
+                         f'{stats["skipped"]} skipped, {stats["seconds"]}s\n')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,58 +1,201 @@
-import requests
-from time import time
-from datetime import datetime
+import json
+import threading
+from time import monotonic, sleep, time
 from json import JSONDecodeError
-from typing import Optional, Union
+from typing import Callable, Optional, Union
 
-from .errors import ComagicException, ComagicParamsError
+from .endpoints import Endpoint, bind_endpoints, get_endpoint
+from .errors import ComagicException, ComagicParamsError, RETRY_ERROR_CODES, TIMEOUT_ERROR_CODE
+from .singleflight import SingleFlight, request_key
 from .utils import DATETIME_FORMAT
-from .models import (Account, VirtualNumber, AvailableVirtualNumber, SipLine, Scenario, MediaField, Campaign,
-                     CampaignAvailablePhoneNumber, CampaignAvailableRedirectPhoneNumber, CampaignWeight, Site,
-                     SiteBlock, Tag, Employee, EmployeeGroup, CustomerUser, Call, CallLegs, FinancialCallLegs,
-                     Customer, Communication, Contact, Chat, ChatMessage, Schedule, VisitorSession, OfflineMessage,
-                     Goal, ContactGroup, ContactOrganization, CampaignDailyStat)
+from .query import ReportQuery
 
+# bytes above which an undecoded response is taken as data without looking for an error
+_MAX_ERROR_SIZE = 4096
 
+
+@bind_endpoints
 class Comagic(object):
-    def __init__(self, login: str = "", password: str = "", token: str = "", uis: bool = False) -> None:
+    def __init__(self, login: str = "", password: str = "", token: str = "", uis: bool = False,
+                 api_url: Optional[str] = None, defer_auth: bool = False, timeout: Optional[float] = None,
+                 coalesce: bool = True, pool_size: int = 10, retries: int = 0, retry_backoff: float = 0.5) -> None:
         """
         :param login: str (login from comagic account)
         :param password: str (password from comagic account)
         :param token: str (token from comagic if needed.)
         :param uis: bool (if you wanna use uis api)
+        :param api_url: str (custom api url, e.g. a local comagic.server stand-in)
+        :param defer_auth: bool (log in on the first request instead of in the constructor)
+        :param timeout: float (seconds per http request, raises ComagicException with code 504)
+        :param coalesce: bool (identical get requests running at the same time share one http request)
+        :param pool_size: int (http connections kept open, size it to the number of threads sharing the client)
+        :param retries: int (times a get request is sent again after a timeout, connection or rate limit error)
+        :param retry_backoff: float (seconds before the first retry, doubled for every next one)
         """
-        if uis:
-            api_url = "https://dataapi.uiscom.ru/v2.0"
-        else:
-            api_url = "https://dataapi.comagic.ru/v2.0"
+        if not api_url:
+            api_url = "https://dataapi.uiscom.ru/v2.0" if uis else "https://dataapi.comagic.ru/v2.0"
         if (login and password) or token:
             self.login = login
             self.password = password
             self.API_URL = api_url
-            self._session = requests.Session()
-            self._session.headers.update({"Content-Type": "application/json"})
-            self.access_token = self._create_access_token() if not token else token
+            self.timeout = timeout
+            self.pool_size = pool_size
+            self.retries = retries
+            self.retry_backoff = retry_backoff
+            self._adapter = None
+            self._local = threading.local()
+            self._lock = threading.Lock()
+            self._auth_lock = threading.Lock()
+            self._hooks = {}
+            self._singleflight = SingleFlight() if coalesce else None
+            self._access_token = token or None
+            if not token and not defer_auth:
+                self._access_token = self._create_access_token()
         else:
             raise ValueError("miss auth params login and password or token")
 
+    @property
+    def access_token(self) -> str:
+        if self._access_token is None:
+            with self._auth_lock:
+                if self._access_token is None:
+                    self._access_token = self._create_access_token()
+        return self._access_token
+
+    @access_token.setter
+    def access_token(self, value: str) -> None:
+        self._access_token = value
+
+    def _refresh_access_token(self, stale: Optional[str]) -> str:
+        """
+        Log in again, unless another thread has already replaced the stale token.
+
+        :param stale: str (token the api rejected)
+        :return: str (current access token)
+        """
+        with self._auth_lock:
+            if self._access_token is None or self._access_token == stale:
+                self._access_token = self._create_access_token()
+            return self._access_token
+
+    @property
+    def _session(self):
+        # requests sessions are not thread-safe: one per thread, all sharing one connection pool
+        session = getattr(self._local, 'session', None)
+        if session is None:
+            import requests
+            from requests.adapters import HTTPAdapter
+
+            with self._lock:
+                if self._adapter is None:
+                    self._adapter = HTTPAdapter(pool_maxsize=self.pool_size)
+            session = self._local.session = requests.Session()
+            session.headers.update({"Content-Type": "application/json"})
+            session.mount('https://', self._adapter)
+            session.mount('http://', self._adapter)
+        return session
+
+    def close(self) -> None:
+        """Close the pooled http connections, later requests open new ones."""
+        with self._lock:
+            if self._adapter is not None:
+                self._adapter.close()
+
+    def __enter__(self) -> 'Comagic':
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    @property
+    def last_response(self) -> Optional[dict]:
+        """
+        :return: dict (size in bytes, elapsed seconds and api metadata of this thread's last response) or None
+        """
+        return getattr(self._local, 'last_response', None)
+
+    def _post(self, params: dict) -> any:
+        """
+        :param params: dict (params for comagic request)
+        :return: requests.Response (or raise ComagicException on timeouts and connection errors)
+        """
+        import requests
+
+        try:
+            return self._session.post(self.API_URL, json=params, timeout=self.timeout)
+        except requests.Timeout as e:
+            raise ComagicException({"code": TIMEOUT_ERROR_CODE, "message": f"{e}"})
+        except requests.ConnectionError as e:
+            raise ComagicException({"code": 502, "message": f"{e}"})
+
+    def _send_raw_request(self, params: dict) -> bytes:
+        """
+        :param params: dict (params for comagic request)
+        :return: bytes (undecoded json-rpc response, errors included)
+        """
+        started = monotonic()
+        response = self._post(params)
+        self._local.last_response = {'size': len(response.content), 'elapsed': monotonic() - started, 'metadata': None}
+        return response.content
+
     def _send_api_request(self, params: dict, auth_counter=0) -> any:
         """
         :param params: dict (params for comagic request)
         :param counter: int
         :return: any (data or raise ComagicException)
         """
+        started = monotonic()
+        if self._singleflight is not None and params["method"].startswith("get."):
+            # concurrent identical reads share one response, every caller decodes its own copy
+            content = self._singleflight.do(request_key(params), self._send_raw_request, params)
+        else:
+            content = self._send_raw_request(params)
         try:
-            resp = self._session.post(self.API_URL, json=params).json()
-        except (JSONDecodeError, requests.ConnectionError) as e:
+            resp = json.loads(content)
+        except JSONDecodeError as e:
             raise ComagicException({"code": 502, "message": f"{e}"})
+        self._local.last_response = {
+            'size': len(content),
+            'elapsed': monotonic() - started,
+            'metadata': (resp.get('result') or {}).get('metadata'),
+        }
         if "error" in resp:
             if resp["error"]["code"] == -32001 and auth_counter <= 3:
+                self._renew_token(params)
                 return self._send_api_request(params, auth_counter + 1)
             raise ComagicException(resp["error"])
         if 'data' in resp['result']:
             return resp["result"]["data"]
         return resp['result']
 
+    def _renew_token(self, params: dict) -> None:
+        token = params["params"].get("access_token")
+        if token and self.login and self.password:
+            # expired token: log in once for all threads and resend with the new one
+            params["params"]["access_token"] = self._refresh_access_token(token)
+
+    def _send_undecoded_request(self, params: dict, auth_counter=0) -> bytes:
+        """
+        Like _send_api_request, but a successful response is returned undecoded (e.g. for ProcessDecoder).
+
+        :param params: dict (params for comagic request)
+        :return: bytes (json-rpc response, or raise ComagicException)
+        """
+        content = self._send_raw_request(params)
+        # only small responses can be errors, data pages are never decoded here
+        if len(content) <= _MAX_ERROR_SIZE and b'"error"' in content:
+            try:
+                resp = json.loads(content)
+            except JSONDecodeError as e:
+                raise ComagicException({"code": 502, "message": f"{e}"})
+            error = resp.get("error") if isinstance(resp, dict) else None
+            if error:
+                if error["code"] == -32001 and auth_counter <= 3:
+                    self._renew_token(params)
+                    return self._send_undecoded_request(params, auth_counter + 1)
+                raise ComagicException(error)
+        return content
+
     def _create_access_token(self) -> str:
         params = {
             "jsonrpc": "2.0",
@@ -87,42 +230,119 @@ class Comagic(object):
         # print(default_params)
         return default_params
 
+    def add_hook(self, event: str, callback: Callable[..., None]) -> None:
+        """
+        :param event: str (contact_created, contact_updated, contact_deleted, employee_created, employee_updated,
+                      employee_deleted)
+        :param callback: callable(**data) (called after the api accepted the change, with id, user_id and the
+                         sent fields)
+        """
+        # hook lists are replaced, never mutated, so _run_hooks iterates a consistent snapshot
+        with self._lock:
+            self._hooks[event] = self._hooks.get(event, []) + [callback]
+
+    def remove_hook(self, event: str, callback: Callable[..., None]) -> None:
+        with self._lock:
+            hooks = list(self._hooks.get(event, []))
+            if callback in hooks:
+                hooks.remove(callback)
+                self._hooks[event] = hooks
+
+    def _run_hooks(self, event: str, **data) -> None:
+        with self._lock:
+            hooks = self._hooks.get(event, [])
+        for callback in hooks:
+            callback(**data)
+
+    def query(self, endpoint: str) -> ReportQuery:
+        """
+        :param endpoint: str (e.g. calls_report or contacts)
+        :return: ReportQuery
+        """
+        return ReportQuery(self, endpoint)
+
+    def _read(self, endpoint: Endpoint, user_id: Optional[int] = None, fields: Optional[list] = None,
+              **kwargs) -> any:
+        """
+        One get request of a registered endpoint, the generated get_*, iter_* and aget_* methods all end here.
+
+        :param endpoint: Endpoint
+        :param kwargs: dict (dates, endpoint args, limit, offset, filter, sort)
+        :return: map of models, a model or the api data (see Endpoint.result)
+        """
+        if not fields and endpoint.default_fields:
+            fields = endpoint.model.fields()
+        for key in ('date_from', 'date_till'):
+            if key in kwargs:
+                kwargs[key] = kwargs[key].strftime(DATETIME_FORMAT)
+        for name, api_name, _ in endpoint.args:
+            kwargs[api_name] = kwargs.pop(name)
+        params = self._create_endpoint_params('get', endpoint.name, user_id=user_id, fields=fields, **kwargs)
+        response = self._retrying(endpoint, self._send_api_request, params)
+        if endpoint.result == 'raw':
+            return response
+        if endpoint.result == 'model':
+            return endpoint.model.from_dict(response)
+        return map(endpoint.model.from_dict, response)
+
+    def _retrying(self, endpoint: Endpoint, send: Callable[[dict], any], params: dict) -> any:
+        """
+        :param send: callable(params) (_send_api_request or _send_undecoded_request)
+        :return: any (response of send, sent again after transient errors of idempotent endpoints)
+        """
+        attempt = 0
+        while True:
+            try:
+                return send(params)
+            except ComagicException as e:
+                if not endpoint.idempotent or attempt >= self.retries or \
+                        e.error_data.get('code') not in RETRY_ERROR_CODES:
+                    raise
+                sleep(self.retry_backoff * 2 ** attempt)
+                attempt += 1
+
+    def _read_all(self, endpoint: Endpoint, params: dict) -> any:
+        result = self._read(endpoint, **params)
+        return list(result) if endpoint.result == 'rows' else result
+
+    def batch(self, calls: list, workers: int = 4, return_exceptions: bool = False) -> list:
+        """
+        Run reads concurrently, e.g. ``client.batch([('tags', {}), ('calls_report', {'date_from': ...,
+        'date_till': ...})])``. Arguments are checked before the first request is sent.
+
+        :param calls: list of (endpoint or get_* method name, dict of the method arguments)
+        :param workers: int (threads, keep it within pool_size)
+        :param return_exceptions: bool (a failed call puts its exception in the results instead of raising it)
+        :return: list (results in call order, rows as lists)
+        """
+        import inspect
+        from concurrent.futures import ThreadPoolExecutor
+
+        bound = []
+        for name, kwargs in calls:
+            endpoint = get_endpoint(name)
+            signature = inspect.signature(getattr(self, endpoint.method))
+            bound.append((endpoint, dict(signature.bind(**kwargs).arguments)))
+        if not bound:
+            return []
+        with ThreadPoolExecutor(max_workers=min(workers, len(bound))) as pool:
+            futures = [pool.submit(self._read_all, endpoint, params) for endpoint, params in bound]
+            results = []
+            for future in futures:
+                try:
+                    results.append(future.result())
+                except Exception as e:
+                    if not return_exceptions:
+                        raise
+                    results.append(e)
+        return results
+
     def get_account(self, user_id: Optional[int] = None):
         params = self._create_endpoint_params('get', 'account', user_id=user_id)
-        response = self._send_api_request(params)
-        return Account.from_dict(response[0])
+        from .models import Account
 
-    def get_virtual_numbers(self, limit: Optional[int] = None, offset: Optional[int] = None,
-                            filter: dict = None, fields: list = None, sort: list = None,
-                            user_id: Optional[int] = None) -> any:
-        if not fields:
-            fields = VirtualNumber.fields()
-        kwargs = {
-            'limit': limit,
-            'offset': offset,
-            'filter': filter,
-            'fields': fields,
-            'sort': sort,
-        }
-        params = self._create_endpoint_params('get', 'virtual_numbers', user_id=user_id, **kwargs)
         response = self._send_api_request(params)
-        return map(VirtualNumber.from_dict, response)
-
-    def get_available_virtual_numbers(self, limit: Optional[int] = None, offset: Optional[int] = None,
-                                      filter: dict = None, fields: list = None, sort: list = None,
-                                      user_id: Optional[int] = None) -> Union[map, ComagicException]:
-        if not fields:
-            fields = AvailableVirtualNumber.fields()
-        kwargs = {
-            'limit': limit,
-            'offset': offset,
-            'filter': filter,
-            'fields': fields,
-            'sort': sort,
-        }
-        params = self._create_endpoint_params('get', 'available_virtual_numbers', user_id=user_id, **kwargs)
-        response = self._send_api_request(params)
-        return map(AvailableVirtualNumber.from_dict, response)
+        return Account.from_dict(response[0])
 
     def enable_virtual_number(self, virtual_phone_number: str, user_id: Optional[int] = None) -> dict:
         params = self._create_endpoint_params('enable', 'virtual_numbers', user_id=user_id,
@@ -135,22 +355,11 @@ class Comagic(object):
                                               virtual_phone_number=virtual_phone_number)
         return self._send_api_request(params)
 
-    def get_sip_line_virtual_numbers(self, limit: Optional[int] = None, offset: Optional[int] = None,
-                                     filter: dict = None, fields: list = None, sort: list = None,
-                                     user_id: Optional[int] = None) -> any:
-        kwargs = {
-            'limit': limit,
-            'offset': offset,
-            'filter': filter,
-            'fields': fields,
-            'sort': sort,
-        }
-        params = self._create_endpoint_params('get', 'sip_line_virtual_numbers', user_id=user_id, **kwargs)
-        return self._send_api_request(params)
-
     def create_sip_line(self, employee_id: int, virtual_phone_number: str, user_id: Optional[int] = None) -> any:
         params = self._create_endpoint_params('create', 'sip_lines', user_id=user_id, employee_id=employee_id,
                                               virtual_phone_number=virtual_phone_number)
+        from .models import SipLine
+
         response = self._send_api_request(params)
         return SipLine.from_dict(response)
 
@@ -172,110 +381,14 @@ class Comagic(object):
         params = self._create_endpoint_params('delete', 'sip_lines', user_id=user_id, id=id)
         return self._send_api_request(params)
 
-    def get_sip_lines(self, limit: Optional[int] = None, offset: Optional[int] = None,
-                      filter: dict = None, fields: list = None, sort: list = None,
-                      user_id: Optional[int] = None) -> any:
-        kwargs = {
-            'limit': limit,
-            'offset': offset,
-            'filter': filter,
-            'fields': fields,
-            'sort': sort,
-        }
-        params = self._create_endpoint_params('get', 'sip_lines', user_id=user_id, **kwargs)
-        response = self._send_api_request(params)
-        return map(SipLine.from_dict, response)
-
     def update_sip_line_password(self, id: int, user_id: Optional[int] = None) -> Union[dict, ComagicException]:
         params = self._create_endpoint_params('update', 'sip_line_password', user_id=user_id, id=id)
         return self._send_api_request(params)
 
-    def get_scenarios(self, limit: Optional[int] = None, offset: Optional[int] = None,
-                      filter: dict = None, fields: list = None, sort: list = None,
-                      user_id: Optional[int] = None) -> any:
-        if not fields:
-            fields = Scenario.fields()
-        kwargs = {
-            'limit': limit,
-            'offset': offset,
-            'filter': filter,
-            'fields': fields,
-            'sort': sort,
-        }
-        params = self._create_endpoint_params('get', 'scenarios', user_id=user_id, **kwargs)
-        response = self._send_api_request(params)
-        return map(Scenario.from_dict, response)
-
-    def get_media_files(self, limit: Optional[int] = None, offset: Optional[int] = None,
-                        filter: dict = None, fields: list = None, sort: list = None,
-                        user_id: Optional[int] = None) -> any:
-        if not fields:
-            fields = MediaField.fields()
-        kwargs = {
-            'limit': limit,
-            'offset': offset,
-            'filter': filter,
-            'fields': fields,
-            'sort': sort,
-        }
-        params = self._create_endpoint_params('get', 'media_files', user_id=user_id, **kwargs)
-        response = self._send_api_request(params)
-        return map(MediaField.from_dict, response)
-
-    def get_campaigns(self, limit: Optional[int] = None, offset: Optional[int] = None,
-                      filter: dict = None, fields: list = None, sort: list = None,
-                      user_id: Optional[int] = None) -> any:
-        if not fields:
-            fields = Campaign.fields()
-        kwargs = {
-            'limit': limit,
-            'offset': offset,
-            'filter': filter,
-            'fields': fields,
-            'sort': sort,
-        }
-        params = self._create_endpoint_params('get', 'campaigns', user_id=user_id, **kwargs)
-        response = self._send_api_request(params)
-        return map(Campaign.from_dict, response)
-
     def delete_campaign(self, id: int, user_id: Optional[int] = None) -> Union[dict, ComagicException]:
         params = self._create_endpoint_params('delete', 'campaigns', user_id=user_id, id=id)
         return self._send_api_request(params)
 
-    def get_campaign_available_phone_numbers(self, limit: Optional[int] = None, offset: Optional[int] = None,
-                                             filter: dict = None, fields: list = None, sort: list = None,
-                                             user_id: Optional[int] = None) -> any:
-        if not fields:
-            fields = CampaignAvailablePhoneNumber.fields()
-        kwargs = {
-            'limit': limit,
-            'offset': offset,
-            'filter': filter,
-            'fields': fields,
-            'sort': sort,
-        }
-        params = self._create_endpoint_params('get', 'campaign_available_phone_numbers', user_id=user_id, **kwargs)
-        response = self._send_api_request(params)
-        return map(CampaignAvailablePhoneNumber.from_dict, response)
-
-    def get_campaign_available_redirection_phone_numbers(self, limit: Optional[int] = None,
-                                                         offset: Optional[int] = None,
-                                                         filter: dict = None, fields: list = None, sort: list = None,
-                                                         user_id: Optional[int] = None) -> any:
-        if not fields:
-            fields = CampaignAvailableRedirectPhoneNumber.fields()
-        kwargs = {
-            'limit': limit,
-            'offset': offset,
-            'filter': filter,
-            'fields': fields,
-            'sort': sort,
-        }
-        params = self._create_endpoint_params('get', 'campaign_available_redirection_phone_numbers', user_id=user_id,
-                                              **kwargs)
-        response = self._send_api_request(params)
-        return map(CampaignAvailableRedirectPhoneNumber.from_dict, response)
-
     def create_campaign(self, name: str, status: str, site_id: int, site_blocks: list,
                         campaign_conditions: list, dynamic_call_tracking: list,
                         description: Optional[str] = None, user_id: Optional[int] = None) -> any:
@@ -307,23 +420,6 @@ class Comagic(object):
         params = self._create_endpoint_params('create', 'campaign', user_id=user_id, **kwargs)
         return self._send_api_request(params)
 
-    def get_campaign_parameter_weights(self, limit: Optional[int] = None,
-                                       offset: Optional[int] = None,
-                                       filter: dict = None, fields: list = None, sort: list = None,
-                                       user_id: Optional[int] = None) -> any:
-        if not fields:
-            fields = CampaignWeight.fields()
-        kwargs = {
-            'limit': limit,
-            'offset': offset,
-            'filter': filter,
-            'fields': fields,
-            'sort': sort,
-        }
-        params = self._create_endpoint_params('get', 'campaign_parameter_weights', user_id=user_id, **kwargs)
-        response = self._send_api_request(params)
-        return CampaignWeight.from_dict(response)
-
     def update_campaign_parameter_weights(self, site_id: int, entrance_page: Optional[int] = None,
                                           referrer_domain: Optional[int] = None, search_engine: Optional[int] = None,
                                           search_query: Optional[int] = None, engine: Optional[int] = None,
@@ -408,21 +504,6 @@ class Comagic(object):
         params = self._create_endpoint_params('delete', 'sites', user_id=user_id, **kwargs)
         return self._send_api_request(params)
 
-    def get_sites(self, limit: Optional[int] = None,
-                  offset: Optional[int] = None,
-                  filter: dict = None, fields: list = None, sort: list = None,
-                  user_id: Optional[int] = None) -> any:
-        kwargs = {
-            'limit': limit,
-            'offset': offset,
-            'filter': filter,
-            'fields': fields,
-            'sort': sort,
-        }
-        params = self._create_endpoint_params('get', 'sites', user_id=user_id, **kwargs)
-        response = self._send_api_request(params)
-        return map(Site.from_dict, response)
-
     def create_site_blocks(self, site_id: int, name: str, user_id: Optional[int] = None) -> dict:
         kwargs = {
             'site_od': site_id,
@@ -431,23 +512,6 @@ class Comagic(object):
         params = self._create_endpoint_params('create', 'site_blocks', user_id=user_id, **kwargs)
         return self._send_api_request(params)
 
-    def get_site_blocks(self, limit: Optional[int] = None,
-                        offset: Optional[int] = None,
-                        filter: dict = None, fields: list = None, sort: list = None,
-                        user_id: Optional[int] = None) -> any:
-        if not fields:
-            fields = SiteBlock.fields()
-        kwargs = {
-            'limit': limit,
-            'offset': offset,
-            'filter': filter,
-            'fields': fields,
-            'sort': sort,
-        }
-        params = self._create_endpoint_params('get', 'site_blocks', user_id=user_id, **kwargs)
-        response = self._send_api_request(params)
-        return map(SiteBlock.from_dict, response)
-
     def delete_site_block(self, id: int, user_id: Optional[int] = None) -> dict:
         params = self._create_endpoint_params('delete', 'site_blocks', user_id=user_id, id=id)
         return self._send_api_request(params)
@@ -472,40 +536,6 @@ class Comagic(object):
         params = self._create_endpoint_params('delete', 'tags', user_id=user_id, id=id)
         return self._send_api_request(params)
 
-    def get_tags(self, limit: Optional[int] = None,
-                 offset: Optional[int] = None,
-                 filter: dict = None, fields: list = None, sort: list = None,
-                 user_id: Optional[int] = None) -> any:
-        if not fields:
-            fields = Tag.fields()
-        kwargs = {
-            'limit': limit,
-            'offset': offset,
-            'filter': filter,
-            'fields': fields,
-            'sort': sort,
-        }
-        params = self._create_endpoint_params('get', 'tags', user_id=user_id, **kwargs)
-        response = self._send_api_request(params)
-        return map(Tag.from_dict, response)
-
-    def get_employees(self, limit: Optional[int] = None,
-                      offset: Optional[int] = None,
-                      filter: dict = None, fields: list = None, sort: list = None,
-                      user_id: Optional[int] = None) -> any:
-        if not fields:
-            fields = Employee.fields()
-        kwargs = {
-            'limit': limit,
-            'offset': offset,
-            'filter': filter,
-            'fields': fields,
-            'sort': sort,
-        }
-        params = self._create_endpoint_params('get', 'employees', user_id=user_id, **kwargs)
-        response = self._send_api_request(params)
-        return map(Employee.from_dict, response)
-
     def create_employee(self, last_name: str, phone_numbers: list, first_name: Optional[str] = None,
                         patronymic: Optional[str] = None,
                         status: Optional[str] = None, allowed_in_call_types: Optional[list] = None,
@@ -537,11 +567,15 @@ class Comagic(object):
             'operator': operator,
         }
         params = self._create_endpoint_params('create', 'employees', user_id=user_id, **kwargs)
-        return self._send_api_request(params)
+        response = self._send_api_request(params)
+        self._run_hooks('employee_created', id=response.get('id'), user_id=user_id, **kwargs)
+        return response
 
     def delete_employee(self, id: int, user_id: Optional[int] = None) -> dict:
         params = self._create_endpoint_params('delete', 'employee', user_id=user_id, id=id)
-        return self._send_api_request(params)
+        response = self._send_api_request(params)
+        self._run_hooks('employee_deleted', id=id, user_id=user_id)
+        return response
 
     def update_employee(self, id: int, last_name: Optional[str] = None, phone_numbers: Optional[list] = None,
                         first_name: Optional[str] = None,
@@ -576,7 +610,9 @@ class Comagic(object):
             'operator': operator,
         }
         params = self._create_endpoint_params('update', 'employees', user_id=user_id, **kwargs)
-        return self._send_api_request(params)
+        response = self._send_api_request(params)
+        self._run_hooks('employee_updated', user_id=user_id, **kwargs)
+        return response
 
     def create_employees_group(self, name: str, members: Optional[list] = None,
                                group_phone_number: Optional[str] = None,
@@ -613,230 +649,11 @@ class Comagic(object):
         params = self._create_endpoint_params('update', 'group_employees', user_id=user_id, **kwargs)
         return self._send_api_request(params)
 
-    def get_employees_groups(self, limit: Optional[int] = None,
-                             offset: Optional[int] = None,
-                             filter: dict = None, fields: list = None, sort: list = None,
-                             user_id: Optional[int] = None) -> any:
-        if not fields:
-            fields = EmployeeGroup.fields()
-        kwargs = {
-            'limit': limit,
-            'offset': offset,
-            'filter': filter,
-            'fields': fields,
-            'sort': sort,
-        }
-        params = self._create_endpoint_params('get', 'group_employees', user_id=user_id, **kwargs)
-        response = self._send_api_request(params)
-        return map(EmployeeGroup.from_dict, response)
-
-    def get_customer_users(self, limit: Optional[int] = None,
-                           offset: Optional[int] = None,
-                           filter: dict = None, fields: list = None, sort: list = None,
-                           user_id: Optional[int] = None) -> any:
-        if not fields:
-            fields = CustomerUser.fields()
-        kwargs = {
-            'limit': limit,
-            'offset': offset,
-            'filter': filter,
-            'fields': fields,
-            'sort': sort,
-        }
-        params = self._create_endpoint_params('get', 'customer_users', user_id=user_id, **kwargs)
-        response = self._send_api_request(params)
-        return map(CustomerUser.from_dict, response)
-
-    def get_communication_report(self, date_from: datetime, date_till: datetime, limit: Optional[int] = None,
-                                 offset: Optional[int] = None,
-                                 filter: dict = None, fields: list = None, sort: list = None,
-                                 user_id: Optional[int] = None) -> any:
-        if not fields:
-            fields = Communication.fields()
-        kwargs = {
-            'limit': limit,
-            'offset': offset,
-            'filter': filter,
-            'fields': fields,
-            'sort': sort,
-            'date_from': date_from.strftime('%Y-%m-%d %H:%M:%S'),
-            'date_till': date_till.strftime('%Y-%m-%d %H:%M:%S'),
-        }
-        params = self._create_endpoint_params('get', 'communications_report', user_id=user_id, **kwargs)
-        response = self._send_api_request(params)
-        return map(Communication.from_dict, response)
-
-    def get_calls_report(self, date_from: datetime, date_till: datetime, limit: Optional[int] = None,
-                         offset: Optional[int] = None,
-                         filter: dict = None, fields: list = None, sort: list = None,
-                         user_id: Optional[int] = None) -> any:
-        if not fields:
-            fields = Call.fields()
-        kwargs = {
-            'limit': limit,
-            'offset': offset,
-            'filter': filter,
-            'fields': fields,
-            'sort': sort,
-            'date_from': date_from.strftime(DATETIME_FORMAT),
-            'date_till': date_till.strftime(DATETIME_FORMAT),
-        }
-        params = self._create_endpoint_params('get', 'calls_report', user_id=user_id, **kwargs)
-        response = self._send_api_request(params)
-        return map(Call.from_dict, response)
-
-    def get_call_legs_report(self, date_from: datetime, date_till: datetime, limit: Optional[int] = None,
-                             offset: Optional[int] = None,
-                             filter: dict = None, fields: list = None, sort: list = None,
-                             user_id: Optional[int] = None) -> any:
-        if not fields:
-            fields = CallLegs.fields()
-        kwargs = {
-            'limit': limit,
-            'offset': offset,
-            'filter': filter,
-            'fields': fields,
-            'sort': sort,
-            'date_from': date_from.strftime(DATETIME_FORMAT),
-            'date_till': date_till.strftime(DATETIME_FORMAT),
-        }
-        params = self._create_endpoint_params('get', 'call_legs_report', user_id=user_id, **kwargs)
-        response = self._send_api_request(params)
-        return map(CallLegs.from_dict, response)
-
-    def get_goals_report(self, date_from: datetime, date_till: datetime, limit: Optional[int] = None,
-                         offset: Optional[int] = None,
-                         filter: dict = None, fields: list = None, sort: list = None,
-                         user_id: Optional[int] = None) -> any:
-        if not fields:
-            fields = Goal.fields()
-        kwargs = {
-            'limit': limit,
-            'offset': offset,
-            'filter': filter,
-            'fields': fields,
-            'sort': sort,
-            'date_from': date_from.strftime(DATETIME_FORMAT),
-            'date_till': date_till.strftime(DATETIME_FORMAT),
-        }
-        params = self._create_endpoint_params('get', 'goals_report', user_id=user_id, **kwargs)
-        response = self._send_api_request(params)
-        return map(Goal.from_dict, response)
-
-    def get_chats_report(self, date_from: datetime, date_till: datetime, limit: Optional[int] = None,
-                         offset: Optional[int] = None,
-                         filter: dict = None, fields: list = None, sort: list = None,
-                         user_id: Optional[int] = None) -> any:
-        if not fields:
-            fields = Chat.fields()
-        kwargs = {
-            'limit': limit,
-            'offset': offset,
-            'filter': filter,
-            'fields': fields,
-            'sort': sort,
-            'date_from': date_from.strftime(DATETIME_FORMAT),
-            'date_till': date_till.strftime(DATETIME_FORMAT),
-        }
-        params = self._create_endpoint_params('get', 'chats_report', user_id=user_id, **kwargs)
-        response = self._send_api_request(params)
-        return map(Chat.from_dict, response)
-
-    def get_chat_messages_report(self, chat_id: int, limit: Optional[int] = None,
-                                 offset: Optional[int] = None,
-                                 filter: dict = None, fields: list = None, sort: list = None,
-                                 user_id: Optional[int] = None) -> any:
-        if not fields:
-            fields = ChatMessage.fields()
-        kwargs = {
-            'limit': limit,
-            'offset': offset,
-            'filter': filter,
-            'fields': fields,
-            'sort': sort,
-            'chat': chat_id
-        }
-        params = self._create_endpoint_params('get', 'chat_messages_report', user_id=user_id, **kwargs)
-        response = self._send_api_request(params)
-        return map(ChatMessage.from_dict, response)
-
-    def get_offline_messages_report(self, date_from: datetime, date_till: datetime, limit: Optional[int] = None,
-                                    offset: Optional[int] = None,
-                                    filter: dict = None, fields: list = None, sort: list = None,
-                                    user_id: Optional[int] = None) -> any:
-        if not fields:
-            fields = OfflineMessage.fields()
-        kwargs = {
-            'limit': limit,
-            'offset': offset,
-            'filter': filter,
-            'fields': fields,
-            'sort': sort,
-            'date_from': date_from.strftime(DATETIME_FORMAT),
-            'date_till': date_till.strftime(DATETIME_FORMAT),
-        }
-        params = self._create_endpoint_params('get', 'offline_messages_report', user_id=user_id, **kwargs)
-        response = self._send_api_request(params)
-        return map(OfflineMessage.from_dict, response)
-
-    def get_visitor_sessions_report(self, date_from: datetime, date_till: datetime, limit: Optional[int] = None,
-                                    offset: Optional[int] = None,
-                                    filter: dict = None, fields: list = None, sort: list = None,
-                                    user_id: Optional[int] = None) -> any:
-        if not fields:
-            fields = VisitorSession.fields()
-        kwargs = {
-            'limit': limit,
-            'offset': offset,
-            'filter': filter,
-            'fields': fields,
-            'sort': sort,
-            'date_from': date_from.strftime(DATETIME_FORMAT),
-            'date_till': date_till.strftime(DATETIME_FORMAT),
-        }
-        params = self._create_endpoint_params('get', 'visitor_sessions_report', user_id=user_id, **kwargs)
-        response = self._send_api_request(params)
-        return map(VisitorSession.from_dict, response)
-
-    def get_financial_call_legs_report(self, date_from: datetime, date_till: datetime, limit: Optional[int] = None,
-                                       offset: Optional[int] = None,
-                                       filter: dict = None, fields: list = None, sort: list = None,
-                                       user_id: Optional[int] = None) -> any:
-        if not fields:
-            fields = FinancialCallLegs.fields()
-        kwargs = {
-            'limit': limit,
-            'offset': offset,
-            'filter': filter,
-            'fields': fields,
-            'sort': sort,
-            'date_from': date_from.strftime(DATETIME_FORMAT),
-            'date_till': date_till.strftime(DATETIME_FORMAT),
-        }
-        params = self._create_endpoint_params('get', 'financial_call_legs_report', user_id=user_id, **kwargs)
-        response = self._send_api_request(params)
-        return map(FinancialCallLegs.from_dict, response)
-
-    def get_contacts(self, limit: Optional[int] = None,
-                     offset: Optional[int] = None,
-                     filter: dict = None, fields: list = None, sort: list = None,
-                     user_id: Optional[int] = None) -> any:
-        if not fields:
-            fields = Contact.fields()
-        kwargs = {
-            'limit': limit,
-            'offset': offset,
-            'filter': filter,
-            'fields': fields,
-            'sort': sort,
-        }
-        params = self._create_endpoint_params('get', 'contacts', user_id=user_id, **kwargs)
-        response = self._send_api_request(params)
-        return map(Contact.from_dict, response)
-
     def delete_contact(self, id: int, user_id: Optional[int] = None) -> any:
         params = self._create_endpoint_params('delete', 'contacts', user_id=user_id, id=id)
-        return self._send_api_request(params)
+        response = self._send_api_request(params)
+        self._run_hooks('contact_deleted', id=id, user_id=user_id)
+        return response
 
     def create_contact(self, last_name: str, phone_numbers: list, first_name: Optional[str] = None,
                        patronymic: Optional[str] = None, emails: Optional[list] = None,
@@ -853,7 +670,9 @@ class Comagic(object):
             'groups': groups,
         }
         params = self._create_endpoint_params('create', 'contacts', user_id=user_id, **kwargs)
-        return self._send_api_request(params)
+        response = self._send_api_request(params)
+        self._run_hooks('contact_created', id=response.get('id'), user_id=user_id, **kwargs)
+        return response
 
     def update_contact(self, id: int, last_name: str, phone_numbers: list, first_name: Optional[str] = None,
                        patronymic: Optional[str] = None, emails: Optional[list] = None,
@@ -871,7 +690,9 @@ class Comagic(object):
             'groups': groups,
         }
         params = self._create_endpoint_params('update', 'contacts', user_id=user_id, **kwargs)
-        return self._send_api_request(params)
+        response = self._send_api_request(params)
+        self._run_hooks('contact_updated', user_id=user_id, **kwargs)
+        return response
 
     def create_contact_group(self, name: str, members: Optional[list] = None, user_id: Optional[int] = None) -> dict:
         params = self._create_endpoint_params('create', 'group_contacts', user_id=user_id, name=name, members=members)
@@ -887,40 +708,6 @@ class Comagic(object):
                                               members=members, id=id)
         return self._send_api_request(params)
 
-    def get_contact_groups(self, limit: Optional[int] = None,
-                           offset: Optional[int] = None,
-                           filter: dict = None, fields: list = None, sort: list = None,
-                           user_id: Optional[int] = None) -> any:
-        if not fields:
-            fields = ContactGroup.fields()
-        kwargs = {
-            'limit': limit,
-            'offset': offset,
-            'filter': filter,
-            'fields': fields,
-            'sort': sort,
-        }
-        params = self._create_endpoint_params('get', 'group_contacts', user_id=user_id, **kwargs)
-        response = self._send_api_request(params)
-        return map(ContactGroup.from_dict, response)
-
-    def get_contact_organizations(self, limit: Optional[int] = None,
-                                  offset: Optional[int] = None,
-                                  filter: dict = None, fields: list = None, sort: list = None,
-                                  user_id: Optional[int] = None) -> any:
-        if not fields:
-            fields = ContactOrganization.fields()
-        kwargs = {
-            'limit': limit,
-            'offset': offset,
-            'filter': filter,
-            'fields': fields,
-            'sort': sort,
-        }
-        params = self._create_endpoint_params('get', 'contact_organizations', user_id=user_id, **kwargs)
-        response = self._send_api_request(params)
-        return map(ContactOrganization.from_dict, response)
-
     def create_contact_organization(self, name: str, user_id: Optional[int] = None) -> dict:
         params = self._create_endpoint_params('create', 'contact_organizations', user_id=user_id, name=name)
         return self._send_api_request(params)
@@ -933,23 +720,6 @@ class Comagic(object):
         params = self._create_endpoint_params('delete', 'contact_organizations', user_id=user_id, id=id)
         return self._send_api_request(params)
 
-    def get_schedules(self, limit: Optional[int] = None,
-                      offset: Optional[int] = None,
-                      filter: dict = None, fields: list = None, sort: list = None,
-                      user_id: Optional[int] = None) -> any:
-        if not fields:
-            fields = Schedule.fields()
-        kwargs = {
-            'limit': limit,
-            'offset': offset,
-            'filter': filter,
-            'fields': fields,
-            'sort': sort,
-        }
-        params = self._create_endpoint_params('get', 'schedules', user_id=user_id, **kwargs)
-        response = self._send_api_request(params)
-        return map(Schedule.from_dict, response)
-
     def create_schedule(self, name: str, schedules: Optional[list] = None, user_id: Optional[int] = None) -> dict:
         params = self._create_endpoint_params('create', 'schedules', user_id=user_id, name=name, schedules=schedules)
         return self._send_api_request(params)
@@ -963,39 +733,3 @@ class Comagic(object):
         params = self._create_endpoint_params('update', 'schedules', user_id=user_id,
                                               id=id, name=name, schedules=schedules)
         return self._send_api_request(params)
-
-    def get_campaign_daily_stat(self, date_from: datetime, date_till: datetime, limit: Optional[int] = None,
-                                offset: Optional[int] = None,
-                                filter: dict = None, fields: list = None, sort: list = None,
-                                user_id: Optional[int] = None) -> any:
-        if not fields:
-            fields = CampaignDailyStat.fields()
-        kwargs = {
-            'limit': limit,
-            'offset': offset,
-            'filter': filter,
-            'fields': fields,
-            'sort': sort,
-            'date_from': date_from.strftime(DATETIME_FORMAT),
-            'date_till': date_till.strftime(DATETIME_FORMAT),
-        }
-        params = self._create_endpoint_params('get', 'campaign_daily_stat', user_id=user_id, **kwargs)
-        response = self._send_api_request(params)
-        return map(CampaignDailyStat.from_dict, response)
-
-    def get_customers(self, limit: Optional[int] = None,
-                      offset: Optional[int] = None,
-                      filter: dict = None, fields: list = None, sort: list = None,
-                      user_id: Optional[int] = None) -> any:
-        if not fields:
-            fields = Customer.fields()
-        kwargs = {
-            'limit': limit,
-            'offset': offset,
-            'filter': filter,
-            'fields': fields,
-            'sort': sort,
-        }
-        params = self._create_endpoint_params('get', 'customers', user_id=user_id, **kwargs)
-        response = self._send_api_request(params)
-        return map(Customer.from_dict, response)
\ No newline at end of file
@@ -0,0 +1,216 @@
+"""
+Report decoding on a process pool.
+
+For large pages ``json.loads`` plus ``from_dict`` is CPU bound and holds the GIL. ``ProcessDecoder`` hands the
+raw response bytes to worker processes, which decode the rows with the model ``from_dict`` and send back compact
+tuples (or columns). Payloads travel through ``multiprocessing.shared_memory`` blocks instead of the pool pipes
+when available (python 3.8+). ``iter_decoded_pages`` keeps fetching the next pages while earlier ones decode::
+
+    with ProcessDecoder(processes=4) as decoder:
+        query = client.query('calls_report').between(date_from, date_till).select('id', 'start_time', 'tags')
+        for page in iter_decoded_pages(query, decoder, output='tuples'):
+            for id, start_time, tags in page.rows:
+                ...
+"""
+import json
+import math
+import pickle
+from collections import deque, namedtuple
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Iterator, Optional
+
+from .errors import ComagicException
+from .pagination import MAX_LIMIT
+from .utils import DATETIME_FORMAT
+
+try:
+    from multiprocessing import shared_memory
+except ImportError:  # python 3.7
+    shared_memory = None
+
+OUTPUTS = ('tuples', 'columns', 'models')
+
+# fields: row layout, rows: list of tuples / dict of columns / list of models, total_items: api metadata
+DecodedPage = namedtuple('DecodedPage', ['fields', 'rows', 'total_items'])
+
+
+def _to_shared(data: bytes) -> tuple:
+    block = shared_memory.SharedMemory(create=True, size=max(len(data), 1))
+    block.buf[:len(data)] = data
+    name = block.name
+    block.close()
+    return name, len(data)
+
+
+def _from_shared(name: str, size: int, unlink: bool) -> bytes:
+    block = shared_memory.SharedMemory(name=name)
+    try:
+        return bytes(block.buf[:size])
+    finally:
+        block.close()
+        if unlink:
+            block.unlink()
+
+
+def _decode(payload: any, model_name: str, fields: list, output: str, shared: bool) -> any:
+    """Worker side: raw json-rpc response -> pickled (fields, rows, total_items) or error."""
+    from . import models
+
+    content = _from_shared(*payload, unlink=True) if shared else payload
+    response = json.loads(content)
+    if 'error' in response:
+        result = ('error', response['error'])
+    else:
+        model = getattr(models, model_name)
+        data = response['result']['data']
+        total_items = (response['result'].get('metadata') or {}).get('total_items')
+        decoded = [model.from_dict(row).__dict__ for row in data]
+        if output == 'columns':
+            rows = {field: [row.get(field) for row in decoded] for field in fields}
+        else:
+            rows = [tuple(row.get(field) for field in fields) for row in decoded]
+        result = ('ok', (fields, rows, total_items))
+    data = pickle.dumps(result, pickle.HIGHEST_PROTOCOL)
+    return _to_shared(data) if shared else data
+
+
+class ProcessDecoder(object):
+    def __init__(self, processes: Optional[int] = None, use_shared_memory: bool = True) -> None:
+        """
+        :param processes: int (worker processes, cpu count by default)
+        :param use_shared_memory: bool (pass payloads through shared memory blocks, needs python 3.8+)
+        """
+        self.processes = processes
+        self.shared = bool(use_shared_memory and shared_memory is not None)
+        self._executor = ProcessPoolExecutor(max_workers=processes)
+
+    def submit(self, content: bytes, model: type, fields: list, output: str = 'tuples') -> any:
+        """
+        :param content: bytes (raw json-rpc response)
+        :return: Future of the worker result, pass it to result()
+        """
+        if output not in OUTPUTS:
+            raise ValueError(f'output must be in {list(OUTPUTS)}')
+        payload = _to_shared(content) if self.shared else content
+        worker_output = 'tuples' if output == 'models' else output
+        try:
+            return self._executor.submit(_decode, payload, model.__name__, list(fields), worker_output, self.shared)
+        except Exception:
+            if self.shared:
+                _from_shared(*payload, unlink=True)
+            raise
+
+    def result(self, future: any, model: type, output: str = 'tuples') -> DecodedPage:
+        """
+        :return: DecodedPage (or raise ComagicException for api errors)
+        """
+        data = future.result()
+        status, value = pickle.loads(_from_shared(*data, unlink=True) if self.shared else data)
+        if status == 'error':
+            raise ComagicException(value)
+        fields, rows, total_items = value
+        if output == 'models':
+            rows = [_model(model, fields, row) for row in rows]
+        return DecodedPage(fields, rows, total_items)
+
+    def discard(self, future: any) -> None:
+        """Drop a submitted page without reading it, frees its shared memory."""
+        data = future.result()
+        if self.shared:
+            _from_shared(*data, unlink=True)
+
+    def decode(self, content: bytes, model: type, fields: list, output: str = 'tuples') -> DecodedPage:
+        return self.result(self.submit(content, model, fields, output), model, output)
+
+    def close(self) -> None:
+        self._executor.shutdown()
+
+    def __enter__(self) -> 'ProcessDecoder':
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+def _model(model: type, fields: list, row: tuple) -> any:
+    # rows were built by from_dict in the worker, only the attributes are restored here
+    instance = model.__new__(model)
+    instance.__dict__.update(zip(fields, row))
+    return instance
+
+
+def _request_params(query: any, limit: int, offset: int) -> dict:
+    params = query.params()
+    fields = params['fields'] or list(dict.fromkeys(query.model.fields()))
+    kwargs = {'limit': limit, 'offset': offset, 'filter': params['filter'], 'fields': fields, 'sort': params['sort']}
+    if query.endpoint.date_field:
+        kwargs['date_from'] = params['date_from'].strftime(DATETIME_FORMAT)
+        kwargs['date_till'] = params['date_till'].strftime(DATETIME_FORMAT)
+    if 'chat_id' in params:
+        kwargs['chat'] = params['chat_id']
+    return query.client._create_endpoint_params('get', query.endpoint.name, user_id=params['user_id'], **kwargs)
+
+
+def iter_decoded_pages(query: any, decoder: ProcessDecoder, page_size: int = MAX_LIMIT, output: str = 'tuples',
+                       prefetch: int = 4, fetchers: int = 2) -> Iterator[DecodedPage]:
+    """
+    Offset pages of a ReportQuery, fetched on threads and decoded on the process pool, in order.
+
+    :param query: ReportQuery
+    :param decoder: ProcessDecoder
+    :param page_size: int
+    :param output: str (tuples, columns or models with only the requested fields set)
+    :param prefetch: int (pages fetched or decoding ahead of the consumer)
+    :param fetchers: int (threads fetching raw pages)
+    :return: iterator of DecodedPage
+    """
+    if not 0 < page_size <= MAX_LIMIT:
+        raise ValueError(f'page_size must be in [1, {MAX_LIMIT}]')
+    client, model = query.client, query.model
+    start = query._offset or 0
+    fields = _request_params(query, 1, 0)['params']['fields']
+
+    def fetch_and_submit(limit: int, offset: int) -> any:
+        # same token refresh and retries as the client reads, the page itself stays undecoded
+        params = _request_params(query, limit, offset)
+        content = client._retrying(query.endpoint, client._send_undecoded_request, params)
+        return decoder.submit(content, model, fields, output)
+
+    # the first page tells how many rows there are, the rest is fetched ahead
+    first_limit = page_size if query._limit is None else min(page_size, query._limit)
+    first = decoder.result(fetch_and_submit(first_limit, start), model, output)
+    yield first
+    total = first.total_items if first.total_items is not None else math.inf
+    if query._limit is not None:
+        total = min(total, start + query._limit)
+    rows = len(first.rows[fields[0]]) if output == 'columns' and fields else len(first.rows)
+    if rows < first_limit:
+        return
+    offsets = iter(range(start + first_limit, total, page_size)) if total != math.inf else None
+    if offsets is None:
+        # no total_items: fall back to one page at a time
+        offset = start + first_limit
+        while True:
+            page = decoder.result(fetch_and_submit(page_size, offset), model, output)
+            yield page
+            count = len(page.rows[fields[0]]) if output == 'columns' and fields else len(page.rows)
+            if count < page_size:
+                return
+            offset += count
+
+    with ThreadPoolExecutor(max_workers=fetchers) as executor:
+        pending = deque()
+        try:
+            for offset in offsets:
+                if len(pending) >= prefetch:
+                    yield decoder.result(pending.popleft().result(), model, output)
+                pending.append(executor.submit(fetch_and_submit, min(page_size, total - offset), offset))
+            while pending:
+                yield decoder.result(pending.popleft().result(), model, output)
+        finally:
+            for future in pending:
+                if not future.cancel():
+                    try:
+                        decoder.discard(future.result())
+                    except Exception:
+                        pass
@@ -0,0 +1,208 @@
+"""
+Registry of the read endpoints.
+
+Every ``get_*`` method of ``Comagic`` is generated from an ``Endpoint`` together with an ``iter_*`` variant that
+pages through all rows and an ``aget_*`` coroutine that runs the read on a worker thread. All of them end in
+``Comagic._read``, so defaults, date formatting and retries work the same way for every endpoint.
+
+Models are named, not imported, and the methods are built on first access: ``from comagic import Comagic`` loads
+neither ``comagic.models`` nor ``inspect``.
+"""
+import importlib
+from collections import namedtuple
+from datetime import datetime
+from typing import Callable, Optional, Union
+
+from .pagination import MAX_LIMIT, AdaptivePageSizer, iter_offset_pages
+
+# name: api entity (get.<name>), method: Comagic method, model: model class or its name (dotted path, or a
+# class of comagic.models), date_field: column bounded by date_from/date_till, result: rows (map of models), model
+# (one model) or raw (api data as is), default_fields: request every model field when none are given,
+# args: (param, api name, type) sent before the paging params, idempotent: the read may be sent again after a
+# transient error
+_Endpoint = namedtuple('Endpoint', ['name', 'method', 'model', 'date_field', 'result', 'default_fields', 'args',
+                                    'idempotent'], defaults=('rows', True, (), True))
+
+
+class Endpoint(_Endpoint):
+    __slots__ = ()
+
+    @property
+    def model(self) -> Optional[type]:
+        model = super().model
+        if not isinstance(model, str):
+            return model
+        module, _, name = model.rpartition('.')
+        return getattr(importlib.import_module(module or f'{__package__}.models'), name)
+
+ENDPOINTS = {
+    endpoint.name: endpoint for endpoint in (
+        Endpoint('virtual_numbers', 'get_virtual_numbers', 'VirtualNumber', None),
+        Endpoint('available_virtual_numbers', 'get_available_virtual_numbers', 'AvailableVirtualNumber', None),
+        Endpoint('sip_line_virtual_numbers', 'get_sip_line_virtual_numbers', None, None, result='raw',
+                 default_fields=False),
+        Endpoint('sip_lines', 'get_sip_lines', 'SipLine', None, default_fields=False),
+        Endpoint('scenarios', 'get_scenarios', 'Scenario', None),
+        Endpoint('media_files', 'get_media_files', 'MediaField', None),
+        Endpoint('campaigns', 'get_campaigns', 'Campaign', None),
+        Endpoint('campaign_available_phone_numbers', 'get_campaign_available_phone_numbers',
+                 'CampaignAvailablePhoneNumber', None),
+        Endpoint('campaign_available_redirection_phone_numbers', 'get_campaign_available_redirection_phone_numbers',
+                 'CampaignAvailableRedirectPhoneNumber', None),
+        Endpoint('campaign_parameter_weights', 'get_campaign_parameter_weights', 'CampaignWeight', None,
+                 result='model'),
+        Endpoint('sites', 'get_sites', 'Site', None, default_fields=False),
+        Endpoint('site_blocks', 'get_site_blocks', 'SiteBlock', None),
+        Endpoint('tags', 'get_tags', 'Tag', None),
+        Endpoint('employees', 'get_employees', 'Employee', None),
+        Endpoint('group_employees', 'get_employees_groups', 'EmployeeGroup', None),
+        Endpoint('customer_users', 'get_customer_users', 'CustomerUser', None),
+        Endpoint('customers', 'get_customers', 'Customer', None),
+        Endpoint('contacts', 'get_contacts', 'Contact', None),
+        Endpoint('group_contacts', 'get_contact_groups', 'ContactGroup', None),
+        Endpoint('contact_organizations', 'get_contact_organizations', 'ContactOrganization', None),
+        Endpoint('schedules', 'get_schedules', 'Schedule', None),
+        Endpoint('communications_report', 'get_communication_report', 'Communication', 'date_time'),
+        Endpoint('calls_report', 'get_calls_report', 'Call', 'start_time'),
+        Endpoint('call_legs_report', 'get_call_legs_report', 'CallLegs', 'start_time'),
+        Endpoint('goals_report', 'get_goals_report', 'Goal', 'date_time'),
+        Endpoint('chats_report', 'get_chats_report', 'Chat', 'date_time'),
+        Endpoint('chat_messages_report', 'get_chat_messages_report', 'ChatMessage', None,
+                 args=(('chat_id', 'chat', int),)),
+        Endpoint('offline_messages_report', 'get_offline_messages_report', 'OfflineMessage', 'date_time'),
+        Endpoint('visitor_sessions_report', 'get_visitor_sessions_report', 'VisitorSession', 'date_time'),
+        Endpoint('financial_call_legs_report', 'get_financial_call_legs_report', 'FinancialCallLegs', 'start_time'),
+        Endpoint('campaign_daily_stat', 'get_campaign_daily_stat', 'CampaignDailyStat', 'date'),
+    )
+}
+
+
+def get_endpoint(name: str) -> Endpoint:
+    """
+    :param name: str (api entity, e.g. calls_report, or the Comagic method name, e.g. get_calls_report)
+    :return: Endpoint
+    """
+    if name in ENDPOINTS:
+        return ENDPOINTS[name]
+    for endpoint in ENDPOINTS.values():
+        if endpoint.method == name:
+            return endpoint
+    raise KeyError(f'unknown endpoint {name}')
+
+
+def _signature(endpoint: Endpoint, paging: bool) -> 'inspect.Signature':
+    import inspect
+
+    def param(name: str, annotation: any, default: any = inspect.Parameter.empty) -> inspect.Parameter:
+        return inspect.Parameter(name, inspect.Parameter.POSITIONAL_OR_KEYWORD, default=default, annotation=annotation)
+
+    params = [param('self', inspect.Parameter.empty)]
+    if endpoint.date_field:
+        params += [param('date_from', datetime), param('date_till', datetime)]
+    params += [param(name, annotation) for name, _, annotation in endpoint.args]
+    if paging:
+        params += [param('limit', Optional[int], None), param('offset', Optional[int], None)]
+    params += [param('filter', dict, None), param('fields', list, None), param('sort', list, None),
+               param('user_id', Optional[int], None)]
+    if not paging:
+        params.append(param('page_size', Union[int, AdaptivePageSizer], MAX_LIMIT))
+    return inspect.Signature(params, return_annotation=any)
+
+
+def _named(function: Callable, name: str, signature: 'inspect.Signature', doc: str) -> Callable:
+    function.__name__ = name
+    function.__qualname__ = f'Comagic.{name}'
+    function.__signature__ = signature
+    function.__doc__ = doc
+    return function
+
+
+def _bind(signature: 'inspect.Signature', client: any, args: tuple, kwargs: dict) -> dict:
+    params = signature.bind(client, *args, **kwargs).arguments
+    params.pop('self')
+    return params
+
+
+def read_method(endpoint: Endpoint) -> Callable:
+    """
+    :return: function (Comagic.get_* method, one request)
+    """
+    signature = _signature(endpoint, paging=True)
+
+    def method(self, *args, **kwargs) -> any:
+        return self._read(endpoint, **_bind(signature, self, args, kwargs))
+
+    return _named(method, endpoint.method, signature, f'get.{endpoint.name}')
+
+
+def iter_method(endpoint: Endpoint) -> Callable:
+    """
+    :return: function (Comagic.iter_* method, every row page by page)
+    """
+    signature = _signature(endpoint, paging=False)
+
+    def method(self, *args, **kwargs) -> any:
+        params = _bind(signature, self, args, kwargs)
+        page_size = params.pop('page_size', MAX_LIMIT)
+
+        def fetch(limit: int, offset: int) -> list:
+            return list(self._read(endpoint, limit=limit, offset=offset, **params))
+
+        def response_size() -> Optional[int]:
+            return self.last_response['size'] if self.last_response else None
+
+        key = f'{endpoint.name}:{",".join(sorted(params.get("fields") or ["*"]))}'
+        pages = iter_offset_pages(fetch, page_size, key=key, response_size=response_size)
+        return (row for page in pages for row in page)
+
+    return _named(method, f'iter_{endpoint.method[len("get_"):]}', signature,
+                  f'get.{endpoint.name}, every row (offset paging)')
+
+
+def async_method(endpoint: Endpoint) -> Callable:
+    """
+    :return: coroutine function (Comagic.aget_* method, the request runs on the loop's default executor)
+    """
+    signature = _signature(endpoint, paging=True)
+
+    async def method(self, *args, **kwargs) -> any:
+        import asyncio
+
+        params = _bind(signature, self, args, kwargs)
+        return await asyncio.get_running_loop().run_in_executor(None, self._read_all, endpoint, params)
+
+    return _named(method, f'a{endpoint.method}', signature, f'get.{endpoint.name} (rows as a list)')
+
+
+class _LazyMethod(object):
+    """Class attribute replaced by the generated method the first time it is looked up."""
+
+    def __init__(self, cls: type, name: str, factory: Callable, endpoint: Endpoint) -> None:
+        self.cls = cls
+        self.name = name
+        self.factory = factory
+        self.endpoint = endpoint
+
+    def __get__(self, instance: any, owner: Optional[type] = None) -> any:
+        method = self.factory(self.endpoint)
+        setattr(self.cls, self.name, method)
+        return method.__get__(instance, owner)
+
+
+def _method_names(endpoint: Endpoint) -> list:
+    names = [(endpoint.method, read_method), (f'a{endpoint.method}', async_method)]
+    if endpoint.result == 'rows':
+        names.append((f'iter_{endpoint.method[len("get_"):]}', iter_method))
+    return names
+
+
+def bind_endpoints(cls: type) -> type:
+    """
+    Class decorator adding the get_*, iter_* (rows endpoints) and aget_* methods of every registered endpoint,
+    methods defined on the class itself are kept.
+    """
+    for endpoint in ENDPOINTS.values():
+        for name, factory in _method_names(endpoint):
+            if name not in vars(cls):
+                setattr(cls, name, _LazyMethod(cls, name, factory, endpoint))
+    return cls
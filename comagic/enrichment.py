@@ -0,0 +1,208 @@
+"""
+Dimension enrichment for streamed report rows.
+
+Report rows carry ids (``site_id``, ``campaign_id``, ``scenario_id``, ``last_answered_employee_id``,
+``contact_id``). ``Enricher`` loads the matching dimensions once per tenant (``user_id``) into id -> tuple
+indexes, refreshes them on a background thread and sets the resolved attributes on every row as
+``enriched_<dimension>_<attribute>``, next to the fields the api returned::
+
+    with Enricher(client, refresh_interval=600) as enricher:
+        for call in enricher.enrich(client.get_calls_report(date_from, date_till)):
+            print(call.enriched_employee_full_name, call.enriched_contact_organization_name)
+
+Ids missing from an index (e.g. an employee created after the load) resolve to None and mark the dimension
+for an early refresh.
+"""
+import sys
+import threading
+import time
+from collections import namedtuple
+from typing import Iterable, Iterator, Optional
+
+from .errors import ComagicParamsError
+from .pagination import MAX_LIMIT
+
+# prefix of the attributes set by Enricher.enrich, keeps them apart from the model fields
+ENRICHED_PREFIX = 'enriched_'
+# name: attribute prefix, endpoint: list endpoint, key: id field of the report row, attributes: dimension fields
+Dimension = namedtuple('Dimension', ['name', 'endpoint', 'key', 'attributes'])
+
+DEFAULT_DIMENSIONS = (
+    Dimension('site', 'sites', 'site_id', ('domain_name', 'industry_name')),
+    Dimension('campaign', 'campaigns', 'campaign_id', ('name', 'status', 'type')),
+    Dimension('scenario', 'scenarios', 'scenario_id', ('name',)),
+    Dimension('employee', 'employees', 'last_answered_employee_id', ('full_name', 'email', 'status')),
+    Dimension('contact', 'contacts', 'contact_id', ('full_name', 'organization_name', 'personal_manager_full_name')),
+)
+
+
+class DimensionIndex(object):
+    """Attributes of one dimension as ``id -> tuple``, strings interned."""
+
+    def __init__(self, dimension: Dimension, rows: Iterable) -> None:
+        self.dimension = dimension
+        self.loaded_at = time.time()
+        self._rows = {}
+        for row in rows:
+            values = tuple(sys.intern(value) if isinstance(value, str) else value
+                           for value in (getattr(row, attribute, None) for attribute in dimension.attributes))
+            self._rows[row.id] = values
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def __contains__(self, id: any) -> bool:
+        return id in self._rows
+
+    def get(self, id: any) -> Optional[tuple]:
+        return self._rows.get(id)
+
+
+class Enricher(object):
+    def __init__(self, client: any, dimensions: Iterable[Dimension] = DEFAULT_DIMENSIONS,
+                 refresh_interval: Optional[float] = 600, min_refresh_interval: float = 30,
+                 page_size: int = MAX_LIMIT) -> None:
+        """
+        :param client: Comagic
+        :param dimensions: iterable of Dimension
+        :param refresh_interval: float (seconds between background reloads, None to never reload)
+        :param min_refresh_interval: float (a dimension is reloaded at most this often on unknown ids)
+        :param page_size: int (rows per dimension request)
+        """
+        self.client = client
+        self.dimensions = {dimension.name: dimension for dimension in dimensions}
+        self.refresh_interval = refresh_interval
+        self.min_refresh_interval = min_refresh_interval
+        self.page_size = page_size
+        self.stats = {'rows': 0, 'hits': 0, 'misses': 0, 'loads': 0, 'refresh_errors': 0}
+        self._names = {name: tuple(f'{ENRICHED_PREFIX}{name}_{attribute}' for attribute in dimension.attributes)
+                       for name, dimension in self.dimensions.items()}
+        self._checked = set()
+        self._indexes = {}
+        # bumped on every load, a running enrich() picks up reloaded indexes when it changes
+        self._generation = 0
+        self._stale = set()
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._closed = False
+        self._thread = None
+
+    def _load(self, user_id: Optional[int], dimension: Dimension) -> DimensionIndex:
+        query = self.client.query(dimension.endpoint).select('id', *dimension.attributes).for_user(user_id)
+        index = DimensionIndex(dimension, query.iter(page_size=self.page_size))
+        with self._lock:
+            self._indexes[user_id, dimension.name] = index
+            self._generation += 1
+            self.stats['loads'] += 1
+        return index
+
+    def index(self, name: str, user_id: Optional[int] = None) -> DimensionIndex:
+        """
+        :return: DimensionIndex (loaded on first use for this tenant)
+        """
+        if name not in self.dimensions:
+            raise ComagicParamsError(f'unknown dimension {name}')
+        index = self._indexes.get((user_id, name))
+        if index is None:
+            index = self._load(user_id, self.dimensions[name])
+            self._start()
+        return index
+
+    def preload(self, user_id: Optional[int] = None) -> None:
+        for name in self.dimensions:
+            self.index(name, user_id)
+
+    def refresh(self, user_id: Optional[int] = None, name: Optional[str] = None) -> None:
+        """Reload one dimension, or all dimensions of the tenant, now."""
+        for dimension in self.dimensions.values():
+            if name is None or dimension.name == name:
+                self._load(user_id, dimension)
+
+    def _check_model(self, model: type) -> None:
+        if model in self._checked or not hasattr(model, 'fields'):
+            return
+        fields = set(model.fields())
+        clashes = [name for names in self._names.values() for name in names if name in fields]
+        if clashes:
+            raise ComagicParamsError(f'enriched attributes clash with {model.__name__} fields: {", ".join(clashes)}')
+        self._checked.add(model)
+
+    def enrich(self, rows: Iterable, user_id: Optional[int] = None) -> Iterator:
+        """
+        :param rows: iterable of models or dicts
+        :param user_id: int (tenant the rows belong to)
+        :return: iterator of the same rows with ``enriched_<dimension>_<attribute>`` set
+        """
+        generation = None
+        indexes = []
+        for row in rows:
+            if generation != self._generation:
+                # first row, or an index was reloaded (background refresh or a miss) since the last row
+                indexes = [(dimension, self.index(dimension.name, user_id), self._names[dimension.name])
+                           for dimension in self.dimensions.values()]
+                generation = self._generation
+            is_dict = isinstance(row, dict)
+            if not is_dict:
+                self._check_model(type(row))
+            for dimension, index, names in indexes:
+                id = row.get(dimension.key) if is_dict else getattr(row, dimension.key, None)
+                values = index.get(id) if id is not None else None
+                if values is None:
+                    values = (None,) * len(names)
+                    if id is not None:
+                        self._miss(user_id, dimension, index)
+                else:
+                    self.stats['hits'] += 1
+                for name, value in zip(names, values):
+                    if is_dict:
+                        row[name] = value
+                    else:
+                        setattr(row, name, value)
+            self.stats['rows'] += 1
+            yield row
+
+    def _miss(self, user_id: Optional[int], dimension: Dimension, index: DimensionIndex) -> None:
+        self.stats['misses'] += 1
+        if time.time() - index.loaded_at >= self.min_refresh_interval:
+            with self._lock:
+                self._stale.add((user_id, dimension.name))
+            self._wake.set()
+
+    def _start(self) -> None:
+        with self._lock:
+            if self._thread is not None or self._closed:
+                return
+            self._thread = threading.Thread(target=self._refresh_loop, name='comagic-enricher', daemon=True)
+            self._thread.start()
+
+    def _refresh_loop(self) -> None:
+        while not self._closed:
+            self._wake.wait(self.refresh_interval)
+            self._wake.clear()
+            if self._closed:
+                return
+            now = time.time()
+            with self._lock:
+                due = {key for key, index in self._indexes.items()
+                       if self.refresh_interval is not None and now - index.loaded_at >= self.refresh_interval}
+                due |= {key for key in self._stale
+                        if now - self._indexes[key].loaded_at >= self.min_refresh_interval}
+                self._stale.clear()
+            for user_id, name in due:
+                try:
+                    self._load(user_id, self.dimensions[name])
+                except Exception:
+                    # the previous index keeps serving, the next round retries
+                    self.stats['refresh_errors'] += 1
+
+    def close(self) -> None:
+        self._closed = True
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def __enter__(self) -> 'Enricher':
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
@@ -1,3 +1,11 @@
+# code of ComagicException raised when an http request runs into the client timeout
+TIMEOUT_ERROR_CODE = 504
+# api error code when the per minute request limit is exceeded
+RATE_LIMIT_ERROR_CODE = -32029
+# transient errors after which a read can be sent again
+RETRY_ERROR_CODES = (RATE_LIMIT_ERROR_CODE, TIMEOUT_ERROR_CODE, 502)
+
+
 class ComagicException(Exception):
     def __init__(self, error_data, *args, **kwargs):
         self.error_data = error_data
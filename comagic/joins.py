@@ -0,0 +1,268 @@
+"""
+Streaming hash joins over report rows.
+
+One side (``build``) is loaded into a hash table on the join key, the other side is streamed past it, so only
+the build side is held in memory. When the build side grows past ``memory_budget`` bytes both sides are
+partitioned by key hash into temporary files and joined one partition at a time::
+
+    calls = client.get_calls_report(date_from, date_till)
+    legs = client.get_call_legs_report(date_from, date_till)
+    for call in calls_with_legs(calls, legs, memory_budget=256 * 1024 * 1024):
+        print(call['id'], len(call['legs']))
+
+Rows may be models or dicts, joined records are dicts. Records come out in stream order until the join spills,
+then partition by partition.
+"""
+import os
+import pickle
+import shutil
+import tempfile
+from typing import Iterable, Iterator, Optional
+
+from .errors import ComagicParamsError
+
+DEFAULT_MEMORY_BUDGET = 128 * 1024 * 1024
+DEFAULT_PARTITIONS = 32
+# partitions that still don't fit are partitioned again with another hash salt, at most this deep
+MAX_SPILL_DEPTH = 3
+# pickled size is measured for the first rows and then for every SIZE_SAMPLE-th row
+SIZE_SAMPLE = 64
+
+
+def _as_dict(row: any) -> dict:
+    return row if isinstance(row, dict) else dict(vars(row))
+
+
+class _SizeEstimate(object):
+    def __init__(self) -> None:
+        self.rows = 0
+        self.sampled_rows = 0
+        self.sampled_bytes = 0
+
+    def add(self, row: dict) -> int:
+        """
+        :return: int (estimated bytes of all rows added so far)
+        """
+        if self.rows < SIZE_SAMPLE or self.rows % SIZE_SAMPLE == 0:
+            self.sampled_rows += 1
+            self.sampled_bytes += len(pickle.dumps(row, pickle.HIGHEST_PROTOCOL))
+        self.rows += 1
+        return self.sampled_bytes * self.rows // self.sampled_rows
+
+
+class _Partitions(object):
+    """Rows appended to one of ``count`` temporary pickle files by key hash."""
+
+    def __init__(self, directory: str, name: str, count: int, salt: int) -> None:
+        self.paths = [os.path.join(directory, f'{name}-{salt}-{i}.pickle') for i in range(count)]
+        self.salt = salt
+        self._files = [open(path, 'wb') for path in self.paths]
+
+    def add(self, key: any, row: dict) -> None:
+        pickle.dump(row, self._files[hash((self.salt, key)) % len(self._files)], pickle.HIGHEST_PROTOCOL)
+
+    def close(self) -> None:
+        for f in self._files:
+            f.close()
+
+    @staticmethod
+    def read(path: str) -> Iterator[dict]:
+        with open(path, 'rb') as f:
+            while True:
+                try:
+                    yield pickle.load(f)
+                except EOFError:
+                    return
+
+
+class HashJoin(object):
+    def __init__(self, left_key: str, right_key: str, how: str = 'inner', build: str = 'right',
+                 nest: Optional[str] = None, prefix: str = '', memory_budget: int = DEFAULT_MEMORY_BUDGET,
+                 spill_dir: Optional[str] = None, partitions: int = DEFAULT_PARTITIONS) -> None:
+        """
+        :param left_key: str (join field of left rows)
+        :param right_key: str (join field of right rows)
+        :param how: str (inner or left, left keeps left rows without a match)
+        :param build: str (right or left, the side held in the hash table, pick the smaller one)
+        :param nest: str (attach the matching right rows as a list under this name, one record per left row,
+                     needs build='right')
+        :param prefix: str (prepended to right field names in flat records, left fields win on collisions)
+        :param memory_budget: int (estimated bytes of the build side before the join spills to disk)
+        :param spill_dir: str (parent directory of the spill files, system temp by default)
+        :param partitions: int (spill files per side)
+        """
+        if how not in ('inner', 'left'):
+            raise ComagicParamsError('how must be in [inner, left]')
+        if build not in ('left', 'right'):
+            raise ComagicParamsError('build must be in [left, right]')
+        if nest and build != 'right':
+            raise ComagicParamsError('nest needs build="right", all right rows of a left row must be in memory')
+        self.left_key = left_key
+        self.right_key = right_key
+        self.how = how
+        self.build = build
+        self.nest = nest
+        self.prefix = prefix
+        self.memory_budget = memory_budget
+        self.spill_dir = spill_dir
+        self.partitions = partitions
+        self.stats = {'build_rows': 0, 'probe_rows': 0, 'records': 0, 'spilled_partitions': 0}
+
+    def _merge(self, left: dict, right: Optional[dict]) -> dict:
+        record = {f'{self.prefix}{k}': v for k, v in right.items()} if right else {}
+        record.update(left)
+        return record
+
+    def _keys(self) -> tuple:
+        # (build key, probe key)
+        if self.build == 'right':
+            return self.right_key, self.left_key
+        return self.left_key, self.right_key
+
+    def _probe(self, table: dict, rows: Iterable[dict]) -> Iterator[dict]:
+        build_key, probe_key = self._keys()
+        if self.build == 'right':
+            for row in rows:
+                matches = table.get(row.get(probe_key), ()) if row.get(probe_key) is not None else ()
+                if self.nest:
+                    if matches or self.how == 'left':
+                        yield dict(row, **{self.nest: list(matches)})
+                elif matches:
+                    for match in matches:
+                        yield self._merge(row, match)
+                elif self.how == 'left':
+                    yield self._merge(row, None)
+            return
+        matched = set()
+        for row in rows:
+            key = row.get(probe_key)
+            if key is None or key not in table:
+                continue
+            matched.add(key)
+            for match in table[key]:
+                yield self._merge(match, row)
+        if self.how == 'left':
+            for key, lefts in table.items():
+                if key not in matched:
+                    for left in lefts:
+                        yield self._merge(left, None)
+
+    def _spill(self, table: dict, build_rows: Iterator[dict], probe_rows: Iterable[dict], directory: str,
+               depth: int) -> Iterator[dict]:
+        build_key, probe_key = self._keys()
+        build_parts = _Partitions(directory, 'build', self.partitions, depth)
+        probe_parts = _Partitions(directory, 'probe', self.partitions, depth)
+        try:
+            for key, rows in table.items():
+                for row in rows:
+                    build_parts.add(key, row)
+            table.clear()
+            for row in build_rows:
+                build_parts.add(row.get(build_key), row)
+            for row in probe_rows:
+                probe_parts.add(row.get(probe_key), row)
+        finally:
+            build_parts.close()
+            probe_parts.close()
+        self.stats['spilled_partitions'] += self.partitions
+        for build_path, probe_path in zip(build_parts.paths, probe_parts.paths):
+            yield from self._join(_Partitions.read(build_path), _Partitions.read(probe_path), directory, depth + 1)
+            os.remove(build_path)
+            os.remove(probe_path)
+
+    def _join(self, build_rows: Iterator[dict], probe_rows: Iterable[dict], directory: Optional[str],
+              depth: int) -> Iterator[dict]:
+        build_key, _ = self._keys()
+        table, size = {}, _SizeEstimate()
+        for row in build_rows:
+            key = row.get(build_key)
+            if key is None and self.build == 'right':
+                # right rows without a key can't match anything
+                continue
+            table.setdefault(key, []).append(row)
+            if size.add(row) > self.memory_budget and depth < MAX_SPILL_DEPTH:
+                if directory is None:
+                    directory = tempfile.mkdtemp(prefix='comagic-join-', dir=self.spill_dir)
+                    try:
+                        yield from self._spill(table, build_rows, probe_rows, directory, depth)
+                    finally:
+                        shutil.rmtree(directory, ignore_errors=True)
+                else:
+                    yield from self._spill(table, build_rows, probe_rows, directory, depth)
+                return
+        yield from self._probe(table, probe_rows)
+
+    def _counted(self, rows: Iterable, name: str) -> Iterator:
+        for row in rows:
+            self.stats[name] += 1
+            yield row
+
+    def join(self, left: Iterable, right: Iterable) -> Iterator[dict]:
+        """
+        :param left: iterable of models or dicts
+        :param right: iterable of models or dicts
+        :return: iterator of joined records (dicts)
+        """
+        build, probe = (right, left) if self.build == 'right' else (left, right)
+        build_rows = (_as_dict(row) for row in self._counted(build, 'build_rows'))
+        probe_rows = (_as_dict(row) for row in self._counted(probe, 'probe_rows'))
+        for record in self._join(build_rows, probe_rows, None, 0):
+            self.stats['records'] += 1
+            yield record
+
+
+def hash_join(left: Iterable, right: Iterable, left_key: str, right_key: str, **kwargs) -> Iterator[dict]:
+    """
+    :param kwargs: how, build, nest, prefix, memory_budget, spill_dir, partitions (see HashJoin)
+    :return: iterator of joined records (dicts)
+    """
+    return HashJoin(left_key, right_key, **kwargs).join(left, right)
+
+
+def calls_with_legs(calls: Iterable, legs: Iterable, how: str = 'left', **kwargs) -> Iterator[dict]:
+    """Calls with their call legs (``call_session_id``) nested under ``legs``."""
+    return hash_join(calls, legs, 'id', 'call_session_id', how=how, nest='legs', **kwargs)
+
+
+def communications_with_calls(communications: Iterable, calls: Iterable, how: str = 'left',
+                              **kwargs) -> Iterator[dict]:
+    """Communications with the fields of their call (``communication_id``) prefixed ``call_``."""
+    return hash_join(communications, calls, 'id', 'communication_id', how=how, prefix='call_', **kwargs)
+
+
+def calls_with_sessions(calls: Iterable, sessions: Iterable, how: str = 'left', **kwargs) -> Iterator[dict]:
+    """
+    Calls with the fields of their visitor session prefixed ``session_``. Sessions usually outnumber calls,
+    so calls are the build side and sessions are streamed.
+    """
+    kwargs.setdefault('build', 'left')
+    return hash_join(calls, sessions, 'visitor_session_id', 'id', how=how, prefix='session_', **kwargs)
+
+
+def to_columns(records: Iterable[dict], fields: Optional[list] = None) -> dict:
+    """
+    :param fields: list (columns, by default every field of the first record)
+    :return: dict (field -> list of values), e.g. for pandas.DataFrame(to_columns(records))
+    """
+    columns = None
+    for record in records:
+        if columns is None:
+            columns = {field: [] for field in (fields or record)}
+        for field, values in columns.items():
+            values.append(record.get(field))
+    return columns or {field: [] for field in fields or ()}
+
+
+def iter_column_batches(records: Iterable[dict], batch_size: int = 10000,
+                        fields: Optional[list] = None) -> Iterator[dict]:
+    """
+    :return: iterator of to_columns() frames of at most batch_size records
+    """
+    batch = []
+    for record in records:
+        batch.append(record)
+        if len(batch) >= batch_size:
+            yield to_columns(batch, fields)
+            batch = []
+    if batch:
+        yield to_columns(batch, fields)
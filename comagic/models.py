@@ -24,11 +24,21 @@ class BaseModel(object):
 
     def to_dict(self) -> dict:
         return {
-            field: getattr(self, field)
+            field: getattr(self, field, None)
             for field in self.fields()
-            if getattr(self, field)
+            if getattr(self, field, None)
         }
 
+    def project(self, fields: list) -> 'BaseModel':
+        """
+        Drop every attribute outside ``fields``, reading a dropped field then raises AttributeError.
+        """
+        keep = set(fields)
+        for field in self.fields():
+            if field not in keep:
+                self.__dict__.pop(field, None)
+        return self
+
     def __repr__(self):
         state = ['%s=%s' % (k, repr(v)) for (k, v) in vars(self).items()]
         return '%s(%s)' % (self.__class__.__name__, ', '.join(state))
@@ -93,8 +103,8 @@ class VirtualNumber(BaseModel):
 
     @classmethod
     def from_dict(cls, model_dict):
-        model_dict['activation_data'] = parse_datetime(
-            model_dict.get('activation_data')
+        model_dict['activation_date'] = parse_datetime(
+            model_dict.get('activation_date')
         )
         return cls(**model_dict)
 
@@ -167,7 +177,7 @@ class Campaign(BaseModel):
 
     @classmethod
     def from_dict(cls, model_dict):
-        model_dict = parse_datetime(model_dict.get('creation_time'))
+        model_dict['creation_time'] = parse_datetime(model_dict.get('creation_time'))
         return cls(**model_dict)
 
 
@@ -203,7 +213,6 @@ class Site(BaseModel):
 
     @classmethod
     def from_dict(cls, model_dict):
-        print(model_dict)
         model_dict['creation_date'] = parse_datetime(model_dict.get('creation_date'))
         return cls(**model_dict)
 
@@ -722,7 +731,7 @@ class ChatMessage(BaseModel):
 
     @classmethod
     def from_dict(cls, model_dict):
-        model_dict['date_time'] = parse_datetime(model_dict.get('model_dict'))
+        model_dict['date_time'] = parse_datetime(model_dict.get('date_time'))
         return cls(**model_dict)
 
 
@@ -902,7 +911,7 @@ class FinancialCallLegs(BaseModel):
     @classmethod
     def from_dict(cls, model_dict):
         model_dict['start_time'] = parse_datetime(model_dict.get('start_time'))
-        super().from_dict(model_dict)
+        return cls(**model_dict)
 
 
 class AvailableVirtualNumber(BaseModel):
@@ -918,6 +927,10 @@ class AvailableVirtualNumber(BaseModel):
             'min_charge',
         ]
 
+    @classmethod
+    def from_dict(cls, model_dict):
+        return cls(**model_dict)
+
 
 class CampaignAvailablePhoneNumber(BaseModel):
     @classmethod
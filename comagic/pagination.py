@@ -0,0 +1,227 @@
+import json
+import os
+import threading
+import time
+from typing import Callable, Iterator, Optional, Union
+
+from .errors import ComagicException, TIMEOUT_ERROR_CODE
+from .utils import to_api_value
+
+# row cap of a single data api request
+MAX_LIMIT = 10000
+
+
+class AdaptivePageSizer(object):
+    def __init__(self, probe_size: int = 1000, min_size: int = 100, max_size: int = MAX_LIMIT,
+                 target_seconds: float = 2.0, target_bytes: int = 8 * 1024 * 1024, smoothing: float = 0.3,
+                 path: Optional[str] = None, ceiling_ttl: float = 3600.0, ceiling_pages: int = 50) -> None:
+        """
+        Learns per endpoint/field-set how long a row takes and how big it is, and picks the page size that
+        lands a response near both targets.
+
+        :param probe_size: int (first page size for an unknown key)
+        :param min_size: int
+        :param max_size: int (at most the api cap)
+        :param target_seconds: float (wanted response time)
+        :param target_bytes: int (wanted response size)
+        :param smoothing: float (weight of the newest page in the moving averages)
+        :param path: str (json file the learned state is loaded from and saved to)
+        :param ceiling_ttl: float (seconds a size that timed out is not grown back to)
+        :param ceiling_pages: int (successful pages after which a size that timed out may be tried again)
+        """
+        self.probe_size = probe_size
+        self.min_size = min_size
+        self.max_size = min(max_size, MAX_LIMIT)
+        self.target_seconds = target_seconds
+        self.target_bytes = target_bytes
+        self.smoothing = smoothing
+        self.path = path
+        self.ceiling_ttl = ceiling_ttl
+        self.ceiling_pages = ceiling_pages
+        self._state = {}
+        self._lock = threading.Lock()
+        if path and os.path.exists(path):
+            with open(path, encoding='utf-8') as f:
+                self._state = json.load(f)
+
+    def page_size(self, key: str) -> int:
+        with self._lock:
+            state = self._state.get(key)
+            return state['size'] if state else max(self.min_size, min(self.probe_size, self.max_size))
+
+    def _ceiling(self, state: dict) -> Optional[int]:
+        # a timeout caps the size for a while only, the load of the api changes through the day
+        ceiling = state.get('ceiling')
+        if ceiling is None:
+            return None
+        if time.time() - state.get('ceiling_at', 0) >= self.ceiling_ttl or \
+                state.get('ceiling_pages', 0) >= self.ceiling_pages:
+            for name in ('ceiling', 'ceiling_at', 'ceiling_pages'):
+                state.pop(name, None)
+            return None
+        return ceiling
+
+    def observe(self, key: str, limit: int, rows: int, seconds: float, size: Optional[int] = None) -> None:
+        """
+        :param key: str (endpoint/field-set)
+        :param limit: int (requested page size)
+        :param rows: int (rows returned)
+        :param seconds: float (response time)
+        :param size: int (response bytes, if known)
+        """
+        if not rows:
+            return
+        with self._lock:
+            state = self._state.setdefault(key, {'size': limit, 'seconds_per_row': None, 'bytes_per_row': None})
+            if 'ceiling' in state:
+                state['ceiling_pages'] = state.get('ceiling_pages', 0) + 1
+            for name, value in (('seconds_per_row', seconds / rows), ('bytes_per_row', size / rows if size else None)):
+                if value is not None:
+                    previous = state[name]
+                    state[name] = value if previous is None else previous + self.smoothing * (value - previous)
+            if rows < limit:
+                # a short last page says nothing about how far the size could grow
+                return
+            wanted = [self.target_seconds / state['seconds_per_row']] if state['seconds_per_row'] else []
+            if state['bytes_per_row']:
+                wanted.append(self.target_bytes / state['bytes_per_row'])
+            if wanted:
+                # grow at most 2x per page and not back to a size that timed out recently, shrink right away
+                size = min(min(wanted), limit * 2, self._ceiling(state) or self.max_size)
+                state['size'] = int(max(self.min_size, min(size, self.max_size)))
+
+    def failed(self, key: str, limit: int) -> int:
+        """
+        A page of ``limit`` rows timed out, halve the size and don't grow to ``limit`` again for ``ceiling_ttl``
+        seconds or ``ceiling_pages`` successful pages.
+
+        :return: int (next page size)
+        """
+        with self._lock:
+            state = self._state.setdefault(key, {'size': limit, 'seconds_per_row': None, 'bytes_per_row': None})
+            state['ceiling'] = max(self.min_size, limit - 1)
+            state['ceiling_at'] = time.time()
+            state['ceiling_pages'] = 0
+            state['size'] = max(self.min_size, limit // 2)
+            return state['size']
+
+    def save(self, path: Optional[str] = None) -> None:
+        path = path or self.path
+        if not path:
+            return
+        with self._lock:
+            data = json.dumps(self._state, indent=2, sort_keys=True)
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(data)
+
+
+class _Sizing(object):
+    """Page size of one pagination run, fixed or driven by an AdaptivePageSizer."""
+
+    def __init__(self, page_size: Union[int, AdaptivePageSizer], key: Optional[str] = None,
+                 response_size: Optional[Callable[[], Optional[int]]] = None) -> None:
+        if isinstance(page_size, AdaptivePageSizer):
+            self.sizer = page_size
+        elif 0 < page_size <= MAX_LIMIT:
+            self.sizer, self.size = None, page_size
+        else:
+            raise ValueError(f'page_size must be in [1, {MAX_LIMIT}]')
+        self.key = key or 'default'
+        self.response_size = response_size
+
+    def next(self) -> int:
+        return self.sizer.page_size(self.key) if self.sizer else self.size
+
+    def fetch(self, fetch: Callable, limit: int, *args) -> tuple:
+        """
+        :return: tuple (page, limit used), timed out pages are retried with a smaller limit
+        """
+        while True:
+            started = time.monotonic()
+            try:
+                page = list(fetch(limit, *args))
+            except ComagicException as e:
+                if not self.sizer or e.error_data.get('code') != TIMEOUT_ERROR_CODE or limit <= self.sizer.min_size:
+                    raise
+                limit = self.sizer.failed(self.key, limit)
+                continue
+            if self.sizer:
+                size = self.response_size() if self.response_size else None
+                self.sizer.observe(self.key, limit, len(page), time.monotonic() - started, size)
+            return page, limit
+
+
+def iter_offset_pages(fetch: Callable[[int, int], list], page_size: Union[int, AdaptivePageSizer] = MAX_LIMIT,
+                      offset: int = 0, max_rows: Optional[int] = None, key: Optional[str] = None,
+                      response_size: Optional[Callable[[], Optional[int]]] = None) -> Iterator[list]:
+    """
+    :param fetch: callable(limit, offset) -> list (one api request)
+    :param page_size: int or AdaptivePageSizer
+    :param offset: int (offset of the first page)
+    :param max_rows: int (stop after this many rows)
+    :param key: str (AdaptivePageSizer state key, endpoint and field set)
+    :param response_size: callable() -> int (bytes of the last response, for AdaptivePageSizer)
+    :return: iterator of pages, stops at the first short page
+    """
+    sizing = _Sizing(page_size, key, response_size)
+    fetched = 0
+    while max_rows is None or fetched < max_rows:
+        limit = sizing.next() if max_rows is None else min(sizing.next(), max_rows - fetched)
+        page, limit = sizing.fetch(fetch, limit, offset)
+        if page:
+            yield page
+        fetched += len(page)
+        offset += len(page)
+        if len(page) < limit:
+            return
+
+
+def keyset_filter(keys: tuple, last_row: any) -> dict:
+    """
+    :param keys: tuple (e.g. ('start_time', 'id'))
+    :param last_row: model or dict (last row of the previous page)
+    :return: dict (api filter for rows strictly after last_row in keys order)
+    """
+    values = [to_api_value(last_row[key]) for key in keys]
+    alternatives = []
+    # (k1 > v1) or (k1 = v1 and k2 > v2) or ...
+    for i, key in enumerate(keys):
+        conditions = [{'field': k, 'operator': '=', 'value': v} for k, v in zip(keys[:i], values[:i])]
+        conditions.append({'field': key, 'operator': '>', 'value': values[i]})
+        alternatives.append(conditions[0] if len(conditions) == 1 else {'filters': conditions, 'condition': 'and'})
+    return alternatives[0] if len(alternatives) == 1 else {'filters': alternatives, 'condition': 'or'}
+
+
+def iter_keyset_pages(fetch: Callable[[int, Optional[dict], list], list], keys: tuple = ('id',),
+                      page_size: Union[int, AdaptivePageSizer] = MAX_LIMIT, filter: Optional[dict] = None,
+                      max_rows: Optional[int] = None, key: Optional[str] = None,
+                      response_size: Optional[Callable[[], Optional[int]]] = None) -> Iterator[list]:
+    """
+    Pages ordered by ``keys`` where every page after the first is selected with a filter on the last seen key
+    instead of an offset, so each request costs the same and rows written meanwhile can't shift pages.
+
+    :param fetch: callable(limit, filter, sort) -> list (one api request)
+    :param keys: tuple (unique sort key, e.g. ('id',) or ('start_time', 'id'))
+    :param page_size: int or AdaptivePageSizer
+    :param filter: dict (api filter the pages are additionally restricted by)
+    :param max_rows: int (stop after this many rows)
+    :param key: str (AdaptivePageSizer state key, endpoint and field set)
+    :param response_size: callable() -> int (bytes of the last response, for AdaptivePageSizer)
+    :return: iterator of pages
+    """
+    sizing = _Sizing(page_size, key, response_size)
+    sort = [{'field': key, 'order': 'asc'} for key in keys]
+    fetched, after = 0, None
+    while max_rows is None or fetched < max_rows:
+        limit = sizing.next() if max_rows is None else min(sizing.next(), max_rows - fetched)
+        page_filter = filter
+        if after is not None:
+            page_filter = after if not filter else {'filters': [filter, after], 'condition': 'and'}
+        page, limit = sizing.fetch(fetch, limit, page_filter, sort)
+        if page:
+            # built before yielding, consumers may project the key fields away
+            after = keyset_filter(keys, page[-1])
+            yield page
+        fetched += len(page)
+        if len(page) < limit:
+            return
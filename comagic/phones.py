@@ -0,0 +1,205 @@
+"""
+Phone number index over contacts, employees and virtual numbers.
+
+Numbers are normalized to digits with the country code (``+7 (495) 123-45-67``, ``8 495 1234567`` and
+``74951234567`` are the same key), exact lookups are one dict access, prefix lookups bisect a sorted key list::
+
+    phones = PhoneIndex.build(client)
+    phones.attach(client)  # follow create/update/delete of contacts and employees made through this client
+    for call in client.get_calls_report(date_from, date_till):
+        owners = phones.lookup(call.contact_phone_number)  # [PhoneEntry(kind='contact', id=..., number=...)]
+"""
+import bisect
+import re
+import threading
+from collections import namedtuple
+from typing import Iterable, Iterator, Optional
+
+from .errors import ComagicParamsError
+from .pagination import MAX_LIMIT
+
+PhoneEntry = namedtuple('PhoneEntry', ['kind', 'id', 'number'])
+
+KINDS = ('contact', 'employee', 'virtual_number')
+# report fields holding an external number, resolved by resolve()
+NUMBER_FIELDS = ('contact_phone_number', 'communication_number', 'virtual_phone_number')
+
+_NOT_DIGITS = re.compile(r'\D')
+
+
+def normalize_phone(number: any, country_code: str = '7', national_length: int = 10) -> Optional[str]:
+    """
+    :param number: str or int (any format, e.g. +7 (495) 123-45-67)
+    :param country_code: str (added to national numbers)
+    :param national_length: int (digits of a national number without trunk prefix)
+    :return: str (digits with country code) or None
+    """
+    if number is None:
+        return None
+    digits = _NOT_DIGITS.sub('', str(number))
+    if not digits:
+        return None
+    if len(digits) == national_length:
+        return country_code + digits
+    if len(digits) == national_length + 1 and digits[0] == '8' and country_code == '7':
+        # russian trunk prefix: 8 495 ... is +7 495 ...
+        return country_code + digits[1:]
+    return digits
+
+
+def _numbers(value: any) -> Iterator[str]:
+    """Numbers of a phone_numbers field: strings or dicts with phone_number (employees)."""
+    if value is None:
+        return
+    if isinstance(value, (str, int)):
+        yield value
+        return
+    for item in value:
+        if isinstance(item, dict):
+            item = item.get('phone_number')
+        if item is not None:
+            yield item
+
+
+class PhoneIndex(object):
+    def __init__(self, country_code: str = '7', national_length: int = 10) -> None:
+        """
+        :param country_code: str (added to national numbers on normalization)
+        :param national_length: int (digits of a national number)
+        """
+        self.country_code = country_code
+        self.national_length = national_length
+        self._entries = {}
+        self._owners = {}
+        self._sorted = None
+        self._lock = threading.Lock()
+        # account the index was loaded for, hook events of other accounts are ignored
+        self.user_id = None
+
+    def normalize(self, number: any) -> Optional[str]:
+        return normalize_phone(number, self.country_code, self.national_length)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def add(self, kind: str, id: any, numbers: Iterable) -> None:
+        """
+        Index the numbers of one contact, employee or virtual number, replacing what was indexed for it before.
+        """
+        if kind not in KINDS:
+            raise ComagicParamsError(f'invalid kind {kind}, kind must be in {list(KINDS)}')
+        with self._lock:
+            self._remove(kind, id)
+            keys = set()
+            for number in _numbers(numbers):
+                key = self.normalize(number)
+                if key is None:
+                    continue
+                keys.add(key)
+                self._entries.setdefault(key, []).append(PhoneEntry(kind, id, number))
+            if keys:
+                self._owners[kind, id] = keys
+                self._sorted = None
+
+    def remove(self, kind: str, id: any) -> None:
+        with self._lock:
+            self._remove(kind, id)
+
+    def _remove(self, kind: str, id: any) -> None:
+        keys = self._owners.pop((kind, id), ())
+        for key in keys:
+            entries = [entry for entry in self._entries.get(key, ()) if (entry.kind, entry.id) != (kind, id)]
+            if entries:
+                self._entries[key] = entries
+            else:
+                self._entries.pop(key, None)
+                self._sorted = None
+
+    def lookup(self, number: any, kind: Optional[str] = None) -> list:
+        """
+        :param number: str (any format)
+        :param kind: str (contact, employee or virtual_number, all by default)
+        :return: list of PhoneEntry
+        """
+        entries = self._entries.get(self.normalize(number), ())
+        return [entry for entry in entries if kind is None or entry.kind == kind]
+
+    def lookup_prefix(self, prefix: any, kind: Optional[str] = None, limit: Optional[int] = None) -> list:
+        """
+        :param prefix: str (leading digits, e.g. 7495 or +7 (495), national prefixes are not expanded)
+        :return: list of PhoneEntry of every number starting with prefix, in number order
+        """
+        digits = _NOT_DIGITS.sub('', str(prefix))
+        with self._lock:
+            if self._sorted is None:
+                self._sorted = sorted(self._entries)
+            keys = self._sorted
+        found = []
+        for key in keys[bisect.bisect_left(keys, digits):]:
+            if not key.startswith(digits):
+                break
+            found.extend(entry for entry in self._entries.get(key, ()) if kind is None or entry.kind == kind)
+            if limit is not None and len(found) >= limit:
+                return found[:limit]
+        return found
+
+    def resolve(self, row: any, fields: Iterable[str] = NUMBER_FIELDS) -> dict:
+        """
+        :param row: model or dict (e.g. a Call)
+        :return: dict (field -> list of PhoneEntry) for the number fields of the row that matched
+        """
+        resolved = {}
+        for field in fields:
+            number = row.get(field) if isinstance(row, dict) else getattr(row, field, None)
+            entries = self.lookup(number) if number else None
+            if entries:
+                resolved[field] = entries
+        return resolved
+
+    def _on_change(self, kind: str):
+        def callback(id: any = None, phone_numbers: any = None, user_id: Optional[int] = None, **data) -> None:
+            if user_id != self.user_id:
+                return
+            if id is not None and phone_numbers is not None:
+                self.add(kind, id, phone_numbers)
+
+        return callback
+
+    def _on_delete(self, kind: str):
+        def callback(id: any = None, user_id: Optional[int] = None, **data) -> None:
+            if user_id == self.user_id:
+                self.remove(kind, id)
+
+        return callback
+
+    def attach(self, client: any) -> 'PhoneIndex':
+        """
+        Keep the index current with contacts and employees created, updated or deleted through ``client`` for the
+        ``user_id`` the index was loaded for.
+        """
+        for kind in ('contact', 'employee'):
+            client.add_hook(f'{kind}_created', self._on_change(kind))
+            client.add_hook(f'{kind}_updated', self._on_change(kind))
+            client.add_hook(f'{kind}_deleted', self._on_delete(kind))
+        return self
+
+    def load(self, client: any, kinds: Iterable[str] = KINDS, user_id: Optional[int] = None,
+             page_size: int = MAX_LIMIT) -> 'PhoneIndex':
+        """Index every contact, employee and virtual number of the account."""
+        self.user_id = user_id
+        sources = {
+            'contact': ('contacts', 'phone_numbers'),
+            'employee': ('employees', 'phone_numbers'),
+            'virtual_number': ('virtual_numbers', 'virtual_phone_number'),
+        }
+        for kind in kinds:
+            endpoint, field = sources[kind]
+            query = client.query(endpoint).select('id', field).for_user(user_id)
+            for row in query.iter(page_size=page_size):
+                self.add(kind, row.id, getattr(row, field, None))
+        return self
+
+    @classmethod
+    def build(cls, client: any, kinds: Iterable[str] = KINDS, user_id: Optional[int] = None,
+              country_code: str = '7', national_length: int = 10) -> 'PhoneIndex':
+        return cls(country_code, national_length).load(client, kinds, user_id)
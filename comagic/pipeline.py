@@ -0,0 +1,298 @@
+"""
+Bounded producer / consumer pipelines.
+
+Stages run on their own threads and are connected by bounded queues, so a slow sink stalls the stages before it
+instead of letting fetched rows pile up in memory::
+
+    pipeline = (Pipeline(client.query('calls_report').between(date_from, date_till).pages(), queue_size=4)
+                .flat_map(enricher.enrich, workers=2, name='enrich')
+                .batch(1000)
+                .sink(warehouse.write, workers=4, name='write'))
+    metrics = pipeline.run()
+    print(metrics['write']['items_per_second'], metrics['enrich']['max_queue_depth'])
+
+At most ``queue_size`` items wait in front of every stage plus one item per worker, whatever the speed of the
+sink. The first exception raised by a stage cancels every stage and is re-raised by ``run()`` (or by the loop
+iterating the pipeline). With more than one worker a stage yields in completion order.
+"""
+import queue
+import threading
+import time
+from typing import Callable, Iterable, Iterator, Optional
+
+_DONE = object()
+# seconds a blocked put / get waits before looking at the cancel flag again
+_POLL = 0.1
+
+
+class PipelineCancelled(Exception):
+    pass
+
+
+class _Stage(object):
+    def __init__(self, name: str, fn: Optional[Callable], workers: int, queue_size: int, kind: str) -> None:
+        self.name = name
+        self.fn = fn
+        self.workers = workers
+        self.kind = kind
+        # items waiting for this stage
+        self.input = queue.Queue(maxsize=queue_size)
+        self.items_in = 0
+        self.items_out = 0
+        self.busy_seconds = 0.0
+        self.max_queue_depth = 0
+        self.running = 0
+        self.lock = threading.Lock()
+
+    def metrics(self, elapsed: float) -> dict:
+        with self.lock:
+            return {
+                'items_in': self.items_in,
+                'items_out': self.items_out,
+                'busy_seconds': round(self.busy_seconds, 6),
+                'items_per_second': round(self.items_out / elapsed, 2) if elapsed else 0.0,
+                'queue_depth': self.input.qsize(),
+                'max_queue_depth': self.max_queue_depth,
+                'workers': self.workers,
+            }
+
+
+class Pipeline(object):
+    def __init__(self, source: Iterable, queue_size: int = 8, name: str = 'source') -> None:
+        """
+        :param source: iterable (pages, rows, ... consumed by one thread)
+        :param queue_size: int (default bound of the queue in front of every stage)
+        :param name: str (metrics name of the source)
+        """
+        self.source = source
+        self.queue_size = queue_size
+        self.name = name
+        self._stages = []
+        self._output = None
+        self._threads = []
+        self._cancel = threading.Event()
+        self._error = None
+        self._error_lock = threading.Lock()
+        self._started = None
+        self._finished = None
+        self._source_count = 0
+
+    def _add(self, fn: Optional[Callable], workers: int, name: Optional[str], queue_size: Optional[int],
+             kind: str) -> 'Pipeline':
+        if self._started is not None:
+            raise RuntimeError('pipeline already started')
+        if self._stages and self._stages[-1].kind == 'sink':
+            raise ValueError('sink must be the last stage')
+        if workers < 1:
+            raise ValueError('workers must be at least 1')
+        name = name or f'{kind}{len(self._stages)}'
+        if name == self.name or any(stage.name == name for stage in self._stages):
+            raise ValueError(f'duplicate stage name {name}')
+        self._stages.append(_Stage(name, fn, workers, queue_size or self.queue_size, kind))
+        return self
+
+    def map(self, fn: Callable, workers: int = 1, name: Optional[str] = None,
+            queue_size: Optional[int] = None) -> 'Pipeline':
+        """fn(item) -> item passed on."""
+        return self._add(fn, workers, name, queue_size, 'map')
+
+    def flat_map(self, fn: Callable, workers: int = 1, name: Optional[str] = None,
+                 queue_size: Optional[int] = None) -> 'Pipeline':
+        """fn(item) -> iterable, every element passed on (e.g. a page into its rows)."""
+        return self._add(fn, workers, name, queue_size, 'flat_map')
+
+    def batch(self, size: int, name: Optional[str] = None, queue_size: Optional[int] = None) -> 'Pipeline':
+        """Group items into lists of up to ``size`` (the last one may be shorter)."""
+        if size < 1:
+            raise ValueError('size must be at least 1')
+        return self._add(size, 1, name, queue_size, 'batch')
+
+    def sink(self, fn: Callable, workers: int = 1, name: Optional[str] = None,
+             queue_size: Optional[int] = None) -> 'Pipeline':
+        """fn(item), results are dropped, ends the pipeline."""
+        return self._add(fn, workers, name, queue_size, 'sink')
+
+    def _fail(self, error: BaseException) -> None:
+        with self._error_lock:
+            if self._error is None:
+                self._error = error
+        self._cancel.set()
+
+    def _put(self, target: queue.Queue, item: any, stage: Optional[_Stage] = None) -> None:
+        while True:
+            if self._cancel.is_set():
+                raise PipelineCancelled()
+            try:
+                target.put(item, timeout=_POLL)
+                break
+            except queue.Full:
+                continue
+        if stage is not None and item is not _DONE:
+            depth = target.qsize()
+            with stage.lock:
+                stage.max_queue_depth = max(stage.max_queue_depth, depth)
+
+    def _get(self, source: queue.Queue) -> any:
+        while True:
+            if self._cancel.is_set():
+                raise PipelineCancelled()
+            try:
+                return source.get(timeout=_POLL)
+            except queue.Empty:
+                continue
+
+    def _next_input(self, index: int) -> tuple:
+        # queue after stage index (the pipeline output after the last one) and the stage that reads it
+        if index + 1 < len(self._stages):
+            return self._stages[index + 1].input, self._stages[index + 1]
+        return self._output, None
+
+    def _run_source(self) -> None:
+        target, stage = (self._stages[0].input, self._stages[0]) if self._stages else (self._output, None)
+        try:
+            for item in self.source:
+                self._put(target, item, stage)
+                self._source_count += 1
+            self._put(target, _DONE)
+        except PipelineCancelled:
+            pass
+        except BaseException as e:
+            self._fail(e)
+
+    def _run_worker(self, index: int) -> None:
+        stage = self._stages[index]
+        target, next_stage = self._next_input(index)
+        pending = []
+        try:
+            while True:
+                item = self._get(stage.input)
+                if item is _DONE:
+                    # let the other workers of the stage see the end too, the last one passes it on
+                    stage.input.put(_DONE)
+                    break
+                with stage.lock:
+                    stage.items_in += 1
+                started = time.perf_counter()
+                if stage.kind == 'batch':
+                    pending.append(item)
+                    results = [pending] if len(pending) >= stage.fn else ()
+                    if results:
+                        pending = []
+                elif stage.kind == 'flat_map':
+                    results = list(stage.fn(item))
+                else:
+                    results = (stage.fn(item),)
+                with stage.lock:
+                    # time blocked on a full queue below is backpressure, not work
+                    stage.busy_seconds += time.perf_counter() - started
+                for result in results:
+                    if stage.kind != 'sink':
+                        self._put(target, result, next_stage)
+                    with stage.lock:
+                        stage.items_out += 1
+            if pending:
+                self._put(target, pending, next_stage)
+                with stage.lock:
+                    stage.items_out += 1
+            with stage.lock:
+                stage.running -= 1
+                last = stage.running == 0
+            if last and stage.kind != 'sink':
+                self._put(target, _DONE)
+        except PipelineCancelled:
+            pass
+        except BaseException as e:
+            self._fail(e)
+
+    def start(self) -> 'Pipeline':
+        if self._started is not None:
+            raise RuntimeError('pipeline already started')
+        self._output = queue.Queue(maxsize=self.queue_size)
+        self._started = time.monotonic()
+        self._threads = [threading.Thread(target=self._run_source, name=f'pipeline-{self.name}', daemon=True)]
+        for index, stage in enumerate(self._stages):
+            stage.running = stage.workers
+            self._threads += [
+                threading.Thread(target=self._run_worker, args=(index,), name=f'pipeline-{stage.name}-{worker}',
+                                 daemon=True)
+                for worker in range(stage.workers)
+            ]
+        for thread in self._threads:
+            thread.start()
+        return self
+
+    def _join(self) -> None:
+        for thread in self._threads:
+            thread.join()
+        if self._finished is None:
+            self._finished = time.monotonic()
+
+    def cancel(self) -> None:
+        """Stop every stage, items in flight are dropped."""
+        self._cancel.set()
+        self._join()
+
+    def __iter__(self) -> Iterator[any]:
+        """Output of the last stage (a pipeline ending in a sink yields nothing)."""
+        if self._started is None:
+            self.start()
+        completed = False
+        try:
+            if not self._stages or self._stages[-1].kind != 'sink':
+                while True:
+                    item = self._get(self._output)
+                    if item is _DONE:
+                        break
+                    yield item
+            completed = True
+        except PipelineCancelled:
+            pass
+        finally:
+            if not completed:
+                # failed stage or the consumer stopped early
+                self._cancel.set()
+            self._join()
+        if self._error is not None:
+            raise self._error
+
+    def run(self) -> dict:
+        """
+        Run to completion, dropping the output of a last stage that is not a sink.
+
+        :return: dict (metrics())
+        """
+        if self._stages and self._stages[-1].kind == 'sink':
+            if self._started is None:
+                self.start()
+            self._wait_sink()
+        else:
+            for _ in self:
+                pass
+        return self.metrics()
+
+    def _wait_sink(self) -> None:
+        try:
+            for thread in self._threads:
+                while thread.is_alive():
+                    thread.join(_POLL)
+        except BaseException:
+            self._cancel.set()
+            self._join()
+            raise
+        self._join()
+        if self._error is not None:
+            raise self._error
+
+    def metrics(self) -> dict:
+        """
+        :return: dict (stage name -> items_in, items_out, busy_seconds, items_per_second, queue_depth,
+                 max_queue_depth, workers; the source has items_out only)
+        """
+        end = self._finished or time.monotonic()
+        elapsed = end - self._started if self._started is not None else 0.0
+        result = {self.name: {'items_out': self._source_count,
+                              'items_per_second': round(self._source_count / elapsed, 2) if elapsed else 0.0}}
+        for stage in self._stages:
+            result[stage.name] = stage.metrics(elapsed)
+        result['elapsed'] = round(elapsed, 6)
+        return result
@@ -0,0 +1,233 @@
+"""
+Adaptive column pruning.
+
+``AdaptiveFields`` wraps the client get_* methods. It records which model fields downstream code reads, per job
+name (or per call site when no job is given), keeps that profile in a json file and on later runs requests only
+the observed fields. Reading a field that was pruned refetches the full row by id, so results stay correct
+while the profile catches up::
+
+    with AdaptiveFields(client, 'fields-profile.json', job='nightly-calls') as adaptive:
+        for call in adaptive.get_calls_report(date_from, date_till):
+            export(call.id, call.talk_duration, call.tags)
+"""
+import inspect
+import json
+import os
+import sys
+import threading
+from typing import Iterable, Optional
+
+from .endpoints import Endpoint, get_endpoint
+from .errors import ComagicParamsError
+
+DEFAULT_KEEP_RUNS = 10
+
+
+class AccessProfile(object):
+    def __init__(self, path: Optional[str] = None, keep_runs: int = DEFAULT_KEEP_RUNS) -> None:
+        """
+        :param path: str (json file, loaded if it exists, written by save())
+        :param keep_runs: int (a field not read in this many runs is pruned again)
+        """
+        self.path = path
+        self.keep_runs = keep_runs
+        self._data = {}
+        self._started = set()
+        self._lock = threading.Lock()
+        if path and os.path.exists(path):
+            with open(path, encoding='utf-8') as f:
+                self._data = json.load(f)
+
+    def _entry(self, job: str, endpoint: str) -> dict:
+        return self._data.setdefault(job, {}).setdefault(endpoint, {'runs': 0, 'fields': {}})
+
+    def fields(self, job: str, endpoint: str) -> Optional[list]:
+        """
+        :return: list (fields read in the last keep_runs runs) or None when nothing is known yet
+        """
+        with self._lock:
+            entry = self._data.get(job, {}).get(endpoint)
+            if not entry or not entry['runs']:
+                return None
+            runs = entry['runs'] - (1 if (job, endpoint) in self._started else 0)
+            return [field for field, last_run in entry['fields'].items() if runs - last_run < self.keep_runs]
+
+    def start_run(self, job: str, endpoint: str) -> None:
+        with self._lock:
+            if (job, endpoint) not in self._started:
+                self._started.add((job, endpoint))
+                self._entry(job, endpoint)['runs'] += 1
+
+    def record(self, job: str, endpoint: str, fields: Iterable[str]) -> None:
+        with self._lock:
+            entry = self._entry(job, endpoint)
+            for field in fields:
+                entry['fields'][field] = entry['runs']
+
+    def save(self, path: Optional[str] = None) -> None:
+        path = path or self.path
+        if not path:
+            return
+        with self._lock:
+            data = json.dumps(self._data, indent=2, sort_keys=True)
+        tmp_path = f'{path}.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+
+class _Tracker(object):
+    def __init__(self, adaptive: 'AdaptiveFields', job: str, endpoint: Endpoint, params: dict,
+                 requested: Optional[list]) -> None:
+        self.adaptive = adaptive
+        self.job = job
+        self.endpoint = endpoint
+        self.params = params
+        self.requested = requested
+        self.seen = set()
+        self.refetches = 0
+
+    def refetch(self, row: any) -> None:
+        """Load every field of one pruned row."""
+        params = dict(self.params, fields=None, limit=1, offset=None, sort=None,
+                      filter={'field': 'id', 'operator': '=', 'value': row.__dict__.get('id')})
+        fresh = list(getattr(self.adaptive.client, self.endpoint.method)(**params))
+        if not fresh:
+            raise ComagicParamsError(f'{self.endpoint.name} row {row.__dict__.get("id")} disappeared on refetch')
+        self.refetches += 1
+        for field, value in fresh[0].__dict__.items():
+            row.__dict__.setdefault(field, value)
+
+
+def _tracked_class(model: type, tracker: _Tracker) -> type:
+    model_fields = frozenset(model.fields())
+
+    def __getattribute__(self, name):
+        if name in model_fields:
+            tracker.seen.add(name)
+        return model.__getattribute__(self, name)
+
+    def __getattr__(self, name):
+        if name not in model_fields:
+            raise AttributeError(f'{model.__name__} has no attribute {name}')
+        tracker.refetch(self)
+        return self.__dict__[name]
+
+    def load_all(self):
+        # bulk access reads every field: the job can't be pruned, and a pruned row is completed first
+        values = model.__getattribute__(self, '__dict__')
+        tracker.seen.update(model_fields)
+        if any(field not in values for field in model_fields):
+            tracker.refetch(self)
+        return values
+
+    def to_dict(self):
+        load_all(self)
+        return model.to_dict(self)
+
+    def __getitem__(self, item):
+        # row[field] is a field read like row.field
+        return getattr(self, item) if item in model_fields else model.__getitem__(self, item)
+
+    def keys(self):
+        return load_all(self).keys()
+
+    def values(self):
+        return load_all(self).values()
+
+    def items(self):
+        return load_all(self).items()
+
+    return type(model.__name__, (model,), {
+        '__getattribute__': __getattribute__,
+        '__getattr__': __getattr__,
+        'to_dict': to_dict,
+        '__getitem__': __getitem__,
+        'keys': keys,
+        'values': values,
+        'items': items,
+        '__module__': model.__module__,
+    })
+
+
+class AdaptiveFields(object):
+    def __init__(self, client: any, profile: any = None, job: Optional[str] = None,
+                 keep_runs: int = DEFAULT_KEEP_RUNS) -> None:
+        """
+        :param client: Comagic
+        :param profile: str (profile json path) or AccessProfile
+        :param job: str (profile key, defaults to the call site of every get_* call)
+        :param keep_runs: int (a field not read in this many runs is pruned again)
+        """
+        self.client = client
+        self.profile = profile if isinstance(profile, AccessProfile) else AccessProfile(profile, keep_runs)
+        self.job = job
+        self._trackers = []
+        self._lock = threading.Lock()
+
+    def __getattr__(self, name: str) -> any:
+        if not name.startswith('get_'):
+            raise AttributeError(name)
+        try:
+            endpoint = get_endpoint(name)
+        except KeyError:
+            raise AttributeError(name)
+
+        def call(*args, **kwargs):
+            frame = sys._getframe(1)
+            job = self.job or f'{frame.f_code.co_filename}:{frame.f_lineno}'
+            return self._call(endpoint, job, args, kwargs)
+
+        return call
+
+    def _call(self, endpoint: Endpoint, job: str, args: tuple, kwargs: dict) -> list:
+        method = getattr(self.client, endpoint.method)
+        params = inspect.signature(method).bind(*args, **kwargs).arguments
+        if endpoint.result != 'rows':
+            return method(**params)
+        if params.get('fields') or 'id' not in endpoint.model.fields():
+            # explicit projections and rows that can't be refetched by id are passed through untouched
+            return list(method(**params))
+        known = self.profile.fields(job, endpoint.name)
+        requested = None
+        if known is not None:
+            required = {'id', endpoint.date_field} - {None}
+            requested = [f for f in endpoint.model.fields() if f in required or f in known]
+            params['fields'] = requested
+        tracker = _Tracker(self, job, endpoint, dict(params), requested)
+        with self._lock:
+            self._trackers.append(tracker)
+        rows = list(method(**params))
+        if rows:
+            # empty windows don't count as runs, otherwise quiet periods would age every field out
+            self.profile.start_run(job, endpoint.name)
+        tracked = _tracked_class(endpoint.model, tracker)
+        for row in rows:
+            if requested is not None:
+                row.project(requested)
+            row.__class__ = tracked
+        return rows
+
+    def stats(self) -> list:
+        """
+        :return: list of dicts (job, endpoint, requested and read fields, refetches) per get_* call
+        """
+        with self._lock:
+            return [
+                {'job': t.job, 'endpoint': t.endpoint.name, 'requested': t.requested, 'read': sorted(t.seen),
+                 'refetches': t.refetches}
+                for t in self._trackers
+            ]
+
+    def save(self) -> None:
+        with self._lock:
+            trackers, self._trackers = self._trackers, []
+        for tracker in trackers:
+            self.profile.record(tracker.job, tracker.endpoint.name, tracker.seen)
+        self.profile.save()
+
+    def __enter__(self) -> 'AdaptiveFields':
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.save()
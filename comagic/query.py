@@ -0,0 +1,315 @@
+"""
+Query builder over the report and list endpoints.
+
+    from comagic.query import F
+
+    calls = (client.query('calls_report')
+             .select('id', 'start_time', 'talk_duration', 'campaign_id', 'tags')
+             .between(date_from, date_till)
+             .where(F('talk_duration') > 30, F('direction') == 'in')
+             .order_by('-start_time'))
+    for call in calls.iter(page_size=5000):
+        ...
+
+Field names, operators and required arguments are validated before anything is sent, and the returned
+models carry only the selected fields.
+"""
+from datetime import datetime
+from typing import Iterator, Optional, Union
+
+from .endpoints import Endpoint, get_endpoint
+from .errors import ComagicParamsError
+from .pagination import MAX_LIMIT, AdaptivePageSizer, iter_keyset_pages, iter_offset_pages
+from .utils import to_api_value
+
+OPERATORS = ('=', '!=', '>', '>=', '<', '<=', 'in', 'not_in', 'like', 'ilike')
+DEFAULT_KEYSET = ('id',)
+
+
+class Filter(object):
+    def fields(self) -> set:
+        raise NotImplementedError
+
+    def to_dict(self) -> dict:
+        raise NotImplementedError
+
+    def __and__(self, other: 'Filter') -> 'Filter':
+        return FilterGroup('and', [self, other])
+
+    def __or__(self, other: 'Filter') -> 'Filter':
+        return FilterGroup('or', [self, other])
+
+
+class Condition(Filter):
+    def __init__(self, field: str, operator: str, value: any) -> None:
+        if operator not in OPERATORS:
+            raise ComagicParamsError(f'invalid operator {operator}, operator must be in {list(OPERATORS)}')
+        if operator in ('in', 'not_in') and not isinstance(value, (list, tuple, set, frozenset)):
+            raise ComagicParamsError(f'{operator} needs a list of values for {field}')
+        self.field = field
+        self.operator = operator
+        self.value = value
+
+    def fields(self) -> set:
+        return {self.field}
+
+    def to_dict(self) -> dict:
+        return {'field': self.field, 'operator': self.operator, 'value': to_api_value(self.value)}
+
+    def __repr__(self):
+        return f'Condition({self.field!r}, {self.operator!r}, {self.value!r})'
+
+
+class FilterGroup(Filter):
+    def __init__(self, condition: str, filters: list) -> None:
+        if condition not in ('and', 'or'):
+            raise ComagicParamsError('condition must be in [and, or]')
+        self.condition = condition
+        self.filters = []
+        for f in filters:
+            # flatten (a & b) & c into one group
+            if isinstance(f, FilterGroup) and f.condition == condition:
+                self.filters.extend(f.filters)
+            else:
+                self.filters.append(f)
+
+    def fields(self) -> set:
+        return set().union(*(f.fields() for f in self.filters))
+
+    def to_dict(self) -> dict:
+        return {'filters': [f.to_dict() for f in self.filters], 'condition': self.condition}
+
+    def __repr__(self):
+        return f'FilterGroup({self.condition!r}, {self.filters!r})'
+
+
+class F(object):
+    """Field reference, comparisons build filter conditions: ``F('talk_duration') > 30``."""
+    __hash__ = None
+
+    def __init__(self, name: str) -> None:
+        self.name = name
+
+    def __eq__(self, value: any) -> Condition:
+        return Condition(self.name, '=', value)
+
+    def __ne__(self, value: any) -> Condition:
+        return Condition(self.name, '!=', value)
+
+    def __gt__(self, value: any) -> Condition:
+        return Condition(self.name, '>', value)
+
+    def __ge__(self, value: any) -> Condition:
+        return Condition(self.name, '>=', value)
+
+    def __lt__(self, value: any) -> Condition:
+        return Condition(self.name, '<', value)
+
+    def __le__(self, value: any) -> Condition:
+        return Condition(self.name, '<=', value)
+
+    def in_(self, values: Union[list, tuple, set]) -> Condition:
+        return Condition(self.name, 'in', values)
+
+    def not_in(self, values: Union[list, tuple, set]) -> Condition:
+        return Condition(self.name, 'not_in', values)
+
+    def like(self, pattern: str) -> Condition:
+        return Condition(self.name, 'like', pattern)
+
+    def ilike(self, pattern: str) -> Condition:
+        return Condition(self.name, 'ilike', pattern)
+
+    def asc(self) -> dict:
+        return {'field': self.name, 'order': 'asc'}
+
+    def desc(self) -> dict:
+        return {'field': self.name, 'order': 'desc'}
+
+
+class ReportQuery(object):
+    def __init__(self, client: any, endpoint: Union[str, Endpoint]) -> None:
+        """
+        :param client: Comagic (or anything with the same get_* methods)
+        :param endpoint: str or Endpoint (e.g. calls_report)
+        """
+        self.client = client
+        self.endpoint = endpoint if isinstance(endpoint, Endpoint) else get_endpoint(endpoint)
+        if self.endpoint.result != 'rows':
+            raise ComagicParamsError(f'{self.endpoint.name} does not return report rows')
+        self._fields = None
+        self._filter = None
+        self._sort = []
+        self._date_from = None
+        self._date_till = None
+        self._user_id = None
+        self._limit = None
+        self._offset = None
+        self._args = {}
+
+    @property
+    def model(self) -> type:
+        return self.endpoint.model
+
+    def _copy(self, **changes) -> 'ReportQuery':
+        query = self.__class__.__new__(self.__class__)
+        query.__dict__.update(self.__dict__)
+        query._sort = list(self._sort)
+        query._args = dict(self._args)
+        query.__dict__.update(changes)
+        return query
+
+    def _check_fields(self, fields: Union[list, set], what: str) -> None:
+        known = set(self.model.fields())
+        unknown = [f for f in fields if f not in known]
+        if unknown:
+            raise ComagicParamsError(f'unknown {what} fields for {self.endpoint.name}: {", ".join(unknown)}')
+
+    def select(self, *fields: str) -> 'ReportQuery':
+        fields = list(dict.fromkeys(fields))
+        self._check_fields(fields, 'selected')
+        return self._copy(_fields=fields)
+
+    def where(self, *filters: Filter) -> 'ReportQuery':
+        for f in filters:
+            if not isinstance(f, Filter):
+                raise ComagicParamsError(f'where() takes filters built with F(...), got {f!r}')
+            self._check_fields(f.fields(), 'filter')
+        combined = [self._filter] if self._filter is not None else []
+        combined.extend(filters)
+        if not combined:
+            return self._copy()
+        return self._copy(_filter=combined[0] if len(combined) == 1 else FilterGroup('and', combined))
+
+    def order_by(self, *fields: Union[str, dict]) -> 'ReportQuery':
+        """
+        :param fields: str ('start_time' ascending, '-start_time' descending) or F('start_time').desc()
+        """
+        sort = []
+        for field in fields:
+            if isinstance(field, str):
+                field = {'field': field.lstrip('-'), 'order': 'desc' if field.startswith('-') else 'asc'}
+            sort.append(field)
+        self._check_fields([s['field'] for s in sort], 'sort')
+        return self._copy(_sort=self._sort + sort)
+
+    def between(self, date_from: datetime, date_till: datetime) -> 'ReportQuery':
+        if not self.endpoint.date_field:
+            raise ComagicParamsError(f'{self.endpoint.name} is not bounded by date_from/date_till')
+        if date_from > date_till:
+            raise ComagicParamsError('date_from must not be after date_till')
+        return self._copy(_date_from=date_from, _date_till=date_till)
+
+    def for_user(self, user_id: Optional[int]) -> 'ReportQuery':
+        return self._copy(_user_id=user_id)
+
+    def limit(self, limit: int) -> 'ReportQuery':
+        if limit < 0:
+            raise ComagicParamsError('limit must not be negative')
+        return self._copy(_limit=limit)
+
+    def offset(self, offset: int) -> 'ReportQuery':
+        if offset < 0:
+            raise ComagicParamsError('offset must not be negative')
+        return self._copy(_offset=offset)
+
+    def with_args(self, **kwargs) -> 'ReportQuery':
+        """Endpoint specific arguments, e.g. ``with_args(chat_id=1)`` for chat_messages_report."""
+        args = dict(self._args, **kwargs)
+        return self._copy(_args=args)
+
+    def params(self) -> dict:
+        """
+        :return: dict (keyword arguments for the client method, validated)
+        """
+        if self.endpoint.date_field and (self._date_from is None or self._date_till is None):
+            raise ComagicParamsError(f'{self.endpoint.name} needs between(date_from, date_till)')
+        if self.endpoint.name == 'chat_messages_report' and 'chat_id' not in self._args:
+            raise ComagicParamsError('chat_messages_report needs with_args(chat_id=...)')
+        params = dict(self._args)
+        params.update({
+            'limit': self._limit,
+            'offset': self._offset,
+            'filter': self._filter.to_dict() if self._filter is not None else None,
+            'fields': list(self._fields) if self._fields else None,
+            'sort': self._sort or None,
+            'user_id': self._user_id,
+        })
+        if self.endpoint.date_field:
+            params['date_from'] = self._date_from
+            params['date_till'] = self._date_till
+        return params
+
+    def _project(self, rows: Iterator) -> list:
+        if not self._fields:
+            return list(rows)
+        return [row.project(self._fields) for row in rows]
+
+    def _fetch_raw(self, params: dict) -> list:
+        return list(getattr(self.client, self.endpoint.method)(**params))
+
+    def _fetch(self, params: dict) -> list:
+        return self._project(self._fetch_raw(params))
+
+    def fetch(self) -> list:
+        """One request with the query limit/offset."""
+        return self._fetch(self.params())
+
+    def first(self) -> Optional[any]:
+        rows = self.limit(1).fetch()
+        return rows[0] if rows else None
+
+    def _keyset(self, keyset: Union[bool, tuple, list]) -> tuple:
+        keys = DEFAULT_KEYSET if keyset is True else tuple(keyset)
+        self._check_fields(keys, 'keyset')
+        if keys[-1] != 'id':
+            raise ComagicParamsError('the last keyset field must be id, keys have to be unique')
+        if self._offset:
+            raise ComagicParamsError('offset() and keyset pagination are mutually exclusive')
+        if self._sort and [s['field'] for s in self._sort] != list(keys):
+            raise ComagicParamsError('keyset pagination sorts by the keyset, order_by() must match it or be empty')
+        if any(s.get('order') == 'desc' for s in self._sort):
+            raise ComagicParamsError('keyset pagination only walks ascending')
+        return keys
+
+    def _response_size(self) -> Optional[int]:
+        last_response = getattr(self.client, 'last_response', None)
+        return last_response['size'] if last_response else None
+
+    def pages(self, page_size: Union[int, AdaptivePageSizer] = MAX_LIMIT,
+              keyset: Union[bool, tuple, list] = False) -> Iterator[list]:
+        """
+        :param page_size: int or AdaptivePageSizer (learns the size per endpoint and selected fields)
+        :param keyset: bool or tuple (False pages by offset, True by id, or a key such as ('start_time', 'id'))
+        :return: iterator of pages
+        """
+        params = self.params()
+        sizing = {
+            'key': f'{self.endpoint.name}:{",".join(sorted(self._fields or ["*"]))}',
+            'response_size': self._response_size,
+        }
+        if not keyset:
+            def fetch(limit: int, offset: int) -> list:
+                return self._fetch(dict(params, limit=limit, offset=offset))
+
+            return iter_offset_pages(fetch, page_size, offset=self._offset or 0, max_rows=self._limit, **sizing)
+
+        keys = self._keyset(keyset)
+        if params['fields']:
+            params['fields'] = params['fields'] + [k for k in keys if k not in params['fields']]
+
+        def fetch_after(limit: int, filter: dict, sort: list) -> list:
+            return self._fetch_raw(dict(params, limit=limit, offset=None, filter=filter, sort=sort))
+
+        pages = iter_keyset_pages(fetch_after, keys, page_size, filter=params['filter'], max_rows=self._limit,
+                                  **sizing)
+        return (self._project(page) for page in pages)
+
+    def iter(self, page_size: Union[int, AdaptivePageSizer] = MAX_LIMIT,
+             keyset: Union[bool, tuple, list] = False) -> Iterator[any]:
+        """All rows of the query, paginated (see pages())."""
+        for page in self.pages(page_size, keyset=keyset):
+            yield from page
+
+    def __iter__(self) -> Iterator[any]:
+        return self.iter()
@@ -0,0 +1,164 @@
+"""
+Reconciliation of late updates in recent report windows.
+
+Calls and communications change after they were first exported: sales, tags, ratings and attributes are filled
+in hours or days later. ``Reconciler`` re-reads recent windows with a narrow projection on a decaying schedule,
+young rows often and older rows rarely, and yields only the rows whose projected fields changed::
+
+    reconciler = Reconciler(client, 'calls_report', path='calls_reconcile.json')
+    while True:
+        for call in reconciler.run():
+            warehouse.update('calls', call.id, sale_cost=call.sale_cost, tags=call.tags)
+        reconciler.save()
+        time.sleep(60)
+
+Rows seen for the first time are only recorded, the incremental export already has them.
+"""
+import hashlib
+import json
+import os
+import threading
+from datetime import datetime, timedelta
+from typing import Iterator, Optional, Union
+
+from .endpoints import get_endpoint
+from .pagination import MAX_LIMIT, AdaptivePageSizer
+from .utils import DATETIME_FORMAT
+
+LATE_FIELDS = {
+    'calls_report': ('sale_date', 'sale_cost', 'tags', 'last_answered_employee_rating', 'attributes'),
+    'communications_report': ('sale_date', 'sale_cost', 'tags', 'attributes'),
+}
+
+# (max age, rescan interval): rows younger than max age (and older than the previous tier) are read again every
+# interval
+DEFAULT_SCHEDULE = (
+    (timedelta(hours=6), timedelta(minutes=15)),
+    (timedelta(days=1), timedelta(hours=1)),
+    (timedelta(days=3), timedelta(hours=6)),
+    (timedelta(days=7), timedelta(days=1)),
+)
+
+
+def _digest(row: any, fields: tuple) -> str:
+    data = json.dumps([getattr(row, field, None) for field in fields], ensure_ascii=False, default=str)
+    return hashlib.blake2b(data.encode('utf-8'), digest_size=8).hexdigest()
+
+
+class Reconciler(object):
+    def __init__(self, client: any, endpoint: str = 'calls_report', fields: Optional[tuple] = None,
+                 schedule: tuple = DEFAULT_SCHEDULE, path: Optional[str] = None, user_id: Optional[int] = None,
+                 page_size: Union[int, AdaptivePageSizer] = MAX_LIMIT, emit_new: bool = False) -> None:
+        """
+        :param client: Comagic
+        :param endpoint: str (report with a date field, e.g. calls_report)
+        :param fields: tuple (fields compared, LATE_FIELDS of the endpoint by default)
+        :param schedule: tuple of (max age, interval) with growing ages
+        :param path: str (json file with row digests and scan times, loaded if it exists, written by save())
+        :param user_id: int
+        :param page_size: int or AdaptivePageSizer
+        :param emit_new: bool (also yield rows seen for the first time)
+        """
+        self.client = client
+        self.endpoint = get_endpoint(endpoint)
+        if not self.endpoint.date_field:
+            raise ValueError(f'{self.endpoint.name} is not bounded by date_from/date_till')
+        self.fields = tuple(fields or LATE_FIELDS.get(self.endpoint.name, ()))
+        if not self.fields:
+            raise ValueError(f'no fields to reconcile for {self.endpoint.name}')
+        ages = [age for age, _ in schedule]
+        if not ages or ages != sorted(ages):
+            raise ValueError('schedule ages must be growing')
+        self.schedule = schedule
+        self.path = path
+        self.user_id = user_id
+        self.page_size = page_size
+        self.emit_new = emit_new
+        self.stats = {'windows': 0, 'rows': 0, 'changed': 0, 'new': 0}
+        # id -> [digest, row date], scanned: tier -> last scan time
+        self._rows = {}
+        self._scanned = {}
+        self._lock = threading.Lock()
+        if path and os.path.exists(path):
+            with open(path, encoding='utf-8') as f:
+                state = json.load(f)
+            self._rows = state.get('rows', {})
+            self._scanned = state.get('scanned', {})
+
+    def due(self, now: Optional[datetime] = None, force: bool = False) -> list:
+        """
+        :return: list of (tier, date_from, date_till) windows whose interval has passed, youngest first
+        """
+        now = now or datetime.now()
+        windows = []
+        newer = timedelta(0)
+        for tier, (age, interval) in enumerate(self.schedule):
+            last = self._scanned.get(str(tier))
+            if force or last is None or now - datetime.strptime(last, DATETIME_FORMAT) >= interval:
+                date_till = now - newer
+                if newer:
+                    date_till -= timedelta(seconds=1)
+                windows.append((tier, now - age, date_till))
+            newer = age
+        return windows
+
+    def scan(self, date_from: datetime, date_till: datetime) -> Iterator[any]:
+        """
+        Read one window and yield its changed rows (id, date field and the compared fields are set).
+        """
+        date_field = self.endpoint.date_field
+        query = self.client.query(self.endpoint.name).between(date_from, date_till).for_user(self.user_id)
+        query = query.select(*dict.fromkeys(('id', date_field) + self.fields))
+        self.stats['windows'] += 1
+        for row in query.iter(page_size=self.page_size):
+            digest = _digest(row, self.fields)
+            key = str(row.id)
+            date = getattr(row, date_field, None)
+            date = date.strftime(DATETIME_FORMAT) if isinstance(date, datetime) else date
+            with self._lock:
+                previous = self._rows.get(key)
+                self._rows[key] = [digest, date]
+            self.stats['rows'] += 1
+            if previous is None:
+                self.stats['new'] += 1
+                if self.emit_new:
+                    yield row
+            elif previous[0] != digest:
+                self.stats['changed'] += 1
+                yield row
+
+    def run(self, now: Optional[datetime] = None, force: bool = False) -> Iterator[any]:
+        """
+        Scan every due window, then forget rows older than the oldest tier.
+
+        :param now: datetime (current time of the account, datetime.now() by default)
+        :param force: bool (scan every tier regardless of its interval)
+        :return: iterator of changed rows
+        """
+        now = now or datetime.now()
+        for tier, date_from, date_till in self.due(now, force):
+            yield from self.scan(date_from, date_till)
+            self._scanned[str(tier)] = now.strftime(DATETIME_FORMAT)
+        self.prune(now - self.schedule[-1][0])
+
+    def prune(self, before: datetime) -> int:
+        """
+        :return: int (digests dropped for rows dated before ``before``)
+        """
+        cutoff = before.strftime(DATETIME_FORMAT)
+        with self._lock:
+            old = [key for key, (_, date) in self._rows.items() if date is not None and date < cutoff]
+            for key in old:
+                del self._rows[key]
+        return len(old)
+
+    def save(self, path: Optional[str] = None) -> None:
+        path = path or self.path
+        if not path:
+            return
+        with self._lock:
+            data = json.dumps({'rows': self._rows, 'scanned': self._scanned}, sort_keys=True)
+        tmp_path = f'{path}.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
@@ -0,0 +1,234 @@
+"""
+Call recording downloads.
+
+``Call.call_records`` and ``CallLegs.call_records`` hold recording ids; together with the call session id they
+give the recording url. ``RecordingDownloader`` streams recordings to disk in chunks on a bounded thread pool::
+
+    downloader = RecordingDownloader('/data/recordings', workers=8)
+    stats = downloader.download(client.get_calls_report(date_from, date_till, fields=['id', 'call_records']))
+    print(stats['files'], stats['skipped'], stats['bytes_per_second'])
+
+Files are written to ``<name>.part`` and renamed when complete. An existing ``.part`` file is resumed with an
+HTTP Range request, a complete file of the expected size is skipped. A part file that doesn't line up with the
+server copy (the range starts elsewhere, or it is longer than the recording) is discarded and downloaded again.
+"""
+import os
+import re
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Callable, Iterable, Iterator, Optional
+
+from .errors import ComagicException
+
+COMAGIC_RECORD_URL = 'https://app.comagic.ru/system/media/talk/{call_session_id}/{record}/'
+UIS_RECORD_URL = 'https://app.uiscom.ru/system/media/talk/{call_session_id}/{record}/'
+DEFAULT_CHUNK_SIZE = 64 * 1024
+
+Recording = namedtuple('Recording', ['call_session_id', 'record', 'url', 'path'])
+
+_CONTENT_RANGE = re.compile(r'bytes\s+(?:(\d+)-\d+|\*)/(\d+|\*)')
+
+
+def _get(row: any, field: str) -> any:
+    return row.get(field) if isinstance(row, dict) else getattr(row, field, None)
+
+
+def _content_range(headers: dict) -> tuple:
+    """
+    :return: tuple (first byte, total size) of a Content-Range header, None where the server didn't say
+    """
+    match = _CONTENT_RANGE.fullmatch((headers.get('Content-Range') or '').strip())
+    if match is None:
+        return None, None
+    start, total = match.groups()
+    return (int(start) if start is not None else None), (int(total) if total != '*' else None)
+
+
+def iter_recordings(calls: Iterable, directory: str, url_template: str = COMAGIC_RECORD_URL,
+                    extension: str = '.mp3') -> Iterator[Recording]:
+    """
+    :param calls: iterable of Call / CallLegs models or dicts
+    :param directory: str (target directory)
+    :param url_template: str (format string with {call_session_id} and {record})
+    :param extension: str (file name suffix)
+    :return: iterator of Recording, each recording once
+    """
+    seen = set()
+    for row in calls:
+        # calls_report ids are call session ids, call legs carry call_session_id
+        call_session_id = _get(row, 'call_session_id') or _get(row, 'id')
+        for record in _get(row, 'call_records') or ():
+            if record in seen:
+                continue
+            seen.add(record)
+            yield Recording(call_session_id, record,
+                            url_template.format(call_session_id=call_session_id, record=record),
+                            os.path.join(directory, f'{call_session_id}_{record}{extension}'))
+
+
+class RecordingDownloader(object):
+    def __init__(self, directory: str, url_template: str = COMAGIC_RECORD_URL, workers: int = 8,
+                 chunk_size: int = DEFAULT_CHUNK_SIZE, timeout: float = 60, retries: int = 2,
+                 extension: str = '.mp3', progress: Optional[Callable[[dict], None]] = None) -> None:
+        """
+        :param directory: str (created if missing)
+        :param url_template: str (COMAGIC_RECORD_URL, UIS_RECORD_URL or e.g. a local file server)
+        :param workers: int (parallel downloads, also the bound of queued recordings)
+        :param chunk_size: int (bytes read and written at a time)
+        :param timeout: float (seconds per http read)
+        :param retries: int (extra attempts per recording, each resumes from what is on disk)
+        :param extension: str
+        :param progress: callable(stats) (called after every finished recording)
+        """
+        self.directory = directory
+        self.url_template = url_template
+        self.workers = workers
+        self.chunk_size = chunk_size
+        self.timeout = timeout
+        self.retries = retries
+        self.extension = extension
+        self.progress = progress
+        self.stats = {}
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._reset_stats()
+
+    def _reset_stats(self) -> None:
+        self.stats = {'files': 0, 'skipped': 0, 'resumed': 0, 'failed': 0, 'bytes': 0, 'seconds': 0.0,
+                      'bytes_per_second': 0.0, 'errors': []}
+
+    @property
+    def _session(self):
+        # requests sessions are not shared between threads
+        session = getattr(self._local, 'session', None)
+        if session is None:
+            import requests
+
+            session = self._local.session = requests.Session()
+        return session
+
+    def _add(self, **counts) -> None:
+        with self._lock:
+            for name, value in counts.items():
+                self.stats[name] += value
+
+    def _expected_size(self, url: str) -> Optional[int]:
+        response = self._session.head(url, timeout=self.timeout, allow_redirects=True)
+        if response.status_code != 200:
+            return None
+        length = response.headers.get('Content-Length')
+        return int(length) if length is not None else None
+
+    def _fetch(self, recording: Recording) -> str:
+        """
+        :return: str (downloaded, resumed or skipped)
+        """
+        if os.path.exists(recording.path) and os.path.getsize(recording.path) == \
+                self._expected_size(recording.url):
+            return 'skipped'
+        part_path = f'{recording.path}.part'
+        offset = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+        result = self._fetch_from(recording, part_path, offset)
+        if result is None:
+            # the part file doesn't line up with the server copy, start over
+            os.remove(part_path)
+            result = self._fetch_from(recording, part_path, 0)
+        if result is None:
+            raise ComagicException({'code': 416, 'message': f'recording {recording.record}: size mismatch'})
+        os.replace(part_path, recording.path)
+        return result
+
+    def _fetch_from(self, recording: Recording, part_path: str, offset: int) -> Optional[str]:
+        """
+        Write the recording from ``offset`` on into the part file.
+
+        :return: str (downloaded or resumed) or None (the part file has to be discarded)
+        """
+        headers = {'Range': f'bytes={offset}-'} if offset else {}
+        with self._session.get(recording.url, headers=headers, stream=True, timeout=self.timeout) as response:
+            if response.status_code == 416 and offset:
+                # complete only when the part file is exactly the recording size
+                total = _content_range(response.headers)[1]
+                if total is None:
+                    total = self._expected_size(recording.url)
+                return 'resumed' if total == offset else None
+            if response.status_code not in (200, 206):
+                raise ComagicException({'code': response.status_code,
+                                        'message': f'recording {recording.record}: http {response.status_code}'})
+            if response.status_code == 206:
+                start, total = _content_range(response.headers)
+                if start != offset:
+                    return None
+            else:
+                # no range support, start over
+                offset, total = 0, None
+                length = response.headers.get('Content-Length')
+                if length is not None and not response.headers.get('Content-Encoding'):
+                    total = int(length)
+            with open(part_path, 'ab' if offset else 'wb') as f:
+                for chunk in response.iter_content(self.chunk_size):
+                    f.write(chunk)
+                    self._add(bytes=len(chunk))
+        size = os.path.getsize(part_path)
+        if total is not None and size > total:
+            return None
+        if total is not None and size < total:
+            # what arrived is a valid prefix, the next attempt resumes from it
+            raise ComagicException({'code': 206, 'message': f'recording {recording.record}: {size} of {total} bytes'})
+        return 'resumed' if offset else 'downloaded'
+
+    def download_one(self, recording: Recording) -> str:
+        """
+        :return: str (downloaded, resumed, skipped or failed)
+        """
+        import requests
+
+        for attempt in range(self.retries + 1):
+            try:
+                result = self._fetch(recording)
+                break
+            except (requests.RequestException, OSError, ComagicException) as e:
+                if attempt == self.retries:
+                    with self._lock:
+                        self.stats['failed'] += 1
+                        self.stats['errors'].append((recording.record, f'{e}'))
+                    return 'failed'
+        self._add(files=int(result in ('downloaded', 'resumed')), skipped=int(result == 'skipped'),
+                  resumed=int(result == 'resumed'))
+        return result
+
+    def download(self, calls: Iterable) -> dict:
+        """
+        :param calls: iterable of Call / CallLegs models or dicts with call_records
+        :return: dict (files, skipped, resumed, failed, bytes, seconds, bytes_per_second, errors)
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        self._reset_stats()
+        started = time.monotonic()
+        recordings = iter_recordings(calls, self.directory, self.url_template, self.extension)
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            pending = set()
+            for recording in recordings:
+                # the call stream is consumed only as fast as recordings finish
+                if len(pending) >= self.workers * 2:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    self._finished(done, started)
+                pending.add(executor.submit(self.download_one, recording))
+            done, _ = wait(pending)
+            self._finished(done, started)
+        self._update_rate(started)
+        return self.stats
+
+    def _update_rate(self, started: float) -> None:
+        with self._lock:
+            seconds = self.stats['seconds'] = time.monotonic() - started
+            self.stats['bytes_per_second'] = self.stats['bytes'] / seconds if seconds else 0.0
+
+    def _finished(self, done: set, started: float) -> None:
+        for future in done:
+            future.result()
+            self._update_rate(started)
+            if self.progress:
+                self.progress(dict(self.stats))
@@ -0,0 +1,519 @@
+"""
+Local stand-in for the Comagic Data API.
+
+Speaks the same JSON-RPC envelope as dataapi.comagic.ru so ``Comagic`` can be pointed at it
+(``Comagic(..., api_url=server.url)``) for load tests, benchmarks and offline development.
+
+Three modes:
+    serve  - answer from in-memory datasets registered with ``add_rows`` / ``load_fixtures``
+    record - proxy every call to ``upstream_url`` and write the exchanges to a fixtures file
+    replay - answer from a fixtures file written in record mode
+
+Files registered with ``add_file`` (e.g. call recordings) are served on GET/HEAD with Range support.
+
+Run from the command line::
+
+    python -m comagic.server --port 8080 --fixtures reports.json --latency 0.05
+"""
+import json
+import re
+import threading
+import time
+import uuid
+from fnmatch import fnmatchcase
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Iterable, Optional, Sequence
+from urllib.request import Request, urlopen
+
+ACCESS_TOKEN_ERROR_CODE = -32001
+RATE_LIMIT_ERROR_CODE = -32029
+INVALID_PARAMS_ERROR_CODE = -32602
+METHOD_NOT_FOUND_ERROR_CODE = -32601
+PARSE_ERROR_CODE = -32700
+INTERNAL_ERROR_CODE = -32603
+
+DEFAULT_MAX_LIMIT = 10000
+
+# date column used for date_from / date_till on date-bounded reports
+REPORT_DATE_FIELDS = {
+    'calls_report': 'start_time',
+    'call_legs_report': 'start_time',
+    'financial_call_legs_report': 'start_time',
+    'communications_report': 'date_time',
+    'goals_report': 'date_time',
+    'chats_report': 'date_time',
+    'offline_messages_report': 'date_time',
+    'visitor_sessions_report': 'date_time',
+    'campaign_daily_stat': 'date',
+}
+
+
+class StandInError(Exception):
+    def __init__(self, code: int, message: str, data: any = None) -> None:
+        self.code = code
+        self.message = message
+        self.data = data
+        super().__init__(code, message)
+
+    def to_dict(self) -> dict:
+        return {'code': self.code, 'message': self.message, 'data': self.data}
+
+
+def match_filter(row: dict, filter: Optional[dict]) -> bool:
+    """
+    :param row: dict (report row)
+    :param filter: dict (api filter, either a condition or {"filters": [...], "condition": "and"|"or"})
+    :return: bool
+    """
+    if not filter:
+        return True
+    if 'filters' in filter:
+        results = (match_filter(row, f) for f in filter['filters'])
+        if filter.get('condition', 'and') == 'or':
+            return any(results)
+        return all(results)
+    value = row.get(filter['field'])
+    operator = filter.get('operator', '=')
+    expected = filter.get('value')
+    if operator == '=':
+        return value == expected
+    if operator == '!=':
+        return value != expected
+    if operator == 'in':
+        return value in expected
+    if operator == 'not_in':
+        return value not in expected
+    if operator in ('like', 'ilike'):
+        if value is None:
+            return False
+        pattern = str(expected).replace('%', '*')
+        if operator == 'ilike':
+            return fnmatchcase(str(value).lower(), pattern.lower())
+        return fnmatchcase(str(value), pattern)
+    if value is None or expected is None:
+        return False
+    if operator == '>':
+        return value > expected
+    if operator == '>=':
+        return value >= expected
+    if operator == '<':
+        return value < expected
+    if operator == '<=':
+        return value <= expected
+    raise StandInError(INVALID_PARAMS_ERROR_CODE, f'unknown filter operator {operator}')
+
+
+def sort_rows(rows: Iterable[dict], sort: Optional[list]) -> list:
+    rows = list(rows)
+    for item in reversed(sort or []):
+        field = item['field']
+        rows.sort(key=lambda r: (r.get(field) is not None, r.get(field)), reverse=item.get('order') == 'desc')
+    return rows
+
+
+def _bisect(rows: Sequence[dict], field: str, value: str, right: bool = False) -> int:
+    lo, hi = 0, len(rows)
+    while lo < hi:
+        mid = (lo + hi) // 2
+        current = rows[mid].get(field) or ''
+        if current < value or (right and current == value):
+            lo = mid + 1
+        else:
+            hi = mid
+    return lo
+
+
+def _request_key(method: str, params: dict) -> str:
+    params = {key: value for key, value in params.items() if key != 'access_token'}
+    return json.dumps([method, params], sort_keys=True, ensure_ascii=False)
+
+
+class _TokenBucket(object):
+    def __init__(self, rate: float, burst: int) -> None:
+        self.rate = rate
+        self.burst = burst
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def take(self) -> bool:
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            if self._tokens < 1:
+                return False
+            self._tokens -= 1
+            return True
+
+
+class StandInServer(object):
+    def __init__(self, host: str = '127.0.0.1', port: int = 0, login: str = '', password: str = '',
+                 latency: float = 0.0, rate_limit: Optional[float] = None, rate_burst: Optional[int] = None,
+                 token_ttl: Optional[float] = None, max_limit: int = DEFAULT_MAX_LIMIT,
+                 mode: str = 'serve', fixtures_path: Optional[str] = None, upstream_url: Optional[str] = None) -> None:
+        """
+        :param host: str
+        :param port: int (0 picks a free port)
+        :param login: str (accepted login, any login is accepted if empty)
+        :param password: str (accepted password)
+        :param latency: float (seconds added to every response)
+        :param rate_limit: float (requests per second per access token, -32029 when exceeded)
+        :param rate_burst: int (bucket size for rate_limit, defaults to rate_limit)
+        :param token_ttl: float (seconds until issued access tokens expire with -32001)
+        :param max_limit: int (row cap per request)
+        :param mode: str (serve, record or replay)
+        :param fixtures_path: str (fixtures file written in record mode, read in replay mode)
+        :param upstream_url: str (real api url for record mode)
+        """
+        if mode not in ('serve', 'record', 'replay'):
+            raise ValueError('mode must be in [serve, record, replay]')
+        if mode == 'record' and not (upstream_url and fixtures_path):
+            raise ValueError('record mode needs upstream_url and fixtures_path')
+        if mode == 'replay' and not fixtures_path:
+            raise ValueError('replay mode needs fixtures_path')
+        self.login = login
+        self.password = password
+        self.latency = latency
+        self.token_ttl = token_ttl
+        self.max_limit = max_limit
+        self.mode = mode
+        self.fixtures_path = fixtures_path
+        self.upstream_url = upstream_url
+        self.requests_count = 0
+        self.logins_count = 0
+        self._rate_limit = rate_limit
+        self._rate_burst = rate_burst or max(1, int(rate_limit or 1))
+        self._buckets = {}
+        self._tokens = {}
+        self._datasets = {}
+        self._date_fields = dict(REPORT_DATE_FIELDS)
+        self._next_ids = {}
+        self._replay = {}
+        self._files = {}
+        self._lock = threading.Lock()
+        self._record_lock = threading.Lock()
+        if mode == 'replay':
+            self._load_replay(fixtures_path)
+        self._httpd = ThreadingHTTPServer((host, port), _Handler)
+        self._httpd.daemon_threads = True
+        self._httpd.stand_in = self
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._httpd.server_address[:2]
+        return f'http://{host}:{port}/v2.0'
+
+    @property
+    def files_url(self) -> str:
+        host, port = self._httpd.server_address[:2]
+        return f'http://{host}:{port}'
+
+    def start(self) -> 'StandInServer':
+        self._thread = threading.Thread(target=self._httpd.serve_forever, name='comagic-stand-in', daemon=True)
+        self._thread.start()
+        return self
+
+    def serve_forever(self) -> None:
+        self._httpd.serve_forever()
+
+    def stop(self) -> None:
+        self._httpd.shutdown()
+        self._httpd.server_close()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def __enter__(self) -> 'StandInServer':
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
+
+    def add_rows(self, endpoint: str, rows: Sequence[dict], date_field: Optional[str] = None,
+                 presorted: bool = False) -> None:
+        """
+        :param endpoint: str (api entity, e.g. calls_report or employees)
+        :param rows: sequence of dicts (a list, or any indexable sequence for generated data)
+        :param date_field: str (column for date_from / date_till, known reports have a default)
+        :param presorted: bool (rows are already ordered by date_field, skips sorting and copying)
+        """
+        if date_field:
+            self._date_fields[endpoint] = date_field
+        date_field = self._date_fields.get(endpoint)
+        if date_field and not presorted:
+            rows = sorted(rows, key=lambda r: r.get(date_field) or '')
+        elif not presorted:
+            rows = list(rows)
+        with self._lock:
+            self._datasets[endpoint] = rows
+
+    def load_fixtures(self, path: str) -> None:
+        """
+        :param path: str (json file {"<endpoint>": [rows], ...})
+        """
+        with open(path, encoding='utf-8') as f:
+            for endpoint, rows in json.load(f).items():
+                self.add_rows(endpoint, rows)
+
+    def add_file(self, path: str, content: bytes) -> None:
+        """
+        Serve ``content`` on GET/HEAD ``files_url + path``, with Range support (e.g. call recordings).
+
+        :param path: str (e.g. /system/media/talk/1/abc/)
+        :param content: bytes
+        """
+        with self._lock:
+            self._files[path] = content
+
+    def get_file(self, path: str) -> Optional[bytes]:
+        with self._lock:
+            return self._files.get(path)
+
+    def expire_tokens(self) -> None:
+        with self._lock:
+            self._tokens.clear()
+
+    def handle(self, payload: dict) -> dict:
+        """
+        :param payload: dict (json-rpc request)
+        :return: dict (json-rpc response)
+        """
+        with self._lock:
+            self.requests_count += 1
+        response = {'jsonrpc': '2.0', 'id': payload.get('id')}
+        try:
+            response['result'] = self._dispatch(payload.get('method') or '', payload.get('params') or {})
+        except StandInError as e:
+            response['error'] = e.to_dict()
+        except Exception as e:
+            # a bug or bad input must not drop the connection, the client gets a json-rpc error instead
+            response['error'] = StandInError(INTERNAL_ERROR_CODE, f'internal error: {e!r}').to_dict()
+        if self.latency:
+            time.sleep(self.latency)
+        return response
+
+    def _dispatch(self, method: str, params: dict) -> dict:
+        if self.mode == 'record':
+            return self._proxy(method, params)
+        if method == 'login.user':
+            return self._login(params)
+        token = params.get('access_token')
+        self._check_token(token)
+        self._check_rate(token)
+        if self.mode == 'replay':
+            key = _request_key(method, params)
+            if key not in self._replay:
+                raise StandInError(INVALID_PARAMS_ERROR_CODE, 'request was not recorded', {'method': method})
+            return self._replay[key]
+        action, _, endpoint = method.partition('.')
+        if action == 'get':
+            return self._get(endpoint, params)
+        if action in ('create', 'update', 'delete'):
+            return self._mutate(action, endpoint, params)
+        raise StandInError(METHOD_NOT_FOUND_ERROR_CODE, f'method {method} not found')
+
+    def _login(self, params: dict) -> dict:
+        if self.login and (params.get('login') != self.login or params.get('password') != self.password):
+            raise StandInError(ACCESS_TOKEN_ERROR_CODE, 'invalid login or password')
+        token = uuid.uuid4().hex
+        expires_at = time.monotonic() + self.token_ttl if self.token_ttl else None
+        with self._lock:
+            self._tokens[token] = expires_at
+            self.logins_count += 1
+        return {'data': {'access_token': token, 'expire_at': None}}
+
+    def _check_token(self, token: Optional[str]) -> None:
+        with self._lock:
+            if token not in self._tokens:
+                raise StandInError(ACCESS_TOKEN_ERROR_CODE, 'access token is invalid')
+            expires_at = self._tokens[token]
+            if expires_at is not None and expires_at < time.monotonic():
+                del self._tokens[token]
+                raise StandInError(ACCESS_TOKEN_ERROR_CODE, 'access token has expired')
+
+    def _check_rate(self, token: str) -> None:
+        if not self._rate_limit:
+            return
+        with self._lock:
+            bucket = self._buckets.get(token)
+            if bucket is None:
+                bucket = self._buckets[token] = _TokenBucket(self._rate_limit, self._rate_burst)
+        if not bucket.take():
+            raise StandInError(RATE_LIMIT_ERROR_CODE, 'limit exceeded', {'rate_limit': self._rate_limit})
+
+    def _get(self, endpoint: str, params: dict) -> dict:
+        if endpoint not in self._datasets:
+            raise StandInError(METHOD_NOT_FOUND_ERROR_CODE, f'method get.{endpoint} not found')
+        limit = self.max_limit if params.get('limit') is None else params['limit']
+        offset = params.get('offset') or 0
+        if not isinstance(limit, int) or not isinstance(offset, int):
+            raise StandInError(INVALID_PARAMS_ERROR_CODE, 'limit and offset must be integers')
+        if limit > self.max_limit or limit < 0 or offset < 0:
+            raise StandInError(INVALID_PARAMS_ERROR_CODE, f'limit must be in [0, {self.max_limit}]')
+        rows = self._datasets[endpoint]
+        date_field = self._date_fields.get(endpoint)
+        if date_field:
+            if not (params.get('date_from') and params.get('date_till')):
+                raise StandInError(INVALID_PARAMS_ERROR_CODE, 'date_from and date_till are required')
+            start = _bisect(rows, date_field, params['date_from'])
+            stop = _bisect(rows, date_field, params['date_till'], right=True)
+        else:
+            start, stop = 0, len(rows)
+        chat_id = params.get('chat_id', params.get('chat'))
+        filter, sort = params.get('filter'), params.get('sort')
+        if filter or sort or chat_id is not None:
+            window = (rows[i] for i in range(start, stop))
+            if chat_id is not None:
+                window = (r for r in window if r.get('chat_id') == chat_id)
+            selected = sort_rows((r for r in window if match_filter(r, filter)), sort)
+            total = len(selected)
+            page = selected[offset:offset + limit]
+        else:
+            total = stop - start
+            page = [rows[i] for i in range(start + offset, min(stop, start + offset + limit))]
+        fields = params.get('fields')
+        if fields:
+            page = [{field: row.get(field) for field in fields} for row in page]
+        return {'data': page, 'metadata': {'total_items': total, 'limits': self._limits_metadata()}}
+
+    def _mutate(self, action: str, endpoint: str, params: dict) -> dict:
+        values = {key: value for key, value in params.items() if key not in ('access_token', 'user_id')}
+        with self._lock:
+            rows = self._datasets.setdefault(endpoint, [])
+            if action == 'create':
+                next_id = self._next_ids.get(endpoint) or max((r.get('id') or 0 for r in rows), default=0) + 1
+                self._next_ids[endpoint] = next_id + 1
+                values['id'] = next_id
+                rows.append(values)
+                return {'data': {'id': next_id}}
+            for index, row in enumerate(rows):
+                if row.get('id') == values.get('id'):
+                    if action == 'delete':
+                        del rows[index]
+                    else:
+                        row.update(values)
+                    return {'data': {'id': values['id']}}
+        raise StandInError(INVALID_PARAMS_ERROR_CODE, f'{endpoint} with id {values.get("id")} not found')
+
+    def _limits_metadata(self) -> dict:
+        return {'minute_limit': None, 'minute_remaining': None, 'current_reqs_count': self.requests_count}
+
+    def _proxy(self, method: str, params: dict) -> dict:
+        payload = {'jsonrpc': '2.0', 'id': uuid.uuid4().hex, 'method': method, 'params': params}
+        request = Request(self.upstream_url, data=json.dumps(payload).encode('utf-8'),
+                          headers={'Content-Type': 'application/json'})
+        try:
+            with urlopen(request) as resp:
+                response = json.loads(resp.read().decode('utf-8'))
+        except (OSError, ValueError) as e:
+            # URLError and HTTPError are OSErrors, ValueError is a body that is not json
+            raise StandInError(INTERNAL_ERROR_CODE, f'upstream request failed: {e}', {'method': method})
+        if 'error' in response:
+            error = response['error']
+            raise StandInError(error.get('code'), error.get('message'), error.get('data'))
+        if method != 'login.user':
+            record = {'method': method, 'params': {k: v for k, v in params.items() if k != 'access_token'},
+                      'result': response['result']}
+            with self._record_lock, open(self.fixtures_path, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(record, ensure_ascii=False) + '\n')
+        return response['result']
+
+    def _load_replay(self, path: str) -> None:
+        with open(path, encoding='utf-8') as f:
+            for line in f:
+                if line.strip():
+                    record = json.loads(line)
+                    self._replay[_request_key(record['method'], record['params'])] = record['result']
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_POST(self) -> None:
+        body = self.rfile.read(int(self.headers.get('Content-Length') or 0))
+        try:
+            payload = json.loads(body.decode('utf-8'))
+        except ValueError:
+            response = {'jsonrpc': '2.0', 'id': None,
+                        'error': {'code': PARSE_ERROR_CODE, 'message': 'parse error', 'data': None}}
+        else:
+            response = self.server.stand_in.handle(payload)
+        data = json.dumps(response, ensure_ascii=False).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _send_file(self, with_body: bool) -> None:
+        content = self.server.stand_in.get_file(self.path)
+        if content is None:
+            self.send_error(404)
+            return
+        start, end, status = 0, len(content) - 1, 200
+        match = re.fullmatch(r'bytes=(\d+)-(\d*)', self.headers.get('Range') or '')
+        if match:
+            start = int(match.group(1))
+            end = min(int(match.group(2)), end) if match.group(2) else end
+            if start > end:
+                self.send_response(416)
+                self.send_header('Content-Range', f'bytes */{len(content)}')
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+                return
+            status = 206
+        self.send_response(status)
+        self.send_header('Content-Type', 'audio/mpeg')
+        self.send_header('Accept-Ranges', 'bytes')
+        self.send_header('Content-Length', str(end - start + 1))
+        if status == 206:
+            self.send_header('Content-Range', f'bytes {start}-{end}/{len(content)}')
+        self.end_headers()
+        if with_body:
+            self.wfile.write(content[start:end + 1])
+
+    def do_GET(self) -> None:
+        self._send_file(with_body=True)
+
+    def do_HEAD(self) -> None:
+        self._send_file(with_body=False)
+
+    def log_message(self, format: str, *args) -> None:
+        pass
+
+
+def main(argv: Optional[list] = None) -> None:
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Local stand-in for the Comagic Data API')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--mode', choices=('serve', 'record', 'replay'), default='serve')
+    parser.add_argument('--fixtures', help='datasets json for serve, recordings jsonl for record/replay')
+    parser.add_argument('--upstream', default='https://dataapi.comagic.ru/v2.0', help='real api url for record mode')
+    parser.add_argument('--login', default='')
+    parser.add_argument('--password', default='')
+    parser.add_argument('--latency', type=float, default=0.0)
+    parser.add_argument('--rate-limit', type=float)
+    parser.add_argument('--token-ttl', type=float)
+    parser.add_argument('--max-limit', type=int, default=DEFAULT_MAX_LIMIT)
+    args = parser.parse_args(argv)
+
+    server = StandInServer(host=args.host, port=args.port, login=args.login, password=args.password,
+                           latency=args.latency, rate_limit=args.rate_limit, token_ttl=args.token_ttl,
+                           max_limit=args.max_limit, mode=args.mode,
+                           fixtures_path=args.fixtures if args.mode != 'serve' else None,
+                           upstream_url=args.upstream if args.mode == 'record' else None)
+    if args.mode == 'serve' and args.fixtures:
+        server.load_fixtures(args.fixtures)
+    print(f'comagic stand-in listening on {server.url} ({args.mode})')
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,68 @@
+"""
+In-flight call coalescing.
+
+``SingleFlight.do(key, fn)`` runs ``fn`` once per key at a time: callers arriving while a call with the same key
+is running wait for it and get its result (or exception) instead of starting their own. ``Comagic`` uses it for
+``get.*`` requests, keyed by method and params.
+"""
+import json
+import threading
+from typing import Callable
+
+
+class _Call(object):
+    def __init__(self) -> None:
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.waiters = 0
+
+
+class SingleFlight(object):
+    def __init__(self) -> None:
+        self.stats = {'calls': 0, 'shared': 0}
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def do(self, key: any, fn: Callable, *args, **kwargs) -> any:
+        """
+        :param key: hashable (calls with equal keys are coalesced)
+        :param fn: callable (run by the first caller only)
+        :return: any (result of fn, shared by every caller that arrived while it ran)
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+                self.stats['calls'] += 1
+            else:
+                call.waiters += 1
+                self.stats['shared'] += 1
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+        try:
+            call.result = fn(*args, **kwargs)
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result
+
+    def in_flight(self) -> int:
+        with self._lock:
+            return len(self._calls)
+
+
+def request_key(params: dict) -> str:
+    """
+    :param params: dict (json-rpc request)
+    :return: str (method and params, without the request id)
+    """
+    return json.dumps([params.get('method'), params.get('params')], sort_keys=True, default=str)
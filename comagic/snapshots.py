@@ -0,0 +1,124 @@
+"""
+Change detection for reference entities.
+
+``SnapshotDiffer`` keeps a digest of every field of every entity by ``id`` and turns a full poll into the events
+that changed since the previous one::
+
+    differ = SnapshotDiffer('snapshots.json')
+    for event in differ.poll(client, ('employees', 'sites')):
+        if event.kind == 'deleted':
+            cmdb.delete(event.entity, event.id)
+        else:
+            cmdb.upsert(event.entity, event.id, {field: event.row.get(field) for field in event.fields})
+    differ.save()
+
+Only digests are kept, a deleted event therefore carries no row. ``to_dict()`` drops empty values, a field that
+became empty is reported as changed and is missing from ``row``.
+"""
+import hashlib
+import json
+import os
+import threading
+from collections import namedtuple
+from typing import Iterable, Iterator, Optional
+
+from .pagination import MAX_LIMIT
+
+REFERENCE_ENTITIES = ('employees', 'virtual_numbers', 'sip_lines', 'campaigns', 'sites')
+EVENT_KINDS = ('created', 'updated', 'deleted')
+
+# kind: created, updated or deleted, fields: changed field names, row: current to_dict() (None when deleted)
+SnapshotEvent = namedtuple('SnapshotEvent', ['kind', 'entity', 'id', 'fields', 'row'])
+
+
+def _digest(value: any) -> str:
+    data = json.dumps(value, sort_keys=True, ensure_ascii=False, default=str).encode('utf-8')
+    return hashlib.blake2b(data, digest_size=8).hexdigest()
+
+
+def _state(row: any) -> dict:
+    return row if isinstance(row, dict) else row.to_dict()
+
+
+class SnapshotDiffer(object):
+    def __init__(self, path: Optional[str] = None, key: str = 'id') -> None:
+        """
+        :param path: str (json file with the previous snapshots, loaded if it exists, written by save())
+        :param key: str (field identifying an entity)
+        """
+        self.path = path
+        self.key = key
+        self._snapshots = {}
+        self._lock = threading.Lock()
+        if path and os.path.exists(path):
+            with open(path, encoding='utf-8') as f:
+                self._snapshots = json.load(f)
+
+    @staticmethod
+    def _name(entity: str, user_id: Optional[int]) -> str:
+        return entity if user_id is None else f'{entity}:{user_id}'
+
+    def diff(self, entity: str, rows: Iterable, user_id: Optional[int] = None) -> Iterator[SnapshotEvent]:
+        """
+        Compare a complete poll of one entity with its previous snapshot. The snapshot is replaced once the rows
+        are exhausted, an interrupted diff leaves it unchanged.
+
+        :param entity: str (e.g. employees)
+        :param rows: iterable of models or dicts (every entity, not a page)
+        :param user_id: int (snapshots are kept per user)
+        :return: iterator of SnapshotEvent, deletions last
+        """
+        name = self._name(entity, user_id)
+        with self._lock:
+            previous = self._snapshots.get(name, {})
+        current = {}
+        for row in rows:
+            state = _state(row)
+            id = state.get(self.key)
+            digests = {field: _digest(value) for field, value in state.items()}
+            current[str(id)] = digests
+            old = previous.get(str(id))
+            if old is None:
+                yield SnapshotEvent('created', entity, id, tuple(state), state)
+                continue
+            changed = tuple(field for field in dict.fromkeys(list(digests) + list(old))
+                            if digests.get(field) != old.get(field))
+            if changed:
+                yield SnapshotEvent('updated', entity, id, changed, state)
+        for id, old in previous.items():
+            if id not in current:
+                yield SnapshotEvent('deleted', entity, _original_id(id), tuple(old), None)
+        with self._lock:
+            self._snapshots[name] = current
+
+    def poll(self, client: any, entities: Iterable[str] = REFERENCE_ENTITIES, user_id: Optional[int] = None,
+             page_size: int = MAX_LIMIT) -> Iterator[SnapshotEvent]:
+        """
+        :param client: Comagic
+        :param entities: iterable of str (list endpoints)
+        :return: iterator of SnapshotEvent for every entity in turn
+        """
+        for entity in entities:
+            rows = client.query(entity).for_user(user_id).iter(page_size=page_size)
+            yield from self.diff(entity, rows, user_id)
+
+    def forget(self, entity: str, user_id: Optional[int] = None) -> None:
+        """Drop a snapshot, the next diff reports every entity as created."""
+        with self._lock:
+            self._snapshots.pop(self._name(entity, user_id), None)
+
+    def save(self, path: Optional[str] = None) -> None:
+        path = path or self.path
+        if not path:
+            return
+        with self._lock:
+            data = json.dumps(self._snapshots, sort_keys=True)
+        tmp_path = f'{path}.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+
+def _original_id(id: str) -> any:
+    # snapshot keys are json object keys, ids are integers almost everywhere
+    return int(id) if id.lstrip('-').isdigit() else id
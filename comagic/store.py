@@ -0,0 +1,316 @@
+"""
+Local SQLite store for report and list rows.
+
+Every endpoint gets a table with the model ``fields()`` as columns plus ``user_id``; ``id``, the date column,
+``campaign_id``, ``site_id`` and ``user_id`` are indexed and rows are upserted on ``(user_id, id)``, or on
+``NATURAL_KEYS`` for models without an id. The store has the same ``get_*`` methods as ``Comagic``, so the query
+builder works on it unchanged::
+
+    store = ReportStore('reports.sqlite')
+    store.save_query(client.query('calls_report').between(date_from, date_till))
+    long_calls = store.query('calls_report').between(date_from, date_till).where(F('talk_duration') > 300).fetch()
+
+Lists and dicts are stored as json, datetimes as api formatted text, so filters compare the same way as on the
+api.
+"""
+import inspect
+import json
+import sqlite3
+import threading
+from datetime import date, datetime
+from typing import Iterable, Optional, Union
+
+from .endpoints import ENDPOINTS, Endpoint, get_endpoint
+from .errors import ComagicParamsError
+from .pagination import MAX_LIMIT
+from .query import OPERATORS, ReportQuery
+from .utils import DATETIME_FORMAT, to_api_value
+
+INDEXED_FIELDS = ('campaign_id', 'site_id', 'user_id', 'chat_id')
+# upsert keeping columns a projected row doesn't carry needs sqlite 3.24
+HAS_UPSERT = sqlite3.sqlite_version_info >= (3, 24, 0)
+
+KINDS_TABLE = 'comagic_column_kinds'
+
+# upsert key of the models without an id, user_id is always part of the key
+NATURAL_KEYS = {
+    'available_virtual_numbers': ('phone_number',),
+    'chat_messages_report': ('chat_id', 'date_time', 'source'),
+    'financial_call_legs_report': ('call_session_id', 'leg_id'),
+    'campaign_daily_stat': ('date', 'site_id', 'campain_id', 'banner_group_id', 'keyword_id', 'banner_id'),
+}
+
+
+def _quote(name: str) -> str:
+    return '"' + name.replace('"', '""') + '"'
+
+
+def _row_key(endpoint: Endpoint) -> tuple:
+    fields = endpoint.model.fields()
+    return ('id',) if 'id' in fields else NATURAL_KEYS.get(endpoint.name, ())
+
+
+def _key_expression(key: tuple) -> str:
+    # sqlite unique indexes treat nulls as distinct, a row saved without user_id must still hit its key
+    return ', '.join(f"ifnull({_quote(c)}, '')" for c in ('user_id',) + key)
+
+
+def _encode(value: any) -> tuple:
+    """
+    :return: tuple (sqlite value, kind) where kind tells how to decode it
+    """
+    if isinstance(value, datetime):
+        return value.strftime(DATETIME_FORMAT), 'datetime'
+    if isinstance(value, date):
+        return value.strftime('%Y-%m-%d'), 'date'
+    if isinstance(value, (list, dict)):
+        return json.dumps(value, ensure_ascii=False), 'json'
+    if isinstance(value, bool):
+        return int(value), 'bool'
+    return value, None
+
+
+def _decode(value: any, kind: Optional[str]) -> any:
+    if value is None or kind is None:
+        return value
+    if kind == 'datetime':
+        return datetime.strptime(value, DATETIME_FORMAT)
+    if kind == 'date':
+        return datetime.strptime(value, '%Y-%m-%d').date()
+    if kind == 'json':
+        return json.loads(value)
+    if kind == 'bool':
+        return bool(value)
+    return value
+
+
+class ReportStore(object):
+    def __init__(self, path: str = ':memory:') -> None:
+        """
+        :param path: str (sqlite database file)
+        """
+        self.path = path
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.RLock()
+        self._tables = {}
+        self._kinds = {}
+        with self._lock, self._connection:
+            self._connection.execute(f'CREATE TABLE IF NOT EXISTS {KINDS_TABLE} '
+                                     '("table" TEXT, "column" TEXT, kind TEXT, PRIMARY KEY ("table", "column"))')
+            for table, column, kind in self._connection.execute(f'SELECT * FROM {KINDS_TABLE}'):
+                self._kinds.setdefault(table, {})[column] = kind
+
+    def _endpoint(self, endpoint: Union[str, Endpoint]) -> Endpoint:
+        endpoint = endpoint if isinstance(endpoint, Endpoint) else get_endpoint(endpoint)
+        if endpoint.result != 'rows':
+            raise ComagicParamsError(f'{endpoint.name} does not return report rows')
+        return endpoint
+
+    def _columns(self, endpoint: Endpoint) -> list:
+        columns = self._tables.get(endpoint.name)
+        if columns is not None:
+            return columns
+        columns = list(dict.fromkeys(['user_id'] + endpoint.model.fields()))
+        key = _row_key(endpoint)
+        table = _quote(endpoint.name)
+        with self._lock, self._connection:
+            self._drop_id_primary_key(endpoint.name, columns)
+            self._connection.execute(f'CREATE TABLE IF NOT EXISTS {table} ({", ".join(map(_quote, columns))})')
+            if key:
+                self._connection.execute(f'CREATE UNIQUE INDEX IF NOT EXISTS {_quote(f"{endpoint.name}_key")} '
+                                         f'ON {table} ({_key_expression(key)})')
+            for field in (endpoint.date_field,) + INDEXED_FIELDS:
+                if field and field in columns:
+                    self._connection.execute(f'CREATE INDEX IF NOT EXISTS {_quote(f"{endpoint.name}_{field}")} '
+                                             f'ON {table} ({_quote(field)})')
+        self._tables[endpoint.name] = columns
+        return columns
+
+    def _drop_id_primary_key(self, name: str, columns: list) -> None:
+        # stores written before rows were keyed on (user_id, id) have id as the primary key, copy them over
+        info = self._connection.execute(f'PRAGMA table_info({_quote(name)})').fetchall()
+        if not any(column[1] == 'id' and column[5] for column in info):
+            return
+        existing = [column[1] for column in info if column[1] in columns]
+        legacy = _quote(f'{name}_legacy')
+        self._connection.execute(f'ALTER TABLE {_quote(name)} RENAME TO {legacy}')
+        self._connection.execute(f'CREATE TABLE {_quote(name)} ({", ".join(map(_quote, columns))})')
+        self._connection.execute(f'INSERT INTO {_quote(name)} ({", ".join(map(_quote, existing))}) '
+                                 f'SELECT {", ".join(map(_quote, existing))} FROM {legacy}')
+        self._connection.execute(f'DROP TABLE {legacy}')
+
+    def save(self, endpoint: Union[str, Endpoint], rows: Iterable, user_id: Optional[int] = None,
+             fields: Optional[list] = None) -> int:
+        """
+        Upsert rows (models or dicts), fields a row doesn't carry keep their stored value.
+
+        :param fields: list (fields the rows were requested with, only these are written; by default the keys of a
+            dict row and the attributes of a model row)
+        :return: int (rows written)
+        """
+        endpoint = self._endpoint(endpoint)
+        columns = self._columns(endpoint)
+        written = set(columns) if fields is None else set(fields) | {'user_id'}
+        written.intersection_update(columns)
+        kinds = self._kinds.setdefault(endpoint.name, {})
+        new_kinds = {}
+        batches = {}
+        for row in rows:
+            values = dict(row if isinstance(row, dict) else vars(row))
+            if user_id is not None:
+                values['user_id'] = user_id
+            names, encoded = [], []
+            for name, value in values.items():
+                if name not in written:
+                    continue
+                value, kind = _encode(value)
+                if kind and kinds.get(name) != kind:
+                    kinds[name] = new_kinds[name] = kind
+                names.append(name)
+                encoded.append(value)
+            batches.setdefault(tuple(names), []).append(encoded)
+        count = 0
+        with self._lock, self._connection:
+            for names, values in batches.items():
+                self._connection.executemany(self._insert_sql(endpoint, names), values)
+                count += len(values)
+            self._connection.executemany(f'INSERT OR REPLACE INTO {KINDS_TABLE} VALUES (?, ?, ?)',
+                                         [(endpoint.name, column, kind) for column, kind in new_kinds.items()])
+        return count
+
+    def _insert_sql(self, endpoint: Endpoint, names: tuple) -> str:
+        table = _quote(endpoint.name)
+        column_list = ', '.join(map(_quote, names))
+        placeholders = ', '.join('?' * len(names))
+        key = _row_key(endpoint)
+        if not key or not set(key).issubset(names):
+            return f'INSERT INTO {table} ({column_list}) VALUES ({placeholders})'
+        if not HAS_UPSERT:
+            return f'INSERT OR REPLACE INTO {table} ({column_list}) VALUES ({placeholders})'
+        updates = ', '.join(f'{_quote(n)} = excluded.{_quote(n)}' for n in names if n not in key and n != 'user_id')
+        action = f'DO UPDATE SET {updates}' if updates else 'DO NOTHING'
+        return (f'INSERT INTO {table} ({column_list}) VALUES ({placeholders}) '
+                f'ON CONFLICT({_key_expression(key)}) {action}')
+
+    def save_query(self, query: ReportQuery, page_size: int = MAX_LIMIT) -> int:
+        """
+        Download every page of a live query into the store.
+
+        :return: int (rows written)
+        """
+        fields = list(query._fields) if query._fields else None
+        return sum(self.save(query.endpoint, page, user_id=query._user_id, fields=fields)
+                   for page in query.pages(page_size))
+
+    def _where(self, filter: Optional[dict], columns: set, args: list) -> str:
+        if 'filters' in filter:
+            joiner = ' OR ' if filter.get('condition', 'and') == 'or' else ' AND '
+            parts = [self._where(f, columns, args) for f in filter['filters']]
+            return '(' + joiner.join(parts) + ')' if parts else '1'
+        field, operator = filter['field'], filter.get('operator', '=')
+        value = to_api_value(filter.get('value'))
+        if field not in columns:
+            raise ComagicParamsError(f'unknown filter field {field}')
+        if operator not in OPERATORS:
+            raise ComagicParamsError(f'invalid operator {operator}, operator must be in {list(OPERATORS)}')
+        column = _quote(field)
+        if operator in ('in', 'not_in'):
+            values = [_encode(v)[0] for v in value]
+            args.extend(values)
+            placeholders = ', '.join('?' * len(values))
+            if operator == 'in':
+                return f'{column} IN ({placeholders})' if values else '0'
+            return f'({column} IS NULL OR {column} NOT IN ({placeholders}))' if values else '1'
+        if operator in ('like', 'ilike'):
+            # same wildcard semantics as the stand-in server: % matches anything
+            pattern = str(value).replace('%', '*')
+            if operator == 'ilike':
+                args.append(pattern.lower())
+                return f'lower({column}) GLOB ?'
+            args.append(pattern)
+            return f'{column} GLOB ?'
+        args.append(_encode(value)[0])
+        sql_operator = {'=': 'IS', '!=': 'IS NOT'}.get(operator, operator)
+        return f'{column} {sql_operator} ?'
+
+    def select(self, endpoint: Union[str, Endpoint], date_from: Optional[datetime] = None,
+               date_till: Optional[datetime] = None, limit: Optional[int] = None, offset: Optional[int] = None,
+               filter: Optional[dict] = None, fields: Optional[list] = None, sort: Optional[list] = None,
+               user_id: Optional[int] = None, **kwargs) -> list:
+        """
+        Same arguments as the client get_* methods.
+
+        :return: list of models
+        """
+        endpoint = self._endpoint(endpoint)
+        columns = self._columns(endpoint)
+        known = set(columns)
+        conditions, args = [], []
+        if endpoint.date_field and date_from is not None and date_till is not None:
+            conditions.append(f'{_quote(endpoint.date_field)} BETWEEN ? AND ?')
+            args.extend([to_api_value(date_from), to_api_value(date_till)])
+        if user_id is not None:
+            conditions.append('user_id = ?')
+            args.append(user_id)
+        if 'chat_id' in kwargs:
+            conditions.append('chat_id = ?')
+            args.append(kwargs.pop('chat_id'))
+        if filter:
+            conditions.append(self._where(filter, known, args))
+        selected = [f for f in dict.fromkeys(fields) if f in known] if fields else \
+            [c for c in columns if c != 'user_id']
+        sql = f'SELECT {", ".join(map(_quote, selected))} FROM {_quote(endpoint.name)}'
+        if conditions:
+            sql += ' WHERE ' + ' AND '.join(conditions)
+        order = []
+        for item in sort or ():
+            if item['field'] not in known:
+                raise ComagicParamsError(f'unknown sort field {item["field"]}')
+            order.append(f'{_quote(item["field"])} {"DESC" if item.get("order") == "desc" else "ASC"}')
+        sql += ' ORDER BY ' + ', '.join(order + ['rowid'])
+        if limit is not None or offset:
+            sql += ' LIMIT ? OFFSET ?'
+            args.extend([limit if limit is not None else -1, offset or 0])
+        kinds = self._kinds.get(endpoint.name, {})
+        model = endpoint.model
+        with self._lock:
+            rows = self._connection.execute(sql, args).fetchall()
+        return [model(**{f: _decode(v, kinds.get(f)) for f, v in zip(selected, row)}) for row in rows]
+
+    def count(self, endpoint: Union[str, Endpoint]) -> int:
+        endpoint = self._endpoint(endpoint)
+        self._columns(endpoint)
+        with self._lock:
+            return self._connection.execute(f'SELECT count(*) FROM {_quote(endpoint.name)}').fetchone()[0]
+
+    def query(self, endpoint: str) -> ReportQuery:
+        """
+        :return: ReportQuery (answered from the store)
+        """
+        return ReportQuery(self, endpoint)
+
+    def __getattr__(self, name: str) -> any:
+        # get_calls_report(...) and the other client read methods, same signatures
+        for endpoint in ENDPOINTS.values():
+            if endpoint.method == name and endpoint.result == 'rows':
+                from .client import Comagic
+
+                signature = inspect.signature(getattr(Comagic, name))
+
+                def method(*args, **kwargs) -> list:
+                    params = signature.bind(None, *args, **kwargs).arguments
+                    params.pop('self')
+                    return self.select(endpoint, **params)
+
+                return method
+        raise AttributeError(name)
+
+    def close(self) -> None:
+        with self._lock:
+            self._connection.close()
+
+    def __enter__(self) -> 'ReportStore':
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
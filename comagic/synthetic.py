@@ -0,0 +1,247 @@
+"""
+Seeded synthetic report rows for load tests and benchmarks.
+
+Rows are shaped by the model ``fields()`` lists and are computed from ``(seed, index)`` alone, so a
+``SyntheticReport`` of millions of rows is an indexable sequence that holds nothing in memory. It can be
+streamed directly or registered on a stand-in server::
+
+    calls = SyntheticReport(Call, 1000000, datetime(2020, 1, 1), datetime(2020, 2, 1), seed=42)
+    server.add_rows('calls_report', calls, presorted=True)
+
+Ids and times grow with the index. With the same ``count``/``base_id`` row ``i`` of different reports refers to the
+same communication: ``Communication.id``, ``Call.id`` and ``Call.communication_id`` are equal,
+``Call.visitor_session_id`` is ``VisitorSession.id`` and ``CallLegs.call_session_id`` points at ``Call.id``
+(``legs_per_call`` legs each, the first one starting at the call's ``start_time``).
+"""
+import random
+from collections.abc import Sequence
+from datetime import datetime, timedelta
+from typing import Callable, Iterator, Optional
+
+from .utils import DATETIME_FORMAT
+
+DATE_FIELDS = ('start_time', 'date_time', 'date')
+
+# distinct values per column; picks are skewed so low ranks dominate like real traffic does
+DEFAULT_CARDINALITIES = {
+    'site_id': 20,
+    'campaign_id': 300,
+    'scenario_id': 60,
+    'employee_id': 250,
+    'group_id': 30,
+    'tag_id': 80,
+    'contact_id': 50000,
+    'utm_source': 30,
+    'utm_medium': 12,
+    'utm_campaign': 600,
+    'utm_term': 20000,
+    'utm_content': 3000,
+    'utm_referrer': 400,
+    'search_engine': 6,
+    'referrer_domain': 800,
+    'channel': 7,
+    'visitor_city': 400,
+    'visitor_region': 85,
+    'visitor_country': 12,
+    'visitor_device': 3,
+    'visitor_browser_name': 10,
+    'visitor_os_name': 8,
+    'cpn_region_id': 85,
+    'virtual_phone_number': 150,
+    'finish_reason': 9,
+}
+
+_CHANNELS = ['organic', 'ppc', 'referral', 'direct', 'social', 'email', 'messenger']
+_DEVICES = ['desktop', 'mobile', 'tablet']
+_ENGINES = ['yandex', 'google', 'mail.ru', 'bing', 'rambler', 'duckduckgo']
+_FINISH_REASONS = ['subscriber_disconnects', 'operator_disconnects', 'no_operators', 'timeout', 'busy', 'no_answer',
+                   'scenario_end', 'transfer', 'failed']
+_DEFAULT_LEGS_PER_CALL = 2
+
+
+def _skewed(rng: random.Random, n: int) -> int:
+    return int(n * rng.random() ** 2)
+
+
+def _phone(rng: random.Random) -> str:
+    return f'79{rng.randrange(10 ** 9):09d}'
+
+
+def date_field_for(model: type) -> Optional[str]:
+    fields = model.fields()
+    for field in DATE_FIELDS:
+        if field in fields:
+            return field
+    return None
+
+
+class SyntheticReport(Sequence):
+    def __init__(self, model: type, count: int, date_from: datetime, date_till: datetime, seed: int = 0,
+                 base_id: int = 100000000, cardinalities: Optional[dict] = None,
+                 legs_per_call: int = _DEFAULT_LEGS_PER_CALL, fields: Optional[list] = None) -> None:
+        """
+        :param model: BaseModel subclass (row shape comes from model.fields())
+        :param count: int (rows in the report)
+        :param date_from: datetime (time of the first row)
+        :param date_till: datetime (rows are spread evenly up to this time, call legs take the time of their call)
+        :param seed: int
+        :param base_id: int (id of the first row)
+        :param cardinalities: dict (overrides for DEFAULT_CARDINALITIES)
+        :param legs_per_call: int (CallLegs rows per call session)
+        :param fields: list (generate only these fields, defaults to model.fields())
+        """
+        self.model = model
+        self.count = count
+        self.date_from = date_from
+        self.seed = seed
+        self.base_id = base_id
+        self.legs_per_call = legs_per_call
+        # rows of a model with call_session_id are legs of the calls at index // legs_per_call
+        self._legs = max(legs_per_call, 1) if 'call_session_id' in model.fields() else None
+        self.fields = list(dict.fromkeys(fields or model.fields()))
+        self.date_field = date_field_for(model)
+        self.cardinalities = dict(DEFAULT_CARDINALITIES, **(cardinalities or {}))
+        self._span = max((date_till - date_from).total_seconds(), 0)
+        self._generators = [(field, self._generator(field)) for field in self.fields]
+
+    def __len__(self) -> int:
+        return self.count
+
+    def __getitem__(self, index: int) -> dict:
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(self.count))]
+        if index < 0:
+            index += self.count
+        if not 0 <= index < self.count:
+            raise IndexError('synthetic report index out of range')
+        return self.row(index)
+
+    def __iter__(self) -> Iterator[dict]:
+        for index in range(self.count):
+            yield self.row(index)
+
+    def time_of(self, index: int) -> datetime:
+        if not self.count:
+            return self.date_from
+        position = index
+        if self._legs:
+            # leg 0 starts with its call, the others spread over the gap to the next call
+            call, leg = divmod(index, self._legs)
+            position = call + leg / self._legs
+        return self.date_from + timedelta(seconds=int(position * self._span / self.count))
+
+    def row(self, index: int) -> dict:
+        rng = random.Random(self.seed * 1000003 + index)
+        moment = self.time_of(index)
+        row = {}
+        ctx = (rng, index, self.base_id + index, moment, row)
+        for field, generate in self._generators:
+            row[field] = generate(ctx)
+        return row
+
+    def _pick(self, rng: random.Random, column: str) -> int:
+        return _skewed(rng, self.cardinalities.get(column, 100))
+
+    def _generator(self, field: str) -> Callable[[tuple], any]:
+        """
+        Resolve the value generator for a column once, rows then only run the returned callables.
+        A generator takes ``(rng, index, id, moment, row)``, ``row`` holding the columns generated so far.
+        """
+        pick = self._pick
+        if field == 'id':
+            return lambda ctx: ctx[2]
+        if field == self.date_field:
+            return lambda ctx: ctx[3].strftime(DATETIME_FORMAT)
+        if field == 'call_session_id':
+            return lambda ctx: self.base_id + ctx[1] // self._legs
+        if field in ('communication_id', 'visitor_session_id'):
+            return lambda ctx: ctx[2]
+        if field in ('finish_time', 'connect_time', 'process_time'):
+            return lambda ctx: (ctx[3] + timedelta(seconds=ctx[0].randint(5, 900))).strftime(DATETIME_FORMAT)
+        if field in ('activation_date', 'creation_time', 'creation_date', 'status_change_date_time'):
+            return lambda ctx: (ctx[3] - timedelta(days=ctx[0].randint(1, 1000))).strftime(DATETIME_FORMAT)
+        if field in ('sale_date', 'hit_time'):
+            return lambda ctx: None if ctx[0].random() < 0.9 else \
+                (ctx[3] + timedelta(hours=ctx[0].randint(1, 72))).strftime(DATETIME_FORMAT)
+        if field == 'sale_cost':
+            return lambda ctx: round(ctx[0].uniform(500, 50000), 2) if ctx[4].get('sale_date') else None
+        for name_field, id_field, template in (('site_domain_name', 'site_id', 'site{}.ru'),
+                                               ('campaign_name', 'campaign_id', 'campaign {}'),
+                                               ('scenario_name', 'scenario_id', 'scenario {}'),
+                                               ('group_name', 'group_id', 'group {}')):
+            if field == name_field:
+                return lambda ctx, i=id_field, t=template: t.format(ctx[4].get(i) or pick(ctx[0], i) + 1)
+        if field.endswith('employee_full_name'):
+            return lambda ctx: f'employee {pick(ctx[0], "employee_id") + 1}'
+        if field in ('site_id', 'campaign_id', 'scenario_id', 'group_id', 'cpn_region_id', 'contact_id'):
+            return lambda ctx: pick(ctx[0], field) + 1
+        if field.endswith('employee_id'):
+            return lambda ctx: pick(ctx[0], 'employee_id') + 1
+        if field == 'visitor_first_campaign_id':
+            return lambda ctx: pick(ctx[0], 'campaign_id') + 1
+        if field in ('visitor_id', 'person_id'):
+            return lambda ctx: ctx[0].randint(1, 10 ** 9)
+        if field.endswith('client_id') or field in ('gclid', 'yclid', 'ymclid', 'ef_id'):
+            return lambda ctx: f'{ctx[0].getrandbits(64):016x}' if ctx[0].random() < 0.5 else None
+        if field.startswith('utm_') or field.startswith('eq_utm_'):
+            column = field[3:] if field.startswith('eq_') else field
+            prefix = column[4:]
+            return lambda ctx: f'{prefix}_{pick(ctx[0], column)}' if ctx[0].random() < 0.7 else None
+        for choice_fields, values in ((('channel',), _CHANNELS), (('visitor_device',), _DEVICES),
+                                      (('search_engine', 'engine'), _ENGINES), (('finish_reason',), _FINISH_REASONS)):
+            if field in choice_fields:
+                return lambda ctx, v=values: v[_skewed(ctx[0], len(v))]
+        if field == 'direction':
+            return lambda ctx: 'in' if ctx[0].random() < 0.8 else 'out'
+        if field == 'referrer_domain':
+            return lambda ctx: f'ref{pick(ctx[0], field)}.ru'
+        if field == 'virtual_phone_number':
+            return lambda ctx: f'7495{pick(ctx[0], field):07d}'
+        if field in self.cardinalities:
+            return lambda ctx: f'{field}_{pick(ctx[0], field)}'
+        if field.endswith('phone_number') or field == 'communication_number':
+            return lambda ctx: _phone(ctx[0])
+        if field == 'phone_numbers':
+            return lambda ctx: [_phone(ctx[0]) for _ in range(ctx[0].randint(1, 2))]
+        if field == 'call_records':
+            return lambda ctx: [f'{ctx[0].getrandbits(128):032x}' for _ in range(ctx[0].randint(0, 2))]
+        if field == 'employees':
+            return lambda ctx: [
+                {'employee_id': pick(ctx[0], 'employee_id') + 1, 'employee_full_name': f'employee {i}',
+                 'is_answered': i == 0}
+                for i in range(ctx[0].randint(1, 3))
+            ]
+        if field == 'tags':
+            return lambda ctx: [
+                {'tag_id': tag_id + 1, 'tag_name': f'tag {tag_id}', 'tag_type': 'manual',
+                 'tag_change_time': ctx[3].strftime(DATETIME_FORMAT), 'tag_user_login': 'manager'}
+                for tag_id in sorted({pick(ctx[0], 'tag_id') for _ in range(ctx[0].randint(0, 3))})
+            ]
+        if field in ('segments', 'scenario_operations', 'attributes', 'site_blocks', 'campaigns', 'scenarios',
+                     'sites', 'members', 'communications', 'hits', 'old_banner_ids', 'session_ids'):
+            return lambda ctx: [] if ctx[0].random() < 0.5 else [ctx[0].randint(1, 1000)]
+        if field == 'visitor_custom_properties':
+            return lambda ctx: [] if ctx[0].random() < 0.8 else \
+                [{'property_name': 'crm_id', 'property_value': str(ctx[0].randint(1, 9999))}]
+        if field.startswith('is_') or field.endswith('_enabled') or field == 'visit_other_campaign':
+            return lambda ctx: ctx[0].random() < 0.2
+        if field.endswith(('duration', '_count', 'rating', 'raiting')):
+            return lambda ctx: ctx[0].randint(0, 600)
+        if field.endswith(('_url', '_page')) or field == 'referrer':
+            return lambda ctx: f"https://site{ctx[4].get('site_id', 1)}.ru/page/{pick(ctx[0], 'utm_content')}"
+        if field.endswith('_id'):
+            return lambda ctx: ctx[0].randint(1, 10 ** 6)
+        return lambda ctx: f'{field}_{ctx[0].randint(0, 999)}'
+
+
+def iter_rows(model: type, count: int, date_from: datetime, date_till: datetime, seed: int = 0,
+              **kwargs) -> Iterator[dict]:
+    """
+    :param model: BaseModel subclass
+    :param count: int
+    :param date_from: datetime
+    :param date_till: datetime
+    :param seed: int
+    :return: iterator of row dicts, the same shape the api returns
+    """
+    return iter(SyntheticReport(model, count, date_from, date_till, seed=seed, **kwargs))
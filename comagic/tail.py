@@ -0,0 +1,171 @@
+"""
+Near real time tail of calls and communications.
+
+``Tailer`` polls the ids of the last ``lookback`` of a report (only ``id`` and the date field are requested),
+fetches the projected fields of the ids it has not delivered yet with an ``in`` filter and adapts the poll
+interval: back to ``min_interval`` as soon as new rows arrive, growing ``backoff`` times per idle poll up to
+``max_interval``::
+
+    tailer = Tailer(client, 'calls_report', fields=['id', 'start_time', 'contact_phone_number'])
+    tailer.subscribe(crm.push_call)
+    threading.Thread(target=tailer.run, daemon=True).start()
+    ...
+    tailer.stop()
+
+or ``for call in tailer: ...``. Rows show up in calls_report when the call has ended, so ``lookback`` should be
+longer than the longest call. The polled window starts ``lookback`` before the end of the last successful poll,
+so polls delayed by errors leave no gap. Delivered ids are kept in a bounded set of ``dedup_size`` ids, it has to
+hold every row of one lookback window.
+"""
+import threading
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Callable, Iterator, Optional
+
+from .endpoints import get_endpoint
+from .errors import ComagicException, RETRY_ERROR_CODES
+from .pagination import MAX_LIMIT
+from .query import F
+
+# fields of the delivered rows when none are given
+TAIL_FIELDS = {
+    'calls_report': ('id', 'start_time', 'finish_time', 'direction', 'is_lost', 'contact_phone_number',
+                     'virtual_phone_number', 'talk_duration', 'total_duration', 'last_answered_employee_id',
+                     'site_id', 'campaign_id', 'contact_id'),
+    'communications_report': ('id', 'date_time', 'communication_type', 'communication_number', 'site_id',
+                              'campaign_id', 'visitor_id'),
+}
+# ids per request when new rows are fetched with an in filter
+IN_FILTER_SIZE = 500
+
+
+class Tailer(object):
+    def __init__(self, client: any, endpoint: str = 'calls_report', fields: Optional[list] = None,
+                 lookback: timedelta = timedelta(minutes=30), min_interval: float = 2.0, max_interval: float = 60.0,
+                 backoff: float = 2.0, dedup_size: int = 100000, skip_existing: bool = True,
+                 user_id: Optional[int] = None, page_size: int = MAX_LIMIT) -> None:
+        """
+        :param client: Comagic
+        :param endpoint: str (report with a date field, calls_report or communications_report)
+        :param fields: list (projection of the delivered rows, TAIL_FIELDS of the endpoint by default, id and the
+                       date field are always requested)
+        :param lookback: timedelta (window polled, ending now)
+        :param min_interval: float (seconds between polls while rows are flowing)
+        :param max_interval: float (seconds between polls when idle)
+        :param backoff: float (interval multiplier per idle poll)
+        :param dedup_size: int (delivered ids remembered)
+        :param skip_existing: bool (rows already in the window on the first poll are not delivered)
+        :param user_id: int
+        :param page_size: int
+        """
+        self.client = client
+        self.endpoint = get_endpoint(endpoint)
+        if not self.endpoint.date_field:
+            raise ValueError(f'{self.endpoint.name} is not bounded by date_from/date_till')
+        date_field = self.endpoint.date_field
+        fields = fields or TAIL_FIELDS.get(self.endpoint.name, ())
+        self.fields = list(dict.fromkeys(['id', date_field] + list(fields)))
+        self.lookback = lookback
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.backoff = backoff
+        self.dedup_size = dedup_size
+        self.user_id = user_id
+        self.page_size = page_size
+        self.interval = min_interval
+        self.stats = {'polls': 0, 'rows': 0, 'fetched': 0, 'delivered': 0, 'errors': 0}
+        # end of the last successful poll window
+        self.high_water = None
+        self._primed = not skip_existing
+        self._seen = OrderedDict()
+        self._callbacks = []
+        self._stop = threading.Event()
+
+    def subscribe(self, callback: Callable[[any], None]) -> None:
+        """
+        :param callback: callable(row) (called by run() for every new row)
+        """
+        self._callbacks.append(callback)
+
+    def unsubscribe(self, callback: Callable[[any], None]) -> None:
+        if callback in self._callbacks:
+            self._callbacks.remove(callback)
+
+    def _remember(self, id: any) -> bool:
+        """
+        :return: bool (id was not seen before)
+        """
+        if id in self._seen:
+            self._seen.move_to_end(id)
+            return False
+        self._seen[id] = None
+        if len(self._seen) > self.dedup_size:
+            self._seen.popitem(last=False)
+        return True
+
+    def _query(self, date_from: datetime, date_till: datetime) -> any:
+        query = self.client.query(self.endpoint.name).between(date_from, date_till).for_user(self.user_id)
+        return query.order_by(self.endpoint.date_field, 'id')
+
+    def poll(self, now: Optional[datetime] = None) -> list:
+        """
+        One request round over the window, also adapts ``interval``.
+
+        :param now: datetime (window end, datetime.now() by default)
+        :return: list of new rows in report order
+        """
+        now = (now or datetime.now()).replace(microsecond=0)
+        date_from = (min(self.high_water, now) if self.high_water else now) - self.lookback
+        self.stats['polls'] += 1
+        probe = self._query(date_from, now).select('id', self.endpoint.date_field)
+        ids = [row.id for row in probe.iter(page_size=self.page_size)]
+        self.stats['rows'] += len(ids)
+        new_ids = [id for id in ids if id not in self._seen]
+        rows = []
+        if self._primed:
+            query = self._query(date_from, now).select(*self.fields)
+            for start in range(0, len(new_ids), IN_FILTER_SIZE):
+                chunk = new_ids[start:start + IN_FILTER_SIZE]
+                rows += query.where(F('id').in_(chunk)).iter(page_size=self.page_size)
+            self.stats['fetched'] += len(rows)
+            order = {id: index for index, id in enumerate(new_ids)}
+            rows.sort(key=lambda row: order.get(row.id, len(order)))
+        # ids are remembered once their rows are in hand, a failed fetch is polled again
+        new = [row for row in rows if self._remember(row.id)]
+        if not self._primed:
+            self._primed = True
+            for id in new_ids:
+                self._remember(id)
+        self.high_water = now
+        self.stats['delivered'] += len(new)
+        if new:
+            self.interval = self.min_interval
+        else:
+            self.interval = min(self.max_interval, self.interval * self.backoff)
+        return new
+
+    def iter(self) -> Iterator[any]:
+        """New rows as they arrive, until stop()."""
+        while not self._stop.is_set():
+            try:
+                rows = self.poll()
+            except ComagicException as e:
+                if e.error_data.get('code') not in RETRY_ERROR_CODES:
+                    raise
+                self.stats['errors'] += 1
+                rows = []
+                self.interval = min(self.max_interval, max(self.interval, self.min_interval) * self.backoff)
+            yield from rows
+            self._stop.wait(self.interval)
+
+    def __iter__(self) -> Iterator[any]:
+        return self.iter()
+
+    def run(self) -> None:
+        """Deliver new rows to the subscribed callbacks until stop()."""
+        for row in self.iter():
+            for callback in list(self._callbacks):
+                callback(row)
+
+    def stop(self) -> None:
+        self._stop.set()
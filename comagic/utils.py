@@ -1,5 +1,4 @@
-import pytz
-from datetime import datetime
+from datetime import date, datetime
 
 DATETIME_FORMAT = '%Y-%m-%d %H:%M:%S'
 
@@ -8,3 +7,14 @@ def parse_datetime(s):
     if not s:
         return None
     return datetime.strptime(s, DATETIME_FORMAT)
+
+
+def to_api_value(value):
+    """Python value -> value as the api expects it in filters (datetimes as DATETIME_FORMAT strings)."""
+    if isinstance(value, datetime):
+        return value.strftime(DATETIME_FORMAT)
+    if isinstance(value, date):
+        return value.strftime('%Y-%m-%d')
+    if isinstance(value, (list, tuple, set, frozenset)):
+        return [to_api_value(v) for v in value]
+    return value
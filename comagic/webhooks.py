@@ -0,0 +1,278 @@
+"""
+Local receiver for comagic http notifications.
+
+Notifications are configured in the comagic account with a url and a payload template. ``WebhookReceiver`` is an
+asyncio http server: a notification sent to ``/calls`` becomes a ``Call`` model, ``/chats`` a ``Chat`` and so on
+(see ``DEFAULT_ROUTES``). Name the template variables after the model fields; json bodies, form bodies and query
+strings (GET notifications) are accepted, a json list is several events at once::
+
+    async def main():
+        async with WebhookReceiver(port=8080, token='<secret>') as receiver:
+            async for batch in receiver.batches(max_size=100, max_delay=0.5):
+                await crm.push([event.model for event in batch])
+
+Requests are acknowledged as soon as their events are queued. When the bounded queue is full a request waits up
+to ``enqueue_timeout`` seconds and then gets 503, so the sender retries later instead of the receiver growing
+without bound; events of a retried request may be delivered twice. ``reconcile()`` re-reads a report window and
+queues the rows no notification delivered.
+"""
+import asyncio
+import json
+import time
+from collections import OrderedDict, namedtuple
+from datetime import datetime
+from typing import AsyncIterator, Optional
+from urllib.parse import parse_qsl, urlsplit
+
+from .errors import ComagicParamsError
+from .models import Call, Chat, ChatMessage, Communication, Goal, OfflineMessage
+
+DEFAULT_ROUTES = {
+    '/calls': Call,
+    '/communications': Communication,
+    '/chats': Chat,
+    '/chat_messages': ChatMessage,
+    '/offline_messages': OfflineMessage,
+    '/goals': Goal,
+}
+# report read by reconcile() for the events of a route
+ROUTE_REPORTS = {
+    '/calls': 'calls_report',
+    '/communications': 'communications_report',
+    '/chats': 'chats_report',
+    '/offline_messages': 'offline_messages_report',
+    '/goals': 'goals_report',
+}
+MAX_BODY_SIZE = 1024 * 1024
+
+# route: url path, model: comagic.models instance, received_at: unix time, source: webhook or reconcile
+WebhookEvent = namedtuple('WebhookEvent', ['route', 'model', 'received_at', 'source'])
+
+_REASONS = {200: 'OK', 400: 'Bad Request', 403: 'Forbidden', 404: 'Not Found', 405: 'Method Not Allowed',
+            411: 'Length Required', 413: 'Payload Too Large', 503: 'Service Unavailable'}
+
+
+class _HttpError(Exception):
+    def __init__(self, status: int) -> None:
+        self.status = status
+        super().__init__(status)
+
+
+class WebhookReceiver(object):
+    def __init__(self, host: str = '127.0.0.1', port: int = 0, routes: Optional[dict] = None,
+                 queue_size: int = 10000, enqueue_timeout: float = 1.0, token: Optional[str] = None,
+                 dedup_size: int = 100000) -> None:
+        """
+        :param host: str
+        :param port: int (0 picks a free port, see url after start())
+        :param routes: dict (url path -> model class, DEFAULT_ROUTES by default)
+        :param queue_size: int (events held before requests are pushed back)
+        :param enqueue_timeout: float (seconds a request waits for queue space before 503)
+        :param token: str (required as ?token=... when set)
+        :param dedup_size: int (received ids remembered per route, for reconcile())
+        """
+        self.host = host
+        self.port = port
+        self.routes = dict(routes or DEFAULT_ROUTES)
+        self.queue_size = queue_size
+        self.enqueue_timeout = enqueue_timeout
+        self.token = token
+        self.dedup_size = dedup_size
+        self.stats = {'requests': 0, 'events': 0, 'rejected': 0, 'reconciled': 0}
+        self._queue = None
+        self._server = None
+        self._received = {}
+
+    @property
+    def url(self) -> str:
+        return f'http://{self.host}:{self.port}'
+
+    async def start(self) -> 'WebhookReceiver':
+        self._queue = asyncio.Queue(maxsize=self.queue_size)
+        self._server = await asyncio.start_server(self._serve, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+        return self
+
+    async def stop(self) -> None:
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+
+    async def __aenter__(self) -> 'WebhookReceiver':
+        return await self.start()
+
+    async def __aexit__(self, *exc) -> None:
+        await self.stop()
+
+    def qsize(self) -> int:
+        return self._queue.qsize() if self._queue is not None else 0
+
+    async def get(self) -> WebhookEvent:
+        return await self._queue.get()
+
+    async def batches(self, max_size: int = 100, max_delay: float = 0.5) -> AsyncIterator[list]:
+        """
+        :param max_size: int (events per batch)
+        :param max_delay: float (seconds a batch waits for more events after its first one)
+        :return: async iterator of lists of WebhookEvent
+        """
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            deadline = loop.time() + max_delay
+            while len(batch) < max_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                    continue
+                except asyncio.QueueEmpty:
+                    pass
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), remaining))
+                except asyncio.TimeoutError:
+                    break
+            yield batch
+
+    def _remember(self, route: str, id: any) -> bool:
+        """
+        :return: bool (id was not received on this route before)
+        """
+        if id is None:
+            return True
+        seen = self._received.setdefault(route, OrderedDict())
+        key = str(id)
+        if key in seen:
+            return False
+        seen[key] = None
+        if len(seen) > self.dedup_size:
+            seen.popitem(last=False)
+        return True
+
+    async def _put(self, events: list) -> None:
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.enqueue_timeout
+        for queued, event in enumerate(events):
+            try:
+                self._queue.put_nowait(event)
+            except asyncio.QueueFull:
+                try:
+                    await asyncio.wait_for(self._queue.put(event), max(deadline - loop.time(), 0))
+                except asyncio.TimeoutError:
+                    # the events queued before stay queued, only the rest is rejected
+                    self.stats['events'] += queued
+                    self.stats['rejected'] += len(events) - queued
+                    raise _HttpError(503)
+            self._remember(event.route, getattr(event.model, 'id', None))
+        self.stats['events'] += len(events)
+
+    async def _serve(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            keep_alive = True
+            while keep_alive:
+                try:
+                    request = await self._read_request(reader)
+                    if request is None:
+                        break
+                    method, target, headers, body = request
+                    keep_alive = headers.get('connection', '').lower() != 'close'
+                    status = await self._handle(method, target, headers, body)
+                except _HttpError as e:
+                    # the rest of a bad request can't be skipped reliably, answer and close
+                    status, keep_alive = e.status, e.status == 503 and keep_alive
+                writer.write(f'HTTP/1.1 {status} {_REASONS.get(status, "")}\r\nContent-Length: 0\r\n'
+                             f'Connection: {"keep-alive" if keep_alive else "close"}\r\n\r\n'.encode('latin-1'))
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError, asyncio.LimitOverrunError):
+            pass
+        finally:
+            writer.close()
+
+    async def _read_request(self, reader: asyncio.StreamReader) -> Optional[tuple]:
+        line = await reader.readline()
+        if not line.strip():
+            return None
+        try:
+            method, target, _ = line.decode('latin-1').split(' ', 2)
+        except ValueError:
+            raise _HttpError(400)
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            headers[name.strip().lower()] = value.strip()
+        if 'chunked' in headers.get('transfer-encoding', '').lower():
+            raise _HttpError(411)
+        try:
+            length = int(headers.get('content-length') or 0)
+        except ValueError:
+            raise _HttpError(400)
+        if length < 0:
+            raise _HttpError(400)
+        if length > MAX_BODY_SIZE:
+            raise _HttpError(413)
+        body = await reader.readexactly(length) if length else b''
+        return method.upper(), target, headers, body
+
+    async def _handle(self, method: str, target: str, headers: dict, body: bytes) -> int:
+        self.stats['requests'] += 1
+        url = urlsplit(target)
+        query = dict(parse_qsl(url.query))
+        if self.token is not None and query.pop('token', None) != self.token:
+            return 403
+        model = self.routes.get(url.path.rstrip('/') or '/')
+        if model is None:
+            return 404
+        if method not in ('GET', 'POST'):
+            return 405
+        try:
+            payloads = self._payloads(headers, body, query)
+            received_at = time.time()
+            events = [WebhookEvent(url.path.rstrip('/'), model.from_dict(payload), received_at, 'webhook')
+                      for payload in payloads]
+        except (ValueError, TypeError, AttributeError):
+            return 400
+        await self._put(events)
+        return 200
+
+    @staticmethod
+    def _payloads(headers: dict, body: bytes, query: dict) -> list:
+        if not body:
+            return [query]
+        content_type = headers.get('content-type', '')
+        if 'application/x-www-form-urlencoded' in content_type:
+            return [dict(query, **dict(parse_qsl(body.decode('utf-8'))))]
+        data = json.loads(body)
+        items = data if isinstance(data, list) else [data]
+        if not all(isinstance(item, dict) for item in items):
+            raise ValueError('notification payload must be a json object or a list of objects')
+        return items
+
+    async def reconcile(self, client: any, date_from: datetime, date_till: datetime, route: str = '/calls',
+                        user_id: Optional[int] = None) -> int:
+        """
+        Read the report of ``route`` for the window (on a worker thread) and queue the rows whose ids were not
+        received, with source ``reconcile``.
+
+        :param client: Comagic
+        :param route: str (a route of ROUTE_REPORTS)
+        :return: int (events queued)
+        """
+        report = ROUTE_REPORTS.get(route)
+        if report is None:
+            raise ComagicParamsError(f'no report to reconcile {route} with, routes: {", ".join(ROUTE_REPORTS)}')
+
+        def fetch() -> list:
+            return list(client.query(report).between(date_from, date_till).for_user(user_id).iter())
+
+        rows = await asyncio.get_running_loop().run_in_executor(None, fetch)
+        received_at = time.time()
+        missed = [WebhookEvent(route, row, received_at, 'reconcile') for row in rows if self._remember(route, row.id)]
+        for event in missed:
+            await self._queue.put(event)
+        self.stats['reconciled'] += len(missed)
+        return len(missed)
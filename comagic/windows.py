@@ -0,0 +1,241 @@
+"""
+Report windows that split themselves.
+
+A date-bounded report request returns at most ``MAX_LIMIT`` rows and busy windows may time out. ``WindowSplitter``
+counts the rows of a window with a one row, id only request (``total_items`` of the response metadata) and, when
+the window holds more rows than ``max_rows`` or the request timed out (504), bisects it and handles both halves in
+parallel, recursively. Windows the density profile expects to fit are fetched without counting first; if one
+overflows anyway its rows are kept and only the remainder is paged::
+
+    splitter = WindowSplitter(client, profile=DensityProfile('density.json'))
+    calls = splitter.fetch('calls_report', date_from, date_till, fields=['id', 'start_time'])
+    splitter.profile.save()
+
+``DensityProfile`` learns rows per hour for every hour of the day, so the next run pre-splits the range into
+windows that fit instead of finding out by overflowing.
+"""
+import json
+import math
+import os
+import threading
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import datetime, timedelta
+from typing import Iterator, Optional, Union
+
+from .endpoints import Endpoint, get_endpoint
+from .errors import ComagicException, ComagicParamsError, TIMEOUT_ERROR_CODE
+from .pagination import MAX_LIMIT, iter_offset_pages
+
+# api dates have second precision and both window ends are inclusive
+RESOLUTION = timedelta(seconds=1)
+HOUR = timedelta(hours=1)
+# windows the profile expects to hold more than this share of max_rows are counted before they are fetched
+COUNT_THRESHOLD = 0.5
+
+
+def _hour_segments(date_from: datetime, date_till: datetime) -> Iterator[tuple]:
+    """
+    :return: iterator of (hour of day, segment start, segment end) cut at hour boundaries, end exclusive
+    """
+    start, stop = date_from, date_till + RESOLUTION
+    while start < stop:
+        end = min(start.replace(minute=0, second=0, microsecond=0) + HOUR, stop)
+        yield start.hour, start, end
+        start = end
+
+
+class DensityProfile(object):
+    def __init__(self, path: Optional[str] = None, smoothing: float = 0.3) -> None:
+        """
+        :param path: str (json file, loaded if it exists, written by save())
+        :param smoothing: float (weight of the newest window in the per hour averages)
+        """
+        self.path = path
+        self.smoothing = smoothing
+        self._rates = {}
+        self._lock = threading.Lock()
+        if path and os.path.exists(path):
+            with open(path, encoding='utf-8') as f:
+                self._rates = json.load(f)
+
+    def observe(self, endpoint: str, date_from: datetime, date_till: datetime, total_items: int) -> None:
+        """
+        Record that a window held ``total_items`` rows, spread evenly over the hours of day it covers.
+        """
+        seconds = (date_till - date_from + RESOLUTION).total_seconds()
+        rate = total_items / seconds * HOUR.total_seconds()
+        with self._lock:
+            hours = self._rates.setdefault(endpoint, {})
+            for hour, start, end in _hour_segments(date_from, date_till):
+                # a short window tells less about the whole hour than a full one
+                weight = self.smoothing * (end - start) / HOUR
+                previous = hours.get(str(hour))
+                hours[str(hour)] = rate if previous is None else previous + weight * (rate - previous)
+
+    def estimate(self, endpoint: str, date_from: datetime, date_till: datetime) -> Optional[float]:
+        """
+        :return: float (expected rows in the window) or None when an hour of it was never observed
+        """
+        with self._lock:
+            hours = self._rates.get(endpoint, {})
+            total = 0.0
+            for hour, start, end in _hour_segments(date_from, date_till):
+                if str(hour) not in hours:
+                    return None
+                total += hours[str(hour)] * ((end - start) / HOUR)
+            return total
+
+    def split(self, endpoint: str, date_from: datetime, date_till: datetime, max_rows: int) -> list:
+        """
+        :return: list of (date_from, date_till) windows expected to hold at most max_rows rows each,
+                 hours never observed are kept in one window and left to bisection
+        """
+        with self._lock:
+            hours = dict(self._rates.get(endpoint, {}))
+        windows = []
+        window_start, window_rows = date_from, 0.0
+        for hour, start, end in _hour_segments(date_from, date_till):
+            rows = hours.get(str(hour), 0.0) * ((end - start) / HOUR)
+            if window_rows + rows > max_rows and window_start < start:
+                windows.append((window_start, start - RESOLUTION))
+                window_start, window_rows = start, 0.0
+            if rows > max_rows:
+                # one hour alone is too dense, cut it into equal parts
+                parts = math.ceil(rows / max_rows)
+                step = max((end - start) / parts, RESOLUTION)
+                while start + step < end:
+                    cut = start + step
+                    cut -= timedelta(microseconds=cut.microsecond)
+                    windows.append((start, cut - RESOLUTION))
+                    start = cut
+                window_start, rows = start, rows / parts
+            window_rows += rows
+        windows.append((window_start, date_till))
+        return windows
+
+    def save(self, path: Optional[str] = None) -> None:
+        path = path or self.path
+        if not path:
+            return
+        with self._lock:
+            data = json.dumps(self._rates, indent=2, sort_keys=True)
+        tmp_path = f'{path}.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+
+class WindowSplitter(object):
+    def __init__(self, client: any, max_rows: int = MAX_LIMIT, workers: int = 4,
+                 profile: Optional[DensityProfile] = None) -> None:
+        """
+        :param client: Comagic
+        :param max_rows: int (a window holding more rows than this is bisected, at most MAX_LIMIT)
+        :param workers: int (windows fetched in parallel)
+        :param profile: DensityProfile (learns rows per hour of day and pre-splits later runs)
+        """
+        if not 0 < max_rows <= MAX_LIMIT:
+            raise ValueError(f'max_rows must be in [1, {MAX_LIMIT}]')
+        self.client = client
+        self.max_rows = max_rows
+        self.workers = workers
+        self.profile = profile if profile is not None else DensityProfile()
+        self.stats = {'requests': 0, 'counts': 0, 'splits': 0, 'timeouts': 0, 'windows': 0}
+        self._lock = threading.Lock()
+
+    def _count(self, name: str) -> None:
+        with self._lock:
+            self.stats[name] += 1
+
+    def _total_items(self) -> Optional[int]:
+        metadata = (self.client.last_response or {}).get('metadata') or {}
+        return metadata.get('total_items')
+
+    def _count_rows(self, method: any, date_from: datetime, date_till: datetime, kwargs: dict) -> Optional[int]:
+        """
+        :return: int (rows in the window, None when the api does not report total_items)
+        """
+        self._count('requests')
+        self._count('counts')
+        params = dict(kwargs, fields=['id'], sort=None)
+        list(method(date_from=date_from, date_till=date_till, limit=1, offset=None, **params))
+        return self._total_items()
+
+    def _fetch_window(self, endpoint: Endpoint, date_from: datetime, date_till: datetime,
+                      kwargs: dict) -> Optional[list]:
+        """
+        :return: list (rows of the window) or None when the window has to be split
+        """
+        method = getattr(self.client, endpoint.method)
+        can_split = date_till - date_from >= RESOLUTION
+        try:
+            if can_split:
+                estimate = self.profile.estimate(endpoint.name, date_from, date_till)
+                if estimate is None or estimate > self.max_rows * COUNT_THRESHOLD:
+                    total_items = self._count_rows(method, date_from, date_till, kwargs)
+                    if total_items is not None and total_items > self.max_rows:
+                        self.profile.observe(endpoint.name, date_from, date_till, total_items)
+                        return None
+            self._count('requests')
+            rows = list(method(date_from=date_from, date_till=date_till, limit=self.max_rows, offset=None, **kwargs))
+        except ComagicException as e:
+            if e.error_data.get('code') != TIMEOUT_ERROR_CODE or not can_split:
+                raise
+            self._count('timeouts')
+            return None
+        total_items = self._total_items()
+        if total_items is None:
+            total_items = len(rows)
+        if len(rows) < total_items:
+            # more rows than counted (or than the profile expected): keep the page, fetch only the rest
+            def fetch(limit: int, offset: int) -> list:
+                self._count('requests')
+                return list(method(date_from=date_from, date_till=date_till, limit=limit, offset=offset, **kwargs))
+
+            rows.extend(row for page in iter_offset_pages(fetch, self.max_rows, offset=len(rows)) for row in page)
+        self.profile.observe(endpoint.name, date_from, date_till, total_items)
+        self._count('windows')
+        return rows
+
+    def iter_windows(self, endpoint: Union[str, Endpoint], date_from: datetime, date_till: datetime,
+                     **kwargs) -> Iterator[tuple]:
+        """
+        :param endpoint: str or Endpoint (a date-bounded report, e.g. calls_report)
+        :param kwargs: fields, filter, sort, user_id ... (passed to every request, sort applies per window)
+        :return: iterator of ((date_from, date_till), rows) in completion order
+        """
+        endpoint = endpoint if isinstance(endpoint, Endpoint) else get_endpoint(endpoint)
+        if not endpoint.date_field:
+            raise ComagicParamsError(f'{endpoint.name} is not bounded by date_from/date_till')
+        if date_from > date_till:
+            raise ComagicParamsError('date_from must not be after date_till')
+        date_from = date_from.replace(microsecond=0)
+        date_till = date_till.replace(microsecond=0)
+        windows = self.profile.split(endpoint.name, date_from, date_till, self.max_rows)
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            pending = {executor.submit(self._fetch_window, endpoint, start, end, kwargs): (start, end)
+                       for start, end in windows}
+            try:
+                while pending:
+                    done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        start, end = pending.pop(future)
+                        rows = future.result()
+                        if rows is not None:
+                            yield (start, end), rows
+                            continue
+                        self._count('splits')
+                        middle = start + (end - start) / 2
+                        middle -= timedelta(microseconds=middle.microsecond)
+                        for half in ((start, middle), (middle + RESOLUTION, end)):
+                            pending[executor.submit(self._fetch_window, endpoint, *half, kwargs)] = half
+            finally:
+                for future in pending:
+                    future.cancel()
+
+    def fetch(self, endpoint: Union[str, Endpoint], date_from: datetime, date_till: datetime, **kwargs) -> list:
+        """
+        :return: list (all rows of the range, windows in date order)
+        """
+        windows = sorted(self.iter_windows(endpoint, date_from, date_till, **kwargs), key=lambda w: w[0])
+        return [row for _, rows in windows for row in rows]
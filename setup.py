@@ -4,11 +4,12 @@ setup(
     name='comagic-data-api-sdk',
     version='0.0.3.4',
     packages=find_packages(),
-    install_requires=['requests>=2.18.2', 'pytz>=2019.3'],
+    install_requires=['requests>=2.18.2'],
+    entry_points={'console_scripts': ['comagic-export=comagic.cli:main']},
     description='Comagic data api sdk',
     author='bzdvdn',
     author_email='bzdv.dn@gmail.com',
     url='https://github.com/bzdvdn/comagic-sdk',
     license='MIT',
-    python_requires=">=3.6",
+    python_requires=">=3.7",
 )
@@ -0,0 +1,82 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from comagic import Comagic
+from comagic.server import StandInServer
+
+START = datetime(2024, 1, 1)
+THREADS = 16
+
+
+def _calls(count: int) -> list:
+    return [{'id': i, 'start_time': (START + timedelta(minutes=i)).strftime('%Y-%m-%d %H:%M:%S')}
+            for i in range(1, count + 1)]
+
+
+def _together(function, threads: int = THREADS) -> list:
+    barrier = threading.Barrier(threads)
+
+    def run(_):
+        barrier.wait()
+        return function()
+
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        return list(executor.map(run, range(threads)))
+
+
+def test_expired_token_is_refreshed_once_for_all_threads():
+    with StandInServer(login='u', password='p', latency=0.05) as server:
+        server.add_rows('calls_report', _calls(10), date_field='start_time')
+        client = Comagic('u', 'p', api_url=server.url, pool_size=THREADS, coalesce=False)
+        assert server.logins_count == 1
+        server.expire_tokens()
+        results = _together(lambda: client.get_calls_report(START, START + timedelta(days=1), fields=['id']))
+        assert all([row.id for row in rows] == list(range(1, 11)) for rows in results)
+        assert server.logins_count == 2
+        client.close()
+
+
+def test_every_thread_gets_its_own_session():
+    client = Comagic('u', 'p', api_url='http://127.0.0.1:1', defer_auth=True, pool_size=THREADS)
+    sessions = _together(lambda: client._session)
+    assert len({id(session) for session in sessions}) == THREADS
+    assert len({id(session.get_adapter('http://')) for session in sessions}) == 1
+
+
+def test_hooks_registered_and_removed_from_many_threads():
+    client = Comagic('u', 'p', api_url='http://127.0.0.1:1', defer_auth=True)
+    calls = []
+    running = threading.Event()
+
+    def shared(**data):
+        calls.append(data)
+
+    def register():
+        client.add_hook('contact_created', shared)
+        callbacks = [lambda **data: calls.append(data) for _ in range(200)]
+        for callback in callbacks:
+            client.add_hook('contact_created', callback)
+        for callback in callbacks[::2]:
+            client.remove_hook('contact_created', callback)
+            client.remove_hook('contact_created', callback)
+        # every thread removes one of the shared registrations, the last removals find it gone
+        client.remove_hook('contact_created', shared)
+        client.remove_hook('contact_created', shared)
+
+    def fire():
+        while not running.is_set():
+            client._run_hooks('contact_created', id=1, user_id=None)
+
+    firing = threading.Thread(target=fire)
+    firing.start()
+    try:
+        _together(register)
+    finally:
+        running.set()
+        firing.join()
+    assert len(client._hooks['contact_created']) == THREADS * 100
+    assert shared not in client._hooks['contact_created']
+    del calls[:]
+    client._run_hooks('contact_created', id=1, user_id=None)
+    assert len(calls) == THREADS * 100
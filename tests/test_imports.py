@@ -0,0 +1,21 @@
+import subprocess
+import sys
+
+LOADED = "import sys; print(' '.join(m for m in ('requests', 'inspect', 'comagic.models') if m in sys.modules))"
+
+
+def _loaded(code: str) -> list:
+    return subprocess.run([sys.executable, '-c', f'{code}; {LOADED}'], check=True, capture_output=True,
+                          text=True).stdout.split()
+
+
+def test_client_import_loads_no_models():
+    assert _loaded('from comagic import Comagic') == []
+    assert _loaded("from comagic import Comagic; Comagic('login', 'password', defer_auth=True)") == []
+
+
+def test_generated_methods_resolve_models_on_use():
+    code = 'import inspect; from comagic import Comagic; inspect.signature(Comagic.get_calls_report)'
+    assert _loaded(code) == ['inspect']
+    assert _loaded('from comagic.endpoints import get_endpoint; get_endpoint("calls_report").model') == \
+        ['comagic.models']
@@ -0,0 +1,18 @@
+from comagic import Comagic
+from comagic.phones import PhoneIndex
+from comagic.server import StandInServer
+
+
+def test_hooks_of_other_accounts_are_ignored():
+    with StandInServer(login='u', password='p') as server:
+        server.add_rows('contacts', [{'id': 1, 'phone_numbers': ['+7 (495) 123-45-67']}])
+        client = Comagic('u', 'p', api_url=server.url)
+        phones = PhoneIndex.build(client, kinds=('contact',), user_id=10).attach(client)
+        client._run_hooks('contact_created', id=2, user_id=20, phone_numbers=['84951112233'])
+        client._run_hooks('contact_deleted', id=1, user_id=20)
+        assert phones.lookup('74951112233') == []
+        assert [entry.id for entry in phones.lookup('74951234567')] == [1]
+        client._run_hooks('contact_updated', id=2, user_id=10, phone_numbers=['84951112233'])
+        client._run_hooks('contact_deleted', id=1, user_id=10)
+        assert [entry.id for entry in phones.lookup('74951112233')] == [2]
+        assert phones.lookup('74951234567') == []
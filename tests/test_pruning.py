@@ -0,0 +1,47 @@
+import os
+from datetime import datetime, timedelta
+
+from comagic import Comagic
+from comagic.pruning import AdaptiveFields
+from comagic.server import StandInServer
+
+START = datetime(2024, 1, 1)
+
+
+def _calls(count: int) -> list:
+    return [{'id': i, 'start_time': (START + timedelta(minutes=i)).strftime('%Y-%m-%d %H:%M:%S'),
+             'talk_duration': i, 'finish_reason': 'subscriber_disconnects', 'tags': [{'tag_id': 1}]}
+            for i in range(1, count + 1)]
+
+
+def test_bulk_access_keeps_every_field_across_runs(tmp_path):
+    path = os.path.join(tmp_path, 'profile.json')
+    with StandInServer(login='u', password='p') as server:
+        server.add_rows('calls_report', _calls(5), date_field='start_time')
+        client = Comagic('u', 'p', api_url=server.url)
+        for _ in range(3):
+            with AdaptiveFields(client, path, job='bulk') as adaptive:
+                rows = adaptive.get_calls_report(START, START + timedelta(days=1))
+                for row in rows:
+                    data = row.to_dict()
+                    assert data['talk_duration'] == row.id
+                    assert data['finish_reason'] == 'subscriber_disconnects'
+                    assert data['tags'] == [{'tag_id': 1}]
+                    assert row['talk_duration'] == row.id
+                    assert dict(row.items())['finish_reason'] == 'subscriber_disconnects'
+
+
+def test_attribute_reads_prune_and_refetch(tmp_path):
+    path = os.path.join(tmp_path, 'profile.json')
+    with StandInServer(login='u', password='p') as server:
+        server.add_rows('calls_report', _calls(5), date_field='start_time')
+        client = Comagic('u', 'p', api_url=server.url)
+        with AdaptiveFields(client, path, job='narrow') as adaptive:
+            assert [row.talk_duration for row in adaptive.get_calls_report(START, START + timedelta(days=1))] == \
+                [1, 2, 3, 4, 5]
+        with AdaptiveFields(client, path, job='narrow') as adaptive:
+            rows = adaptive.get_calls_report(START, START + timedelta(days=1))
+            assert adaptive.stats()[0]['requested'] == ['id', 'start_time', 'talk_duration']
+            # a pruned field read through [] is refetched, not lost
+            assert rows[0]['finish_reason'] == 'subscriber_disconnects'
+            assert adaptive.stats()[0]['refetches'] == 1
@@ -0,0 +1,38 @@
+import os
+
+from comagic.recordings import RecordingDownloader
+from comagic.server import StandInServer
+
+CONTENT = bytes(range(256)) * 40
+
+
+def _download(tmp_path, part: bytes) -> tuple:
+    with StandInServer() as server:
+        server.add_file('/talk/1/abc/', CONTENT)
+        url_template = server.files_url + '/talk/{call_session_id}/{record}/'
+        downloader = RecordingDownloader(str(tmp_path), url_template=url_template, chunk_size=1000, retries=0)
+        path = os.path.join(tmp_path, '1_abc.mp3')
+        if part is not None:
+            with open(f'{path}.part', 'wb') as f:
+                f.write(part)
+        stats = downloader.download([{'id': 1, 'call_records': ['abc']}])
+    with open(path, 'rb') as f:
+        return stats, f.read()
+
+
+def test_part_file_is_resumed(tmp_path):
+    stats, content = _download(tmp_path, CONTENT[:3000])
+    assert content == CONTENT
+    assert (stats['files'], stats['resumed'], stats['bytes']) == (1, 1, len(CONTENT) - 3000)
+
+
+def test_complete_part_file_is_kept(tmp_path):
+    stats, content = _download(tmp_path, CONTENT)
+    assert content == CONTENT
+    assert (stats['resumed'], stats['bytes']) == (1, 0)
+
+
+def test_part_file_longer_than_the_recording_is_downloaded_again(tmp_path):
+    stats, content = _download(tmp_path, CONTENT + b'garbage')
+    assert content == CONTENT
+    assert (stats['files'], stats['resumed'], stats['failed']) == (1, 0, 0)
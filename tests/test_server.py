@@ -0,0 +1,43 @@
+import json
+import os
+from urllib.request import Request, urlopen
+
+from comagic.server import INTERNAL_ERROR_CODE, StandInServer
+
+DAY = {'date_from': '2024-01-01 00:00:00', 'date_till': '2024-01-02 00:00:00'}
+
+
+def _post(server: StandInServer, method: str, params: dict) -> dict:
+    payload = json.dumps({'jsonrpc': '2.0', 'id': 1, 'method': method, 'params': params}).encode('utf-8')
+    with urlopen(Request(server.url, data=payload, headers={'Content-Type': 'application/json'})) as response:
+        return json.loads(response.read().decode('utf-8'))
+
+
+def _token(server: StandInServer) -> str:
+    return _post(server, 'login.user', {'login': 'u', 'password': 'p'})['result']['data']['access_token']
+
+
+def test_limit_zero_returns_no_rows():
+    with StandInServer(login='u', password='p') as server:
+        server.add_rows('calls_report', [{'id': i, 'start_time': f'2024-01-01 00:00:0{i}'} for i in range(3)],
+                        date_field='start_time')
+        token = _token(server)
+        result = _post(server, 'get.calls_report', dict(DAY, access_token=token, limit=0))['result']
+        assert (result['data'], result['metadata']['total_items']) == ([], 3)
+        assert len(_post(server, 'get.calls_report', dict(DAY, access_token=token))['result']['data']) == 3
+
+
+def test_unexpected_errors_are_json_rpc_errors():
+    with StandInServer(login='u', password='p') as server:
+        server.add_rows('calls_report', [{'id': 1, 'start_time': '2024-01-01 00:00:00'}], date_field='start_time')
+        response = _post(server, 'get.calls_report', dict(DAY, access_token=_token(server), filter='oops'))
+        assert response['error']['code'] == INTERNAL_ERROR_CODE
+        assert response['id'] == 1
+
+
+def test_unreachable_upstream_in_record_mode(tmp_path):
+    fixtures = os.path.join(tmp_path, 'fixtures.jsonl')
+    with StandInServer(mode='record', upstream_url='http://127.0.0.1:1', fixtures_path=fixtures) as server:
+        response = _post(server, 'get.calls_report', dict(DAY, access_token='t'))
+    assert response['error']['code'] == INTERNAL_ERROR_CODE
+    assert 'upstream request failed' in response['error']['message']
@@ -0,0 +1,66 @@
+import os
+import sqlite3
+from datetime import datetime, timedelta
+
+from comagic import Comagic
+from comagic.models import ChatMessage
+from comagic.server import StandInServer
+from comagic.store import ReportStore
+
+START = datetime(2024, 1, 1)
+
+
+def _calls(count: int) -> list:
+    return [{'id': i, 'start_time': (START + timedelta(minutes=i)).strftime('%Y-%m-%d %H:%M:%S'),
+             'talk_duration': i, 'finish_reason': 'subscriber_disconnects', 'tags': [{'tag_id': 1}]}
+            for i in range(1, count + 1)]
+
+
+def test_narrow_projection_keeps_stored_columns():
+    with StandInServer(login='u', password='p') as server, ReportStore() as store:
+        server.add_rows('calls_report', _calls(3), date_field='start_time')
+        client = Comagic('u', 'p', api_url=server.url)
+        query = client.query('calls_report').between(START, START + timedelta(days=1))
+        assert store.save_query(query) == 3
+        server.add_rows('calls_report', [dict(row, talk_duration=0) for row in _calls(3)], date_field='start_time')
+        assert store.save_query(query.select('id', 'tags')) == 3
+        rows = store.get_calls_report(START, START + timedelta(days=1))
+        assert [(row.talk_duration, row.finish_reason) for row in rows] == [(i, 'subscriber_disconnects')
+                                                                             for i in (1, 2, 3)]
+        narrow = client.get_calls_report(START, START + timedelta(days=1), fields=['id', 'tags'])
+        store.save('calls_report', narrow, fields=['id', 'tags'])
+        assert [row.talk_duration for row in store.get_calls_report(START, START + timedelta(days=1))] == [1, 2, 3]
+        assert store.count('calls_report') == 3
+
+
+def test_rows_are_keyed_per_user():
+    with ReportStore() as store:
+        store.save('calls_report', [{'id': 1, 'talk_duration': 10}], user_id=1)
+        store.save('calls_report', [{'id': 1, 'talk_duration': 20}], user_id=2)
+        store.save('calls_report', [{'id': 1, 'talk_duration': 30}])
+        store.save('calls_report', [{'id': 1, 'talk_duration': 40}])
+        assert store.count('calls_report') == 3
+        assert [row.talk_duration for row in store.select('calls_report', user_id=2)] == [20]
+
+
+def test_messages_without_id_are_upserted_on_natural_key():
+    message = {'chat_id': 7, 'date_time': START, 'source': 'visitor', 'text': 'hello'}
+    with ReportStore() as store:
+        store.save('chat_messages_report', [ChatMessage(**message)], user_id=1)
+        store.save('chat_messages_report', [ChatMessage(**dict(message, text='hello!'))], user_id=1)
+        store.save('chat_messages_report', [ChatMessage(**dict(message, source='operator'))], user_id=1)
+        assert store.count('chat_messages_report') == 2
+        assert sorted(row.text for row in store.get_chat_messages_report(chat_id=7)) == ['hello', 'hello!']
+
+
+def test_store_keyed_on_id_alone_is_migrated(tmp_path):
+    path = os.path.join(tmp_path, 'reports.sqlite')
+    connection = sqlite3.connect(path)
+    with connection:
+        connection.execute('CREATE TABLE "calls_report" ("user_id", "id" PRIMARY KEY, "talk_duration")')
+        connection.execute('INSERT INTO "calls_report" VALUES (1, 1, 10)')
+    connection.close()
+    with ReportStore(path) as store:
+        store.save('calls_report', [{'id': 1, 'talk_duration': 20}], user_id=2)
+        assert store.count('calls_report') == 2
+        assert [row.talk_duration for row in store.select('calls_report', user_id=1)] == [10]
@@ -0,0 +1,21 @@
+from datetime import datetime
+
+from comagic.models import Call, CallLegs
+from comagic.synthetic import SyntheticReport
+
+START, END = datetime(2024, 1, 1), datetime(2024, 1, 2)
+
+
+def test_call_legs_start_with_their_call():
+    calls = SyntheticReport(Call, 1000, START, END, seed=1, fields=['id', 'start_time'])
+    legs = SyntheticReport(CallLegs, 1000, START, END, seed=1, legs_per_call=3,
+                           fields=['id', 'call_session_id', 'start_time'])
+    rows = list(legs)
+    assert [row['start_time'] for row in rows] == sorted(row['start_time'] for row in rows)
+    for index, leg in enumerate(rows):
+        call = calls[leg['call_session_id'] - calls.base_id]
+        assert leg['call_session_id'] == call['id']
+        if index % 3 == 0:
+            assert leg['start_time'] == call['start_time']
+        else:
+            assert call['start_time'] <= leg['start_time'] <= calls[call['id'] - calls.base_id + 1]['start_time']